@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Admission Control
+Limits the slow endpoints (OpenAI image generation, Selenium scraping) so a
+burst of them can't take every sync gunicorn worker and starve page views.
+
+A guarded request, before its view runs, must:
+    1. take a token from its client's bucket (per endpoint, shared by the workers), else 429
+    2. take a slot in the shared pool of workers slow requests may hold, else 503
+    3. take one of the endpoint's concurrency slots, or wait in its bounded queue
+       for up to ADMISSION_QUEUE_TIMEOUT seconds, else 503
+Both rejections carry Retry-After and are answered without touching OpenAI or
+Selenium, so they cost the worker a few milliseconds.
+
+Slots are flocks on files under ADMISSION_DIR, so they're shared by every
+worker and released by the kernel if a worker dies mid-request. With
+gunicorn's 2 sync workers the pool (ADMISSION_POOL) defaults to 1: a waiting
+request holds its worker too, so one worker always stays free for cheap routes.
+
+Per-endpoint limits can be overridden, e.g.
+    ADMISSION_GENERATE_HERO_IMAGE="concurrency=2,queue=2,rate=4,burst=6,retry_after=20"
+where rate is tokens per minute and burst the bucket size.
+"""
+
+import os
+import math
+import time
+import fcntl
+import hashlib
+import tempfile
+
+from flask import request, g, jsonify, make_response
+
+from metrics import record_admission, observe_stage
+
+ADMISSION_DIR = os.getenv('ADMISSION_DIR', os.path.join(tempfile.gettempdir(), 'trendscraper-admission'))
+ADMISSION_POOL = int(os.getenv('ADMISSION_POOL', '1'))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '10'))
+
+DEFAULT_LIMITS = {
+    'generate_hero_image': {'concurrency': 1, 'queue': 1, 'rate': 2, 'burst': 3, 'retry_after': 30},
+    'generate_look': {'concurrency': 1, 'queue': 1, 'rate': 2, 'burst': 3, 'retry_after': 30},
+    'auto_scrape': {'concurrency': 1, 'queue': 0, 'rate': 1, 'burst': 2, 'retry_after': 60},
+}
+
+
+def endpoint_limits(endpoint):
+    """Limits for an endpoint: the defaults, overridden by ADMISSION_<ENDPOINT>"""
+    limits = dict(DEFAULT_LIMITS.get(endpoint, DEFAULT_LIMITS['generate_hero_image']))
+    override = os.getenv(f"ADMISSION_{endpoint.upper()}", '')
+    for item in filter(None, (part.strip() for part in override.split(','))):
+        name, _, value = item.partition('=')
+        if name not in limits:
+            raise ValueError(f"Unknown admission setting {name!r} for {endpoint}")
+        limits[name] = float(value) if name == 'rate' else int(value)
+    return limits
+
+
+class Rejected(Exception):
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class SlotPool:
+    """A counting semaphore shared between processes: one flock'd file per slot"""
+
+    def __init__(self, name, size, lock_dir=None):
+        self.lock_dir = os.path.join(lock_dir or ADMISSION_DIR, 'slots')
+        self.name = name
+        self.size = size
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+    def try_acquire(self):
+        """An open, locked slot file, or None if every slot is taken"""
+        for i in range(self.size):
+            f = open(os.path.join(self.lock_dir, f"{self.name}.{i}"), 'w')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except BlockingIOError:
+                f.close()
+        return None
+
+
+class TokenBuckets:
+    """Per-client token buckets in small files, updated under an flock so every worker sees the same count"""
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = os.path.join(lock_dir or ADMISSION_DIR, 'buckets')
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+    def take(self, bucket, rate_per_minute, burst):
+        """0 if a token was taken, else seconds until the next one; a rate of 0 turns the bucket off"""
+        if rate_per_minute <= 0:
+            return 0
+        path = os.path.join(self.lock_dir, hashlib.sha1(bucket.encode('utf-8')).hexdigest())
+        rate = rate_per_minute / 60.0
+        with open(path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                tokens, updated = map(float, f.read().split())
+            except ValueError:
+                tokens, updated = float(burst), time.time()
+            now = time.time()
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if wait == 0:
+                tokens -= 1
+            f.seek(0)
+            f.truncate()
+            f.write(f"{tokens} {now}")
+        return wait
+
+
+class AdmissionController:
+    def __init__(self, endpoints, lock_dir=None, pool_size=None, queue_timeout=None):
+        self.lock_dir = lock_dir or ADMISSION_DIR
+        self.queue_timeout = queue_timeout if queue_timeout is not None else ADMISSION_QUEUE_TIMEOUT
+        self.pool = SlotPool('pool', pool_size if pool_size is not None else ADMISSION_POOL, self.lock_dir)
+        self.buckets = TokenBuckets(self.lock_dir)
+        self.limits = {endpoint: endpoint_limits(endpoint) for endpoint in endpoints}
+        self.running = {endpoint: SlotPool(f"{endpoint}.run", limits['concurrency'], self.lock_dir)
+                        for endpoint, limits in self.limits.items()}
+        self.queued = {endpoint: SlotPool(f"{endpoint}.queue", limits['queue'], self.lock_dir)
+                       for endpoint, limits in self.limits.items()}
+
+    def admit(self, endpoint, client):
+        """Slot files to hold for the request; raises Rejected"""
+        limits = self.limits[endpoint]
+        wait = self.buckets.take(f"{endpoint}:{client}", limits['rate'], limits['burst'])
+        if wait:
+            record_admission(endpoint, 'rate_limited')
+            raise Rejected(429, 'Too many requests; please wait before trying again', wait)
+
+        held = []
+        try:
+            pool_slot = self.pool.try_acquire()
+            if pool_slot is None:
+                record_admission(endpoint, 'rejected')
+                raise Rejected(503, 'The server is busy with other generations; please try again shortly', limits['retry_after'])
+            held.append(pool_slot)
+
+            slot = self.running[endpoint].try_acquire()
+            if slot is None:
+                queue_slot = self.queued[endpoint].try_acquire()
+                if queue_slot is None:
+                    record_admission(endpoint, 'rejected')
+                    raise Rejected(503, 'Too many requests in progress; please try again shortly', limits['retry_after'])
+                held.append(queue_slot)
+                slot = self._wait_for(endpoint)
+                queue_slot.close()
+                held.remove(queue_slot)
+            held.append(slot)
+            record_admission(endpoint, 'admitted')
+            return held
+        except BaseException:
+            for f in held:
+                f.close()
+            raise
+
+    def _wait_for(self, endpoint):
+        start = time.monotonic()
+        try:
+            while time.monotonic() - start < self.queue_timeout:
+                slot = self.running[endpoint].try_acquire()
+                if slot is not None:
+                    return slot
+                time.sleep(0.05)
+            record_admission(endpoint, 'timed_out')
+            raise Rejected(503, 'Timed out waiting for a free slot; please try again shortly', self.limits[endpoint]['retry_after'])
+        finally:
+            observe_stage('admission_wait', time.monotonic() - start)
+
+
+def client_id():
+    """The client address: the entry nginx appended to X-Forwarded-For, else the socket peer"""
+    route = request.access_route
+    return route[-1] if route else (request.remote_addr or 'unknown')
+
+
+def rejection_response(rejected):
+    """429/503 in the shape the endpoint's callers expect: JSON for the fetch() callers, text for forms"""
+    if request.is_json or request.accept_mimetypes.best == 'application/json':
+        response = make_response(jsonify({'success': False, 'error': str(rejected)}), rejected.status)
+    else:
+        response = make_response(str(rejected), rejected.status)
+    response.headers['Retry-After'] = str(max(1, math.ceil(rejected.retry_after)))
+    return response
+
+
+def init_app(app, endpoints):
+    """Guard the given endpoints of a Flask app (only their POSTs, which do the expensive work)"""
+    controller = AdmissionController(endpoints)
+
+    @app.before_request
+    def _admit():
+        if request.endpoint not in controller.limits or request.method != 'POST':
+            return None
+        try:
+            g._admission_slots = controller.admit(request.endpoint, client_id())
+        except Rejected as rejected:
+            return rejection_response(rejected)
+        return None
+
+    @app.teardown_request
+    def _release(exc=None):
+        for f in g.pop('_admission_slots', []):
+            f.close()
+
+    return controller
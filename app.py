@@ -6,14 +6,25 @@ import json
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
 from trend_generator import TrendLandingPageGenerator
-import glob
-from look_generator import LookGenerator
+from capture_store import get_capture_store
+from capture_registry import get_capture_registry
+from sharding import get_collection
+from product import CSV_HEADER
+import metrics
+import profiling
+import offload
+import admission
+from metrics import stage_timer
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Change this in production
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB limit for large JSON/HTML content
 app.config['MAX_CONTENT_PATH'] = None  # No path length limit
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0  # Disable caching for development
+metrics.init_app(app, 'app')
+profiling.init_app(app)
+offload.init_app(app)
+admission.init_app(app, ('generate_look', 'auto_scrape'))
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
@@ -24,8 +35,17 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs('landing_pages', exist_ok=True)
 
-# Initialize look generator
-look_generator = LookGenerator()
+# Look generator is created on first use: building it strips proxy env vars and
+# sets up the OpenAI/httpx client, which page views never need (the look pages
+# read look files through look_generator's module-level readers)
+_look_generator = None
+
+def get_look_generator():
+    global _look_generator
+    if _look_generator is None:
+        from look_generator import LookGenerator
+        _look_generator = LookGenerator()
+    return _look_generator
 
 @app.errorhandler(413)
 def too_large(e):
@@ -37,11 +57,13 @@ def allowed_file(filename):
 def get_landing_pages():
     """Get list of all generated landing pages"""
     pages = []
-    for html_file in glob.glob('landing_pages/*.html'):
-        filename = os.path.basename(html_file)
+    for obj in get_collection('landing_pages').list():
+        filename = os.path.basename(obj.key)
+        if not filename.endswith('.html'):
+            continue
         name = filename.replace('.html', '').replace('-', ' ').title()
-        size = os.path.getsize(html_file)
-        modified = datetime.fromtimestamp(os.path.getmtime(html_file))
+        size = obj.size
+        modified = obj.modified
         
         pages.append({
             'filename': filename,
@@ -92,6 +114,7 @@ def upload_and_generate():
                 filename = secure_filename(f"{search_term.lower().replace(' ', '_')}_pinterest.json")
                 filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 file.save(filepath)
+                get_capture_store().ingest(filepath)
                 pinterest_file = filepath
         elif request.form.get('pinterest_content', '').strip():
             # Pasted content
@@ -103,6 +126,7 @@ def upload_and_generate():
                 filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 with open(filepath, 'w', encoding='utf-8') as f:
                     f.write(pinterest_content)
+                get_capture_store().ingest(filepath)
                 pinterest_file = filepath
             except json.JSONDecodeError:
                 flash('Invalid JSON format in Pinterest content. Please check your data.', 'error')
@@ -116,6 +140,7 @@ def upload_and_generate():
                 filename = secure_filename(f"{search_term.lower().replace(' ', '_')}_google.html")
                 filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 file.save(filepath)
+                get_capture_store().ingest(filepath)
                 google_file = filepath
         elif request.form.get('google_content', '').strip():
             # Pasted content
@@ -124,6 +149,7 @@ def upload_and_generate():
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             with open(filepath, 'w', encoding='utf-8') as f:
                 f.write(google_content)
+            get_capture_store().ingest(filepath)
             google_file = filepath
         
         # Check if at least one data source is provided
@@ -149,10 +175,11 @@ def upload_and_generate():
 @app.route('/view/<filename>')
 def view_page(filename):
     """View a specific landing page"""
-    filepath = os.path.join('landing_pages', filename)
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
+    filepath = get_collection('landing_pages').local_path(filename)
+    if filepath:
+        with stage_timer('read_landing_page'):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                content = f.read()
         return content
     else:
         flash('Page not found!', 'error')
@@ -161,9 +188,9 @@ def view_page(filename):
 @app.route('/download/<filename>')
 def download_page(filename):
     """Download a landing page HTML file"""
-    filepath = os.path.join('landing_pages', filename)
-    if os.path.exists(filepath):
-        return send_file(filepath, as_attachment=True)
+    filepath = get_collection('landing_pages').local_path(filename)
+    if filepath:
+        return offload.send_stored_file(filepath, as_attachment=True)
     else:
         flash('File not found!', 'error')
         return redirect(url_for('home'))
@@ -195,18 +222,10 @@ def download_csv(filename):
         writer = csv.writer(output)
         
         # Write header
-        writer.writerow(['Title', 'Price', 'Image URL', 'Product URL', 'Source', 'Description'])
+        writer.writerow(CSV_HEADER)
         
         # Write product data
-        for product in products:
-            writer.writerow([
-                product.get('title', ''),
-                product.get('price', ''),
-                product.get('image_url', ''),
-                product.get('url', ''),
-                product.get('source', ''),
-                product.get('description', '')
-            ])
+        writer.writerows(product.csv_row() for product in products)
         
         output.seek(0)
         csv_content = output.getvalue()
@@ -225,9 +244,8 @@ def download_csv(filename):
 @app.route('/delete/<filename>')
 def delete_page(filename):
     """Delete a landing page"""
-    filepath = os.path.join('landing_pages', filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
+    if get_collection('landing_pages').exists(filename):
+        get_collection('landing_pages').delete(filename)
         flash(f'Successfully deleted {filename}', 'success')
     else:
         flash('File not found!', 'error')
@@ -306,17 +324,9 @@ def edit_page(filename):
         search_term = filename.replace('.html', '').replace('-', ' ')
         
         # Get existing data files for this search term
-        data_dir = 'scraped_data'
-        pinterest_file = None
-        google_file = None
-        
-        if os.path.exists(data_dir):
-            for file in os.listdir(data_dir):
-                if file.startswith(search_term.lower().replace(' ', '_')):
-                    if 'pinterest' in file:
-                        pinterest_file = file
-                    elif 'google' in file:
-                        google_file = file
+        pinterest_path, google_path = get_capture_registry('scraped_data').latest_pair(search_term)
+        pinterest_file = os.path.basename(pinterest_path) if pinterest_path else None
+        google_file = os.path.basename(google_path) if google_path else None
         
         return render_template('edit.html', 
                              search_term=search_term,
@@ -345,12 +355,14 @@ def update_page(filename):
             if file.filename.endswith('.json') or file.filename.endswith('.html'):
                 pinterest_file = f"{search_term.lower().replace(' ', '_')}_pinterest{os.path.splitext(file.filename)[1]}"
                 file.save(os.path.join('scraped_data', pinterest_file))
+                get_capture_store().ingest(os.path.join('scraped_data', pinterest_file))
         
         if 'google_file' in request.files and request.files['google_file'].filename:
             file = request.files['google_file']
             if file.filename.endswith('.html'):
                 google_file = f"{search_term.lower().replace(' ', '_')}_google.html"
                 file.save(os.path.join('scraped_data', google_file))
+                get_capture_store().ingest(os.path.join('scraped_data', google_file))
         
         # Handle pasted content
         pinterest_content = request.form.get('pinterest_content', '').strip()
@@ -360,11 +372,19 @@ def update_page(filename):
             pinterest_file = f"{search_term.lower().replace(' ', '_')}_pinterest.json"
             with open(os.path.join('scraped_data', pinterest_file), 'w', encoding='utf-8') as f:
                 f.write(pinterest_content)
+            get_capture_store().ingest(os.path.join('scraped_data', pinterest_file))
         
         if google_content:
             google_file = f"{search_term.lower().replace(' ', '_')}_google.html"
             with open(os.path.join('scraped_data', google_file), 'w', encoding='utf-8') as f:
                 f.write(google_content)
+            get_capture_store().ingest(os.path.join('scraped_data', google_file))
+        
+        registry = get_capture_registry('scraped_data')
+        if pinterest_file:
+            registry.record(search_term, 'pinterest', os.path.join('scraped_data', pinterest_file))
+        if google_file:
+            registry.record(search_term, 'google', os.path.join('scraped_data', google_file))
         
         # Generate updated landing page
         generator = TrendLandingPageGenerator()
@@ -384,13 +404,15 @@ def update_page(filename):
 @app.route('/looks')
 def looks_gallery():
     """Gallery of all generated looks"""
-    looks = look_generator.get_all_looks()
+    from look_generator import get_all_looks
+    looks = get_all_looks()
     return render_template('looks_gallery.html', looks=looks)
 
 @app.route('/looks/<look_id>')
 def view_look(look_id):
     """View a specific generated look"""
-    look_data = look_generator.get_look_by_id(look_id)
+    from look_generator import get_look_by_id
+    look_data = get_look_by_id(look_id)
     if not look_data:
         flash('Look not found!', 'error')
         return redirect(url_for('looks_gallery'))
@@ -422,7 +444,7 @@ def generate_look():
             })
         
         # Generate the look
-        result = look_generator.generate_shoppable_look(
+        result = get_look_generator().generate_shoppable_look(
             selected_products, 
             style_prompt, 
             landing_page_name
@@ -450,9 +472,9 @@ def generate_look():
 @app.route('/looks/images/<filename>')
 def serve_look_image(filename):
     """Serve look images"""
-    image_path = os.path.join('looks', 'images', filename)
-    if os.path.exists(image_path):
-        return send_file(image_path)
+    image_path = get_collection('looks/images').local_path(filename)
+    if image_path:
+        return offload.send_stored_file(image_path, max_age=offload.IMAGE_MAX_AGE)
     else:
         return 'Image not found', 404
 
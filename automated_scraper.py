@@ -13,11 +13,17 @@ from urllib.parse import quote, urlencode
 from bs4 import BeautifulSoup
 import re
 from datetime import datetime
+from product import Product, to_json
+from capture_registry import get_capture_registry
+from http_cache import HTTPCache, CACHE_TERM_HEADER, install as install_http_cache
 
 class AutomatedTrendScraper:
-    def __init__(self, output_dir="scraped_data"):
+    def __init__(self, output_dir="scraped_data", pinterest_base_url=None, page_delay=None, http_cache=None):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
+        # Point at fixture_server.py to run against recorded captures instead of pinterest.com
+        self.pinterest_base_url = (pinterest_base_url or os.getenv('PINTEREST_BASE_URL', 'https://www.pinterest.com')).rstrip('/')
+        self.page_delay = page_delay if page_delay is not None else float(os.getenv('PINTEREST_PAGE_DELAY', '1.0'))
         
         # Session with realistic headers
         self.session = requests.Session()
@@ -34,51 +40,118 @@ class AutomatedTrendScraper:
             'Sec-Fetch-Site': 'none',
             'Cache-Control': 'max-age=0'
         })
+        # Serve repeat fetches from disk and revalidate stale ones with If-None-Match/If-Modified-Since
+        self.http_cache = install_http_cache(self.session, http_cache or HTTPCache())
     
-    def scrape_pinterest(self, search_term, max_results=50):
-        """Scrape Pinterest for products related to search term"""
-        print(f"🔍 Scraping Pinterest for '{search_term}'...")
+    def pinterest_output_path(self, search_term):
+        return os.path.join(self.output_dir, f"{search_term.lower().replace(' ', '_')}_pinterest.ndjson")
+    
+    def load_fetch_state(self, state_path, search_term):
+        """Bookmark and count from an earlier, interrupted fetch of the same search term"""
+        if not os.path.exists(state_path):
+            return None
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return state if state.get('search_term') == search_term else None
+    
+    def save_fetch_state(self, state_path, state):
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, state_path)
+    
+    def fetch_pinterest_pages(self, search_term, max_results=50, output_path=None, resume=True, page_size=25, max_pages=None):
+        """Follow Pinterest search bookmarks, streaming each page of pins to an NDJSON file.
         
-        # Pinterest search URL
-        encoded_term = quote(search_term)
-        url = f"https://www.pinterest.com/search/pins/?q={encoded_term}&rs=typed"
+        Progress (bookmark, pin count and the byte size of the pages written so far)
+        is recorded in <output>.state after every page, so an interrupted fetch picks
+        up from the last bookmark instead of starting over. The state is removed once
+        the fetch completes, so the next scrape of the term fetches fresh results.
+        """
+        output_path = output_path or self.pinterest_output_path(search_term)
+        state_path = output_path + '.state'
+        state = self.load_fetch_state(state_path, search_term) if resume and os.path.exists(output_path) else None
+        # Only an unfinished fetch is resumed, and only if the file still holds every page it recorded
+        if state and (state.get('complete') or state['count'] >= max_results or 'size' not in state
+                      or os.path.getsize(output_path) < state['size']):
+            state = None
+        if state:
+            print(f"↩️  Resuming Pinterest fetch for '{search_term}' after {state['count']} pins")
+            # Drop anything written after the last recorded page: a half-written line or a page whose state wasn't saved
+            with open(output_path, 'r+b') as f:
+                f.truncate(state['size'])
+        else:
+            state = {'search_term': search_term, 'bookmark': None, 'count': 0, 'pages': 0, 'size': 0, 'complete': False}
+            open(output_path, 'w').close()
         
-        try:
-            # Add Pinterest-specific headers
-            headers = {
-                'Referer': 'https://www.pinterest.com/',
-                'X-Requested-With': 'XMLHttpRequest',
-                'Accept': 'application/json, text/javascript, */*; q=0.01'
+        source_url = f"/search/pins/?q={quote(search_term)}&rs=typed"
+        headers = {
+            'Referer': f"{self.pinterest_base_url}/",
+            'X-Requested-With': 'XMLHttpRequest',
+            'X-Pinterest-Source-Url': source_url,
+            'Accept': 'application/json, text/javascript, */*; q=0.01',
+            CACHE_TERM_HEADER: search_term
+        }
+        pages_this_run = 0
+        while state['count'] < max_results:
+            if max_pages is not None and pages_this_run >= max_pages:
+                break
+            options = {
+                'query': search_term,
+                'scope': 'pins',
+                'page_size': min(page_size, max_results - state['count']),
+                'bookmarks': [state['bookmark']] if state['bookmark'] else []
             }
-            
-            response = self.session.get(url, headers=headers, timeout=30)
+            params = {'source_url': source_url, 'data': json.dumps({'options': options, 'context': {}}, separators=(',', ':'))}
+            response = self.session.get(f"{self.pinterest_base_url}/resource/BaseSearchResource/get/",
+                                        params=params, headers=headers, timeout=30)
             response.raise_for_status()
+            resource_response = response.json().get('resource_response', {})
+            data = resource_response.get('data') or {}
+            results = data.get('results', []) if isinstance(data, dict) else data
+            results = results[:max_results - state['count']]
             
-            # Extract JSON data from Pinterest response
-            # Pinterest loads data dynamically, so we need to look for JSON in the HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Look for JSON data in script tags
-            json_data = None
-            for script in soup.find_all('script'):
-                if script.string and 'window.__INITIAL_STATE__' in script.string:
-                    # Extract JSON from the script
-                    json_str = script.string.split('window.__INITIAL_STATE__ = ')[1].split(';</script>')[0]
-                    json_data = json.loads(json_str)
-                    break
-            
-            if not json_data:
-                print("❌ Could not find Pinterest data in page")
-                return []
-            
-            # Extract products from Pinterest data structure
-            products = []
-            # This is a simplified extraction - Pinterest's structure can be complex
-            # You might need to adjust based on the actual response structure
-            
-            print(f"✅ Found Pinterest data structure")
-            return products
+            # Append the page before moving the bookmark, so a crash can only repeat a page, never skip one
+            with open(output_path, 'a', encoding='utf-8') as f:
+                for pin in results:
+                    f.write(json.dumps(pin, ensure_ascii=False, separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
             
+            bookmark = resource_response.get('bookmark')
+            state.update({
+                'bookmark': bookmark,
+                'count': state['count'] + len(results),
+                'pages': state['pages'] + 1,
+                'size': os.path.getsize(output_path),
+                'updated_at': datetime.now().isoformat()
+            })
+            state['complete'] = not results or not bookmark or bookmark == '-end-' or state['count'] >= max_results
+            if state['complete']:
+                if os.path.exists(state_path):
+                    os.remove(state_path)
+            else:
+                self.save_fetch_state(state_path, state)
+            pages_this_run += 1
+            print(f"📄 Page {state['pages']}: {len(results)} pins ({state['count']} total)")
+            if state['complete']:
+                break
+            if not getattr(response, 'from_cache', False):
+                time.sleep(self.page_delay)
+        
+        print(f"✅ Fetched {state['count']} Pinterest pins into {output_path}")
+        return output_path
+    
+    def scrape_pinterest(self, search_term, max_results=50):
+        """Scrape Pinterest for products related to search term"""
+        print(f"🔍 Scraping Pinterest for '{search_term}'...")
+        try:
+            output_path = self.fetch_pinterest_pages(search_term, max_results)
+            with open(output_path, 'r', encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
         except Exception as e:
             print(f"❌ Error scraping Pinterest: {e}")
             return []
@@ -96,6 +169,7 @@ class AutomatedTrendScraper:
             headers = {
                 'Referer': 'https://www.google.com/',
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                CACHE_TERM_HEADER: search_term
             }
             
             response = self.session.get(url, headers=headers, timeout=30)
@@ -143,13 +217,15 @@ class AutomatedTrendScraper:
             link = link_elem.get('adurl') or link_elem.get('href') if link_elem else ''
             
             if title and link:
-                return {
-                    'title': title,
-                    'price': price,
-                    'image_url': image_url,
-                    'link': link,
-                    'source': 'Google Shopping'
-                }
+                return Product(
+                    title=title,
+                    display_name=title,
+                    image_url=image_url,
+                    url=link,
+                    price=price,
+                    description=title,
+                    source='Google Shopping'
+                )
         except Exception as e:
             print(f"❌ Error in extract_google_product: {e}")
         
@@ -168,13 +244,19 @@ class AutomatedTrendScraper:
                 json.dump(pinterest_data, f, indent=2, ensure_ascii=False)
             print(f"✅ Saved Pinterest data: {pinterest_file}")
         
-        # Save Google data
+        # Save Google data; extracted products go out as the JSON list parse_google_json reads
         if google_data:
-            google_file = os.path.join(self.output_dir, f"{slug}_google_{timestamp}.html")
+            google_file = os.path.join(self.output_dir, f"{slug}_google_{timestamp}.json")
             with open(google_file, 'w', encoding='utf-8') as f:
-                f.write(google_data)
+                json.dump(google_data, f, indent=2, ensure_ascii=False, default=to_json)
             print(f"✅ Saved Google data: {google_file}")
         
+        registry = get_capture_registry(self.output_dir)
+        if pinterest_data:
+            registry.record(search_term, 'pinterest', pinterest_file, products=len(pinterest_data))
+        if google_data:
+            registry.record(search_term, 'google', google_file, products=len(google_data))
+        
         return pinterest_file if pinterest_data else None, google_file if google_data else None
     
     def scrape_trend(self, search_term, max_results=50):
@@ -187,17 +269,22 @@ class AutomatedTrendScraper:
         print(f"⏳ Waiting {delay:.1f} seconds...")
         time.sleep(delay)
         
-        # Scrape both sources
+        # Scrape both sources; Pinterest pages are already streamed to NDJSON as they arrive
         pinterest_data = self.scrape_pinterest(search_term, max_results)
+        pinterest_file = self.pinterest_output_path(search_term) if pinterest_data else None
+        if pinterest_file:
+            get_capture_registry(self.output_dir).record(search_term, 'pinterest', pinterest_file, products=len(pinterest_data))
         google_data = self.scrape_google_shopping(search_term, max_results)
         
         # Save data
-        pinterest_file, google_file = self.save_data(search_term, pinterest_data, google_data)
+        _, google_file = self.save_data(search_term, None, google_data)
         
         print("=" * 50)
         print(f"✅ Scraping complete for '{search_term}'")
         print(f"📊 Pinterest products: {len(pinterest_data)}")
         print(f"📊 Google products: {len(google_data)}")
+        stats = self.http_cache.stats
+        print(f"🗄️  HTTP cache: {stats['hit']} fresh, {stats['revalidated']} revalidated (304), {stats['miss']} fetched")
         
         return pinterest_file, google_file
 
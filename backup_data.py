@@ -14,7 +14,7 @@ class DataBackup:
     def __init__(self, base_dir="."):
         self.base_dir = base_dir
         self.backup_dir = os.path.join(base_dir, "backups")
-        self.data_dirs = ["uploads", "landing_pages", "looks"]
+        self.data_dirs = ["uploads", "landing_pages", "looks", "captures", "overlays", "static/generated_images"]
         
         # Create backup directory if it doesn't exist
         if not os.path.exists(self.backup_dir):
@@ -0,0 +1,555 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark
+Times the ingest -> render -> serve pipeline against the checked-in captures
+and synthetically scaled copies of them, and compares results to a baseline.
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+import contextlib
+from datetime import datetime
+
+import logs
+from bs4 import BeautifulSoup
+from capture_store import capture_exists, open_capture, logical_name
+import trend_generator
+from trend_generator import TrendLandingPageGenerator
+from sharding import ShardedCollection
+from storage import LocalStorage
+
+BENCH_TERM = 'bench trend'
+FIXTURE_DIRS = ['uploads', 'scraped_data']
+# Subsystems that should only load on first use, never at app import
+DEFERRED_MODULES = ['openai', 'httpx', 'bs4', 'selenium', 'requests', 'look_generator']
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence parser chatter so it doesn't dominate the terminal during timing"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+class PipelineBenchmark:
+    def __init__(self, repo_dir=None, scales=(1, 10, 100), repeat=5):
+        self.repo_dir = os.path.abspath(repo_dir or os.path.dirname(os.path.abspath(__file__)))
+        self.scales = scales
+        self.repeat = repeat
+        self.generator = TrendLandingPageGenerator(output_dir=tempfile.mkdtemp(prefix='bench-pages-'))
+        self.results = {}
+
+    def find_fixtures(self):
+        """Collect checked-in captures by kind"""
+        fixtures = {'pinterest_json': [], 'pinterest_html': [], 'google_html': []}
+        for directory in FIXTURE_DIRS:
+            path = os.path.join(self.repo_dir, directory)
+            if not os.path.isdir(path):
+                continue
+            for name in sorted(set(map(logical_name, os.listdir(path)))):
+                full_path = os.path.join(path, name)
+                if name.endswith('.json'):
+                    fixtures['pinterest_json'].append(full_path)
+                elif name.endswith('.html') and 'pinterest' in name:
+                    fixtures['pinterest_html'].append(full_path)
+                elif name.endswith('.html') and 'google' in name:
+                    fixtures['google_html'].append(full_path)
+        return fixtures
+
+    def time_call(self, name, func, *args, setup=None):
+        """Run func repeat times and record wall-clock statistics in milliseconds; setup() runs untimed before each"""
+        timings = []
+        result = None
+        for _ in range(self.repeat):
+            with quiet():
+                if setup:
+                    setup()
+                start = time.perf_counter()
+                result = func(*args)
+                timings.append((time.perf_counter() - start) * 1000)
+        self.results[name] = {
+            'min_ms': round(min(timings), 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'runs': len(timings)
+        }
+        print(f"  ⏱️  {name:<45} median {self.results[name]['median_ms']:>10.2f} ms")
+        return result
+
+    # Synthetic scaling
+
+    def scale_pinterest_json(self, path, factor, out_path):
+        with open_capture(path) as f:
+            data = json.load(f)
+        results = data['resource_response']['data']['results']
+        scaled = []
+        for copy_index in range(factor):
+            for item in results:
+                item = dict(item)
+                item['id'] = f"{item.get('id', '')}-{copy_index}"
+                scaled.append(item)
+        data['resource_response']['data']['results'] = scaled
+        with open(out_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        return out_path
+
+    def scale_html(self, path, selector, factor, out_path):
+        """Write a document that contains only the product elements, repeated factor times"""
+        with open_capture(path) as f:
+            soup = BeautifulSoup(f, 'html.parser')
+        elements = soup.select(selector)
+        body = ''.join(str(element) for element in elements)
+        with open(out_path, 'w', encoding='utf-8') as f:
+            f.write('<!DOCTYPE html><html><body>')
+            for _ in range(factor):
+                f.write(body)
+            f.write('</body></html>')
+        return out_path
+
+    def build_workspace(self, factor):
+        """Create a throwaway app directory with scaled captures, pages and looks"""
+        workspace = tempfile.mkdtemp(prefix=f'bench-{factor}x-')
+        for directory in ['uploads', 'landing_pages', 'looks', 'looks/images']:
+            os.makedirs(os.path.join(workspace, directory), exist_ok=True)
+
+        slug_base = BENCH_TERM.replace(' ', '_')
+        pinterest_file = self.scale_pinterest_json(
+            os.path.join(self.repo_dir, 'uploads', 'storage_hacks_pinterest.json'), factor,
+            os.path.join(workspace, 'uploads', f'{slug_base}_pinterest.json'))
+        google_file = self.scale_html(
+            os.path.join(self.repo_dir, 'uploads', 'storage_hacks_google.html'), '[data-docid], .pla-unit-container', factor,
+            os.path.join(workspace, 'uploads', f'{slug_base}_google.html'))
+        pinterest_html = self.scale_html(
+            os.path.join(self.repo_dir, 'uploads', 'nancy_meyers_bedroom_aesthetic_pinterest.html'),
+            '[data-test-id="pin"]', factor,
+            os.path.join(workspace, 'uploads', f'{slug_base}_pins.html'))
+
+        # Landing pages: the checked-in set plus the scaled benchmark page
+        workspace_pages = ShardedCollection(os.path.join(workspace, 'landing_pages'), LocalStorage())
+        for obj in ShardedCollection(os.path.join(self.repo_dir, 'landing_pages'), LocalStorage()).list():
+            if obj.key.endswith('.html'):
+                with open(obj.key, 'rb') as f:
+                    workspace_pages.write_bytes(os.path.basename(obj.key), f.read())
+        with quiet():
+            TrendLandingPageGenerator(output_dir=os.path.join(workspace, 'landing_pages')).create_landing_page(
+                BENCH_TERM, pinterest_file, google_file)
+
+        # Looks: the checked-in set, repeated factor times
+        workspace_looks = ShardedCollection(os.path.join(workspace, 'looks'), LocalStorage())
+        for obj in ShardedCollection(os.path.join(self.repo_dir, 'looks'), LocalStorage()).list():
+            name = os.path.basename(obj.key)
+            if not name.endswith('.json'):
+                continue
+            with open(obj.key, 'r', encoding='utf-8') as f:
+                look = json.load(f)
+            for copy_index in range(factor):
+                scaled_look = copy.deepcopy(look)
+                scaled_look['id'] = f"{look.get('id', name[:-5])}_{copy_index}"
+                workspace_looks.write_text(f"{scaled_look['id']}.json", json.dumps(scaled_look))
+
+        return {
+            'dir': workspace,
+            'pinterest_json': pinterest_file,
+            'pinterest_html': pinterest_html,
+            'google_html': google_file
+        }
+
+    # Benchmarks
+
+    def bench_fixtures(self):
+        """Parse every checked-in capture once per run"""
+        print("📁 Checked-in fixtures")
+        fixtures = self.find_fixtures()
+        parsers = {
+            'pinterest_json': self.generator.parse_pinterest_json,
+            'pinterest_html': self.generator.parse_pinterest_html,
+            'google_html': self.generator.parse_google_html
+        }
+        for kind, paths in fixtures.items():
+            parser = parsers[kind]
+            paths = [path for path in paths if capture_exists(path)]
+            self.time_call(f"{parser.__name__}@fixtures", lambda: [parser(path) for path in paths])
+
+    def bench_scaled(self, factor):
+        print(f"📈 Scale {factor}x")
+        workspace = self.build_workspace(factor)
+        label = f"@{factor}x"
+        try:
+            products = self.time_call(f"parse_pinterest_json{label}", self.generator.parse_pinterest_json, workspace['pinterest_json'])
+            products += self.time_call(f"parse_google_html{label}", self.generator.parse_google_html, workspace['google_html'])
+            self.time_call(f"parse_pinterest_html{label}", self.generator.parse_pinterest_html, workspace['pinterest_html'])
+            self.time_call(f"generate_html{label}", self.generator.generate_html, BENCH_TERM, products,
+                           setup=trend_generator._card_cache.clear)
+            self.time_call(f"get_product_data{label}", self.generator.get_product_data, BENCH_TERM,
+                           workspace['pinterest_json'], workspace['google_html'])
+            with working_directory(workspace['dir']):
+                self.bench_routes(label)
+        finally:
+            shutil.rmtree(workspace['dir'], ignore_errors=True)
+
+    def bench_routes(self, label):
+        """Exercise the Flask routes through the test client, rendering every request: the response cache is
+        off and the card fragment cache is emptied before each run, so a repeat never measures a cache hit"""
+        import response_cache
+        from simple_app import app
+        client = app.test_client()
+
+        def cold_caches():
+            response_cache.get_response_cache().clear()
+            trend_generator._card_cache.clear()
+        page = f"{BENCH_TERM.replace(' ', '-')}.html"
+        routes = {
+            '/': '/',
+            '/view': f'/view/{page}',
+            '/view_with_looks': f'/view_with_looks/{page}',
+            '/download_csv': f'/download_csv/{page}',
+            '/looks': '/looks'
+        }
+        response_cache_enabled = response_cache.RESPONSE_CACHE
+        response_cache.RESPONSE_CACHE = False
+        try:
+            for name, url in routes.items():
+                response = self.time_call(f"GET {name}{label}", client.get, url, setup=cold_caches)
+                if response.status_code != 200:
+                    print(f"  ⚠️  {url} returned {response.status_code}")
+        finally:
+            response_cache.RESPONSE_CACHE = response_cache_enabled
+
+    def run(self):
+        print("🚀 Running pipeline benchmark")
+        print("=" * 50)
+        self.bench_fixtures()
+        for factor in self.scales:
+            self.bench_scaled(factor)
+        shutil.rmtree(self.generator.output_dir, ignore_errors=True)
+        return {
+            'meta': {
+                'created_at': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': self.repeat,
+                'scales': list(self.scales)
+            },
+            'results': self.results
+        }
+
+
+
+class LoggingBenchmark:
+    """Parse time of the HTML captures at each logging level, with log output going to a real file"""
+
+    MODES = [
+        ('DEBUG, every item', 'DEBUG', '1'),
+        ('DEBUG, sampled', 'DEBUG', None),
+        ('INFO', 'INFO', None)
+    ]
+
+    def __init__(self, repeat=5, repo_dir=None):
+        self.pipeline = PipelineBenchmark(repo_dir=repo_dir, scales=(), repeat=repeat)
+        self.results = self.pipeline.results
+
+    def tag_docids(self, paths, out_dir):
+        """Copies of the Google captures with data-docid on each PLA unit, so the per-product path runs"""
+        tagged = []
+        for path in paths:
+            with open_capture(path) as f:
+                soup = BeautifulSoup(f, 'html.parser')
+            for index, unit in enumerate(soup.select('.pla-unit-container')):
+                unit['data-docid'] = str(index)
+            out_path = os.path.join(out_dir, os.path.basename(path))
+            with open(out_path, 'w', encoding='utf-8') as f:
+                f.write(str(soup))
+            tagged.append(out_path)
+        return tagged
+
+    def run(self):
+        print("🚀 Running logging benchmark")
+        print("=" * 50)
+        fixtures = self.pipeline.find_fixtures()
+        generator = self.pipeline.generator
+        google_html = [path for path in fixtures['google_html'] if capture_exists(path)]
+        docid_dir = tempfile.mkdtemp(prefix='bench-docid-')
+        parsers = {
+            'parse_google_html': (generator.parse_google_html, google_html),
+            'parse_google_html[docid]': (generator.parse_google_html, self.tag_docids(google_html, docid_dir)),
+            'parse_pinterest_html': (generator.parse_pinterest_html, fixtures['pinterest_html'])
+        }
+        sample_every = os.environ.get('LOG_SAMPLE_EVERY')
+        log_volume = {}
+        try:
+            for label, level, every in self.MODES:
+                print(f"📝 LOG_LEVEL={label}")
+                if every:
+                    os.environ['LOG_SAMPLE_EVERY'] = every
+                elif sample_every is None:
+                    os.environ.pop('LOG_SAMPLE_EVERY', None)
+                else:
+                    os.environ['LOG_SAMPLE_EVERY'] = sample_every
+                with tempfile.TemporaryFile('w+', encoding='utf-8') as log_file:
+                    logs.configure(level=level, stream=log_file)
+                    for name, (parser, paths) in parsers.items():
+                        paths = [path for path in paths if capture_exists(path)]
+                        self.pipeline.time_call(f"{name}@{label}", lambda: [parser(path) for path in paths])
+                    log_file.flush()
+                    log_volume[label] = log_file.tell()
+                print(f"  📦 {log_volume[label]:,} bytes of log output")
+        finally:
+            logs.configure()
+            shutil.rmtree(generator.output_dir, ignore_errors=True)
+            shutil.rmtree(docid_dir, ignore_errors=True)
+        return {
+            'meta': {
+                'created_at': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': self.pipeline.repeat,
+                'log_bytes': log_volume
+            },
+            'results': self.results
+        }
+
+
+class StartupBenchmark:
+    def __init__(self, modules=('wsgi', 'app'), repeat=5, budget_ms=200, repo_dir=None):
+        self.repo_dir = os.path.abspath(repo_dir or os.path.dirname(os.path.abspath(__file__)))
+        self.modules = modules
+        self.repeat = repeat
+        self.budget_ms = budget_ms
+        self.results = {}
+        self.over_budget = []
+
+    def measure_import(self, module):
+        """Import a module in a fresh interpreter and report its import time and which deferred modules it pulled in"""
+        code = (
+            "import sys, time, json\n"
+            "start = time.perf_counter()\n"
+            f"import {module}\n"
+            "elapsed = (time.perf_counter() - start) * 1000\n"
+            f"print(json.dumps({{'ms': elapsed, 'loaded': [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))\n"
+        )
+        result = subprocess.run([sys.executable, '-c', code], cwd=self.repo_dir,
+                                capture_output=True, text=True, check=True)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def import_report(self, module, top=15):
+        """python -X importtime breakdown: the slowest imports by cumulative time"""
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                                cwd=self.repo_dir, capture_output=True, text=True, check=True)
+        entries = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            depth = (len(name) - len(name.lstrip())) // 2
+            entries.append({
+                'module': name.strip(),
+                'depth': depth,
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000
+            })
+        entries.sort(key=lambda entry: entry['cumulative_ms'], reverse=True)
+        return entries[:top]
+
+    def run(self):
+        print("🚀 Running startup benchmark")
+        print("=" * 50)
+        reports = {}
+        for module in self.modules:
+            timings = []
+            loaded = []
+            for _ in range(self.repeat):
+                measurement = self.measure_import(module)
+                timings.append(measurement['ms'])
+                loaded = measurement['loaded']
+            name = f"import {module}"
+            self.results[name] = {
+                'min_ms': round(min(timings), 3),
+                'median_ms': round(statistics.median(timings), 3),
+                'mean_ms': round(statistics.mean(timings), 3),
+                'runs': len(timings),
+                'budget_ms': self.budget_ms,
+                'deferred_modules_loaded': loaded
+            }
+            status = "✅" if self.results[name]['median_ms'] <= self.budget_ms else "❌"
+            print(f"{status} {name:<20} median {self.results[name]['median_ms']:>8.1f} ms (budget {self.budget_ms} ms)")
+            if loaded:
+                print(f"  ⚠️  Loaded at startup: {', '.join(loaded)}")
+            if self.results[name]['median_ms'] > self.budget_ms or loaded:
+                self.over_budget.append(name)
+
+            reports[module] = self.import_report(module)
+            print("  Slowest imports (cumulative):")
+            for entry in reports[module][:10]:
+                print(f"    {entry['cumulative_ms']:>8.1f} ms  {'  ' * entry['depth']}{entry['module']}")
+
+        return {
+            'meta': {
+                'created_at': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': self.repeat,
+                'budget_ms': self.budget_ms
+            },
+            'results': self.results,
+            'import_time': reports
+        }
+
+class ReproducibilityCheck:
+    """Builds every landing page that has captures in uploads/ twice, in separate interpreters
+    with different hash seeds, and checks the outputs are byte-identical"""
+
+    BUILD = (
+        "import sys, os, glob, json, hashlib, contextlib\n"
+        "from capture_store import logical_name\n"
+        "from trend_generator import TrendLandingPageGenerator\n"
+        "out_dir = sys.argv[1]\n"
+        "generator = TrendLandingPageGenerator(output_dir=out_dir)\n"
+        "slugs = sorted({os.path.basename(logical_name(p)).rsplit('_', 1)[0] for p in glob.glob('uploads/*_*.*')})\n"
+        "digests = {}\n"
+        "for slug in slugs:\n"
+        "    with contextlib.redirect_stdout(sys.stderr):\n"
+        "        path = generator.create_landing_page(slug.replace('_', ' '), f'uploads/{slug}_pinterest.json', f'uploads/{slug}_google.html')\n"
+        "    if path:\n"
+        "        with open(path, 'rb') as f:\n"
+        "            digests[os.path.basename(path)] = hashlib.sha256(f.read()).hexdigest()\n"
+        "print(json.dumps(digests))\n"
+    )
+
+    def __init__(self, repo_dir=None, hash_seeds=('1', '2')):
+        self.repo_dir = os.path.abspath(repo_dir or os.path.dirname(os.path.abspath(__file__)))
+        self.hash_seeds = hash_seeds
+        self.mismatches = []
+
+    def build(self, hash_seed):
+        out_dir = tempfile.mkdtemp(prefix='bench-repro-')
+        env = dict(os.environ, PYTHONHASHSEED=hash_seed, PRODUCT_ORDER='seeded')
+        try:
+            result = subprocess.run([sys.executable, '-c', self.BUILD, out_dir], cwd=self.repo_dir, env=env,
+                                    capture_output=True, text=True, check=True)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def run(self):
+        print("🚀 Checking landing page builds are reproducible")
+        print("=" * 50)
+        builds = [self.build(seed) for seed in self.hash_seeds]
+        for page in sorted(set().union(*builds)):
+            digests = {build.get(page) for build in builds}
+            if len(digests) == 1:
+                print(f"✅ {page:<45} {digests.pop()[:16]}")
+            else:
+                print(f"❌ {page:<45} differs between builds")
+                self.mismatches.append(page)
+        return {
+            'meta': {
+                'created_at': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'hash_seeds': list(self.hash_seeds)
+            },
+            'results': {},
+            'digests': builds[0],
+            'mismatches': self.mismatches
+        }
+
+
+def compare(report, baseline, threshold):
+    """Annotate results with their ratio to the baseline and return the regressions"""
+    regressions = []
+    baseline_results = baseline.get('results', {})
+    for name, result in report['results'].items():
+        previous = baseline_results.get(name)
+        if not previous or not previous.get('median_ms'):
+            continue
+        ratio = result['median_ms'] / previous['median_ms']
+        result['baseline_median_ms'] = previous['median_ms']
+        result['ratio'] = round(ratio, 3)
+        if ratio > 1 + threshold:
+            regressions.append((name, previous['median_ms'], result['median_ms'], ratio))
+    return regressions
+
+
+def main():
+    """Command line interface for the benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark the ingest -> render -> serve pipeline")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help="Product multipliers to run")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per case")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the JSON report")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="Baseline report to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument('--save-baseline', action='store_true', help="Write this run as the new baseline")
+    parser.add_argument('--startup', action='store_true', help="Measure app import time against a budget instead")
+    parser.add_argument('--budget-ms', type=float, default=200, help="Startup budget per entry point in milliseconds")
+    parser.add_argument('--modules', nargs='+', default=['wsgi', 'app'], help="Entry points to import for --startup")
+    parser.add_argument('--logging', action='store_true', help="Compare parse time at each log level instead")
+    parser.add_argument('--reproducible', action='store_true', help="Check that rebuilding the landing pages gives identical bytes instead")
+    args = parser.parse_args()
+
+    # Keep parser logs off the terminal, but still pay for real file writes as in production
+    log_file = tempfile.TemporaryFile('w+', encoding='utf-8')
+    logs.configure(stream=log_file)
+
+    startup = None
+    reproducibility = None
+    if args.reproducible:
+        reproducibility = ReproducibilityCheck()
+        report = reproducibility.run()
+    elif args.logging:
+        report = LoggingBenchmark(repeat=args.repeat).run()
+    elif args.startup:
+        startup = StartupBenchmark(modules=args.modules, repeat=args.repeat, budget_ms=args.budget_ms)
+        report = startup.run()
+    else:
+        report = PipelineBenchmark(scales=args.scales, repeat=args.repeat).run()
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print("=" * 50)
+    print(f"✅ Results written to {args.output}")
+
+    if reproducibility and reproducibility.mismatches:
+        print(f"❌ Not reproducible: {', '.join(reproducibility.mismatches)}")
+        sys.exit(1)
+
+    if startup and startup.over_budget:
+        print(f"❌ Over startup budget: {', '.join(startup.over_budget)}")
+        sys.exit(1)
+
+    if args.save_baseline:
+        shutil.copy(args.output, args.baseline)
+        print(f"📌 Saved baseline to {args.baseline}")
+    elif regressions:
+        print(f"❌ {len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for name, before, after, ratio in regressions:
+            print(f"  {name}: {before:.2f} ms -> {after:.2f} ms ({ratio:.2f}x)")
+        sys.exit(1)
+    elif os.path.exists(args.baseline):
+        print("✅ No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Capture Registry
+Index of the scraped captures in a data directory, so finding the latest
+Pinterest/Google capture for a search term is a dict lookup instead of a
+listdir and substring scan.
+
+Writers call record() when they save a capture; the index lives next to the
+captures in captures.index (JSON) and holds the term, source, timestamp,
+SHA-256 and product count of every capture plus a latest-by-term table.
+
+    python capture_registry.py rebuild [dir]  - Index the captures already on disk
+    python capture_registry.py list [dir]     - Show the indexed captures by term
+"""
+
+import os
+import re
+import sys
+import json
+import fcntl
+import tempfile
+from datetime import datetime
+
+from capture_store import capture_exists, capture_signature, get_capture_store, logical_name
+
+INDEX_NAME = 'captures.index'
+# <slug>_<source>[_<YYYYmmdd_HHMMSS>].<ext>, the names written by the scrapers and upload forms
+CAPTURE_NAME = re.compile(r'^(?P<slug>.+?)_(?P<source>pinterest|google)(?:_(?P<timestamp>\d{8}_\d{6}))?\.(?:json|ndjson|html)$')
+
+
+def parse_capture_name(name):
+    """(term, source, timestamp or None) for a capture file name, or None if it isn't one"""
+    match = CAPTURE_NAME.match(logical_name(name))
+    if not match:
+        return None
+    timestamp = match.group('timestamp')
+    if timestamp:
+        timestamp = datetime.strptime(timestamp, '%Y%m%d_%H%M%S').isoformat()
+    return match.group('slug').replace('_', ' ').replace('-', ' '), match.group('source'), timestamp
+
+
+def term_key(search_term):
+    """Normalized term used as the index key; 'Storage Hacks', 'storage-hacks' and 'storage_hacks' match"""
+    return re.sub(r'[^a-z0-9]+', '_', search_term.lower()).strip('_')
+
+
+class CaptureRegistry:
+    def __init__(self, data_dir='scraped_data'):
+        self.data_dir = data_dir
+        self.index_path = os.path.join(data_dir, INDEX_NAME)
+        self._index = None
+        self._signature = None
+
+    def _empty(self):
+        return {'version': 1, 'captures': {}, 'latest': {}}
+
+    def load(self):
+        """The index, re-read only when another process has rewritten it"""
+        signature = capture_signature(self.index_path)
+        if self._index is None or signature != self._signature:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = self._empty()
+            self._signature = signature
+        return self._index
+
+    def _save(self, index):
+        os.makedirs(self.data_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+        self._index = index
+        self._signature = capture_signature(self.index_path)
+
+    def _locked(self):
+        """Exclusive lock around read-modify-write so concurrent scrapers don't drop entries"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        lock = open(self.index_path + '.lock', 'w')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _add(self, index, entry, newest=False):
+        index['captures'][entry['path']] = entry
+        latest = index['latest'].setdefault(entry['term_key'], {})
+        current = index['captures'].get(latest.get(entry['source']))
+        if newest or not current or (entry['timestamp'], entry['path']) >= (current['timestamp'], current['path']):
+            latest[entry['source']] = entry['path']
+
+    def _entry(self, search_term, source, path, products=None, timestamp=None):
+        path = os.path.normpath(logical_name(path))
+        return {
+            'term': search_term,
+            'term_key': term_key(search_term),
+            'source': source,
+            'path': path,
+            'timestamp': timestamp or datetime.now().isoformat(timespec='seconds'),
+            'sha256': get_capture_store().sha256_of(path),
+            'products': products
+        }
+
+    def record(self, search_term, source, path, products=None, timestamp=None):
+        """Register a capture that was just written and make it the latest for its term"""
+        entry = self._entry(search_term, source, path, products, timestamp)
+        lock = self._locked()
+        try:
+            self._signature = None
+            index = self.load()
+            self._add(index, entry, newest=timestamp is None)
+            self._save(index)
+        finally:
+            lock.close()
+        return entry
+
+    def latest(self, search_term, source):
+        """Path of the newest capture of a term from one source, or None"""
+        index = self.load()
+        path = index['latest'].get(term_key(search_term), {}).get(source)
+        return path if path and capture_exists(path) else None
+
+    def latest_pair(self, search_term):
+        return self.latest(search_term, 'pinterest'), self.latest(search_term, 'google')
+
+    def entries(self):
+        """All indexed captures grouped by term key, newest first"""
+        grouped = {}
+        for entry in self.load()['captures'].values():
+            grouped.setdefault(entry['term_key'], []).append(entry)
+        for entries in grouped.values():
+            entries.sort(key=lambda entry: entry['timestamp'], reverse=True)
+        return grouped
+
+    def rebuild(self):
+        """Index every capture already in the data directory (one scan, for trees that predate the registry).
+        The scan and the write hold the same lock as record(), so a capture recorded meanwhile isn't dropped"""
+        lock = self._locked()
+        try:
+            index = self._empty()
+            if os.path.isdir(self.data_dir):
+                for name in sorted(set(map(logical_name, os.listdir(self.data_dir)))):
+                    parsed = parse_capture_name(name)
+                    if not parsed:
+                        continue
+                    search_term, source, timestamp = parsed
+                    path = os.path.join(self.data_dir, name)
+                    if not timestamp:
+                        timestamp = datetime.fromtimestamp(capture_signature(path)[0] / 1e9).isoformat(timespec='seconds')
+                    self._add(index, self._entry(search_term, source, path, timestamp=timestamp))
+            self._save(index)
+        finally:
+            lock.close()
+        return index
+
+
+_registries = {}
+
+
+def get_capture_registry(data_dir='scraped_data'):
+    """Shared registry per data directory; the first use indexes captures that predate it"""
+    registry = _registries.get(data_dir)
+    if registry is None:
+        registry = _registries[data_dir] = CaptureRegistry(data_dir)
+        if not os.path.exists(registry.index_path):
+            registry.rebuild()
+    return registry
+
+
+def main():
+    """Command line interface for the capture registry"""
+    if len(sys.argv) < 2 or sys.argv[1] not in ("rebuild", "list"):
+        print("Usage:")
+        print("  python capture_registry.py rebuild [dir]  - Index the captures already on disk")
+        print("  python capture_registry.py list [dir]     - Show the indexed captures by term")
+        return
+    registry = CaptureRegistry(sys.argv[2] if len(sys.argv) > 2 else 'scraped_data')
+    if sys.argv[1] == "rebuild":
+        index = registry.rebuild()
+        print(f"🗂️  Indexed {len(index['captures'])} captures for {len(index['latest'])} terms in {registry.index_path}")
+    else:
+        for key, entries in sorted(registry.entries().items()):
+            print(f"\n🔍 {entries[0]['term'].title()}:")
+            for entry in entries:
+                products = '?' if entry['products'] is None else entry['products']
+                print(f"  📄 {os.path.basename(entry['path'])} ({entry['source']}, {products} products, {entry['timestamp']})")
+
+if __name__ == "__main__":
+    main()
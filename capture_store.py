@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Capture Store
+Content-addressed, compressed storage for raw Pinterest/Google captures.
+
+Each capture is stored once under captures/objects/ keyed by the SHA-256 of
+its uncompressed bytes. The original location (e.g. uploads/powder_room_pinterest.json)
+keeps a small alias record (powder_room_pinterest.json.ref) pointing at the object,
+so several names for the same capture only cost one compressed copy.
+"""
+
+import os
+import io
+import sys
+import json
+import gzip
+import hashlib
+import tempfile
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ALIAS_SUFFIX = '.ref'
+CAPTURE_EXTENSIONS = ('.json', '.html', '.ndjson')
+
+
+class CaptureStore:
+    def __init__(self, root=None, codec=None):
+        self.root = root or os.getenv('CAPTURE_STORE_DIR', 'captures')
+        self.objects_dir = os.path.join(self.root, 'objects')
+        # Prefer zstd when the optional dependency is installed, gzip otherwise
+        codec = codec or os.getenv('CAPTURE_CODEC')
+        if not codec:
+            codec = 'zst' if zstandard else 'gz'
+        if codec == 'zst' and not zstandard:
+            codec = 'gz'
+        self.codec = codec
+
+    def _object_path(self, sha256, codec):
+        return os.path.join(self.objects_dir, sha256[:2], f"{sha256}.{codec}")
+
+    def _read_alias(self, path):
+        alias_path = path + ALIAS_SUFFIX
+        if not os.path.exists(alias_path):
+            return None
+        with open(alias_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_atomic(self, path, data):
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _compress(self, data):
+        if self.codec == 'zst':
+            return zstandard.ZstdCompressor(level=19).compress(data)
+        return gzip.compress(data, compresslevel=9, mtime=0)
+
+    def put_bytes(self, data):
+        """Store raw bytes and return their SHA-256; identical content is stored once"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        for codec in ('zst', 'gz'):
+            if os.path.exists(self._object_path(sha256, codec)):
+                return sha256, codec
+        self._write_atomic(self._object_path(sha256, self.codec), self._compress(data))
+        return sha256, self.codec
+
+    def ingest(self, path, remove_original=True):
+        """Move a raw capture into the store, leaving an alias record at its path"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        sha256, codec = self.put_bytes(data)
+        alias = {
+            'sha256': sha256,
+            'codec': codec,
+            'size': len(data),
+            'stored_at': datetime.now().isoformat()
+        }
+        self._write_atomic(path + ALIAS_SUFFIX, json.dumps(alias, indent=2).encode('utf-8'))
+        if remove_original:
+            os.remove(path)
+        return alias
+
+    def exists(self, path):
+        """True if the capture is available raw or through an alias record"""
+        return bool(path) and (os.path.exists(path) or os.path.exists(path + ALIAS_SUFFIX))
+
+    def open_binary(self, path):
+        """Open a capture as a binary stream, decompressing on the fly"""
+        if os.path.exists(path):
+            return open(path, 'rb')
+        alias = self._read_alias(path)
+        if not alias:
+            raise FileNotFoundError(path)
+        object_path = self._object_path(alias['sha256'], alias['codec'])
+        if alias['codec'] == 'zst':
+            if not zstandard:
+                raise RuntimeError("zstandard is required to read zstd captures (pip install zstandard)")
+            return zstandard.ZstdDecompressor().stream_reader(open(object_path, 'rb'), closefd=True)
+        return gzip.open(object_path, 'rb')
+
+    def open_text(self, path, encoding='utf-8'):
+        """Open a capture as a text stream suitable for json.load or BeautifulSoup"""
+        return io.TextIOWrapper(self.open_binary(path), encoding=encoding)
+
+    def read_text(self, path, encoding='utf-8'):
+        with self.open_text(path, encoding=encoding) as f:
+            return f.read()
+
+    def sha256_of(self, path):
+        """SHA-256 of a capture's uncompressed content"""
+        alias = None if os.path.exists(path) else self._read_alias(path)
+        if alias:
+            return alias['sha256']
+        digest = hashlib.sha256()
+        with self.open_binary(path) as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def migrate(self, directories):
+        """Ingest every raw capture found in the given directories"""
+        stats = {'files': 0, 'raw_bytes': 0, 'objects': set()}
+        for directory in directories:
+            if not os.path.isdir(directory):
+                print(f"⚠️  {directory}/ not found, skipping...")
+                continue
+            for name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, name)
+                if not os.path.isfile(path) or not name.endswith(CAPTURE_EXTENSIONS):
+                    continue
+                alias = self.ingest(path)
+                stats['files'] += 1
+                stats['raw_bytes'] += alias['size']
+                stats['objects'].add((alias['sha256'], alias['codec']))
+                print(f"  ✅ {path} -> {alias['sha256'][:12]}")
+        stored_bytes = sum(os.path.getsize(self._object_path(sha, codec)) for sha, codec in stats['objects'])
+        print(f"📦 Migrated {stats['files']} captures into {len(stats['objects'])} objects")
+        print(f"📊 {stats['raw_bytes']:,} raw bytes -> {stored_bytes:,} stored bytes")
+        return stats
+
+    def restore(self, path):
+        """Write a capture back out as a raw file and drop its alias record"""
+        data = b''
+        with self.open_binary(path) as f:
+            data = f.read()
+        self._write_atomic(path, data)
+        os.remove(path + ALIAS_SUFFIX)
+        return path
+
+    def gc(self, directories):
+        """Delete objects no longer referenced by any alias record in the given directories"""
+        referenced = set()
+        for directory in directories:
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith(ALIAS_SUFFIX):
+                    alias = self._read_alias(os.path.join(directory, name[:-len(ALIAS_SUFFIX)]))
+                    if alias:
+                        referenced.add(os.path.basename(self._object_path(alias['sha256'], alias['codec'])))
+        removed = 0
+        if os.path.isdir(self.objects_dir):
+            for shard in os.listdir(self.objects_dir):
+                shard_dir = os.path.join(self.objects_dir, shard)
+                for name in os.listdir(shard_dir):
+                    if name not in referenced:
+                        os.remove(os.path.join(shard_dir, name))
+                        removed += 1
+        print(f"🧹 Removed {removed} unreferenced objects")
+        return removed
+
+
+def capture_signature(path):
+    """(mtime_ns, size) of a capture or its alias record, or None if it doesn't exist"""
+    if not path:
+        return None
+    for candidate in (path, path + ALIAS_SUFFIX):
+        try:
+            stat = os.stat(candidate)
+        except OSError:
+            continue
+        return (stat.st_mtime_ns, stat.st_size)
+    return None
+
+
+def logical_name(filename):
+    """Strip the alias suffix so callers can treat aliases like the raw file"""
+    if filename.endswith(ALIAS_SUFFIX):
+        return filename[:-len(ALIAS_SUFFIX)]
+    return filename
+
+
+_default_store = None
+
+
+def get_capture_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = CaptureStore()
+    return _default_store
+
+
+def capture_exists(path):
+    return get_capture_store().exists(path)
+
+
+def open_capture(path):
+    return get_capture_store().open_text(path)
+
+
+def main():
+    """Command line interface for the capture store"""
+    store = get_capture_store()
+
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  python capture_store.py migrate [dir ...]  - Compress captures (default: uploads scraped_data)")
+        print("  python capture_store.py restore <path>     - Write a capture back out as a raw file")
+        print("  python capture_store.py gc [dir ...]       - Remove unreferenced objects")
+        return
+
+    command = sys.argv[1]
+    directories = sys.argv[2:] or ['uploads', 'scraped_data']
+
+    if command == "migrate":
+        store.migrate(directories)
+    elif command == "restore":
+        if len(sys.argv) < 3:
+            print("❌ Please specify a capture path to restore")
+            return
+        print(f"✅ Restored {store.restore(sys.argv[2])}")
+    elif command == "gc":
+        store.gc(directories)
+    else:
+        print(f"❌ Unknown command: {command}")
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,9 @@ import pandas as pd
 import json
 import os
 import urllib.parse
-import random
 from bs4 import BeautifulSoup
+from capture_store import capture_exists, open_capture
+from product import Product, PINTEREST, GOOGLE, interleave
 
 # Updated CSS with better responsive grid layout
 updated_css_styles = """
@@ -228,13 +229,13 @@ body {
 
 def generate_product_html(product):
     """Generate HTML for a single product item"""
-    grid_title = product.get('grid_title', 'No Title Available')
-    display_name = product.get('display_name')
-    image_url = product.get('images:orig:url')
-    link = product.get('link')
-    price = product.get('price', 'Price not available')
-    seo_alt_txt = product.get('seo_alt_txt')
-    source = product.get('Source', 'Unknown')
+    grid_title = product.title or 'No Title Available'
+    display_name = product.display_name
+    image_url = product.image_url
+    link = product.url
+    price = product.price
+    seo_alt_txt = product.description
+    source = product.source
 
     # Use display_name if available, otherwise use grid_title
     product_title = display_name if pd.notna(display_name) else grid_title
@@ -282,12 +283,12 @@ def generate_product_html(product):
     return product_html
 
 def parse_pinterest_json(json_path):
-    """Parse Pinterest JSON and return a list of product dicts"""
+    """Parse Pinterest JSON and return a list of Products"""
     products = []
-    if not os.path.exists(json_path):
+    if not capture_exists(json_path):
         print(f"❌ Pinterest JSON file not found: {json_path}")
         return products
-    with open(json_path, 'r', encoding='utf-8') as f:
+    with open_capture(json_path) as f:
         data = json.load(f)
     try:
         results = data['resource_response']['data']['results']
@@ -297,26 +298,26 @@ def parse_pinterest_json(json_path):
             offer = prod.get('offers', [{}])[0] if prod.get('offers') else {}
             images = item.get('images', {})
             image_url = images.get('orig', {}).get('url')
-            products.append({
-                'grid_title': item.get('grid_title', ''),
-                'display_name': rich.get('display_name', ''),
-                'images:orig:url': image_url,
-                'link': item.get('link', ''),
-                'price': offer.get('price_value') and f"${offer.get('price_value')}",
-                'seo_alt_txt': rich.get('display_name', ''),
-                'Source': 'Pinterest'
-            })
+            products.append(Product(
+                title=item.get('grid_title', ''),
+                display_name=rich.get('display_name', ''),
+                image_url=image_url,
+                url=item.get('link', ''),
+                price=offer.get('price_value') and f"${offer.get('price_value')}",
+                description=rich.get('display_name', ''),
+                source=PINTEREST
+            ))
     except Exception as e:
         print(f"❌ Error parsing Pinterest JSON: {e}")
     return products
 
 def parse_google_html(html_path):
-    """Parse Google PLA HTML and return a list of product dicts"""
+    """Parse Google PLA HTML and return a list of Products"""
     products = []
-    if not os.path.exists(html_path):
+    if not capture_exists(html_path):
         print(f"❌ Google HTML file not found: {html_path}")
         return products
-    with open(html_path, 'r', encoding='utf-8') as f:
+    with open_capture(html_path) as f:
         soup = BeautifulSoup(f, 'html.parser')
     for unit in soup.select('.pla-unit-container'):
         try:
@@ -335,15 +336,15 @@ def parse_google_html(html_path):
             price_tag = unit.select_one('.dOp6Sc')
             title = title_tag.get('aria-label') if title_tag else ''
             price = price_tag.get('aria-label') if price_tag else ''
-            products.append({
-                'grid_title': title,
-                'display_name': title,
-                'images:orig:url': image_url,
-                'link': link,
-                'price': price,
-                'seo_alt_txt': title,
-                'Source': 'Google'
-            })
+            products.append(Product(
+                title=title,
+                display_name=title,
+                image_url=image_url,
+                url=link,
+                price=price,
+                description=title,
+                source=GOOGLE
+            ))
         except Exception as e:
             print(f"❌ Error parsing a Google PLA product: {e}")
     return products
@@ -356,9 +357,8 @@ def main():
     pinterest_products = parse_pinterest_json('trends_output.json')
     google_products = parse_google_html('pla_output.html')
     
-    # Combine and randomize products
-    all_products = pinterest_products + google_products
-    random.shuffle(all_products)  # Randomize the order
+    # Combine products in a mixed, reproducible order
+    all_products = interleave('shopping_page_responsive', pinterest_products, google_products)
     
     print(f"✅ Loaded {len(pinterest_products)} Pinterest products")
     print(f"✅ Loaded {len(google_products)} Google products")
@@ -424,7 +424,7 @@ def generate_html(products):
     # Generate products HTML with data attributes for filtering
     products_html = ""
     for i, product in enumerate(products):
-        source = product.get('Source', 'Unknown')
+        source = product.source or 'Unknown'
         product_html = generate_product_html(product)
         # Replace the outer div with data-source attribute
         product_html = product_html.replace('<div class="product-item">', f'<div class="product-item" data-source="{source}">')
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Fixture Server
+A local stand-in for Pinterest's search resource that serves the recorded
+captures in uploads/ page by page with bookmarks, so the paginated fetcher in
+AutomatedTrendScraper can be exercised without touching pinterest.com.
+
+    python fixture_server.py [port]   - Serve the fixtures
+    python fixture_server.py --check  - Fetch, interrupt, resume, refetch through the HTTP cache
+                                        and verify against the fixtures
+"""
+
+import os
+import sys
+import json
+import glob
+import base64
+import hashlib
+import shutil
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from capture_store import logical_name, open_capture
+
+RESOURCE_PATH = '/resource/BaseSearchResource/get/'
+END_BOOKMARK = '-end-'
+
+
+def load_fixture_pins(fixtures_dir='uploads'):
+    """All recorded pins by search slug, e.g. {'storage_hacks': [...]}"""
+    fixtures = {}
+    for path in sorted(set(map(logical_name, glob.glob(os.path.join(fixtures_dir, '*_pinterest.json*'))))):
+        slug = os.path.basename(path)[:-len('_pinterest.json')]
+        try:
+            with open_capture(path) as f:
+                fixtures[slug] = json.load(f)['resource_response']['data']['results']
+        except (KeyError, TypeError, ValueError):
+            continue
+    return fixtures
+
+
+def encode_bookmark(slug, offset):
+    return base64.urlsafe_b64encode(f"{slug}:{offset}".encode()).decode()
+
+
+def decode_bookmark(bookmark):
+    slug, offset = base64.urlsafe_b64decode(bookmark.encode()).decode().rsplit(':', 1)
+    return slug, int(offset)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    fixtures = {}
+    default_page_size = 25
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != RESOURCE_PATH:
+            self.send_json(404, {'resource_response': {'status': 'failure', 'message': 'Not found'}})
+            return
+        options = json.loads(parse_qs(url.query).get('data', ['{}'])[0]).get('options', {})
+        bookmarks = options.get('bookmarks') or []
+        if bookmarks:
+            slug, offset = decode_bookmark(bookmarks[0])
+        else:
+            slug, offset = options.get('query', '').lower().replace(' ', '_'), 0
+        pins = self.fixtures.get(slug, [])
+        page_size = int(options.get('page_size') or self.default_page_size)
+        page = pins[offset:offset + page_size]
+        next_offset = offset + len(page)
+        bookmark = encode_bookmark(slug, next_offset) if next_offset < len(pins) else END_BOOKMARK
+        self.send_json(200, {
+            'resource_response': {
+                'status': 'success',
+                'http_status': 200,
+                'bookmark': bookmark,
+                'data': {'results': page}
+            }
+        })
+
+
+def start_server(port=0, fixtures_dir='uploads', page_size=25):
+    """Start the stand-in server on a background thread and return it"""
+    FixtureHandler.fixtures = load_fixture_pins(fixtures_dir)
+    FixtureHandler.default_page_size = page_size
+    server = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check():
+    """Fetch one page, stop, resume, and compare the NDJSON output with the fixture"""
+    from automated_scraper import AutomatedTrendScraper
+    from trend_generator import TrendLandingPageGenerator
+    from http_cache import HTTPCache
+
+    server = start_server(page_size=10)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    output_dir = tempfile.mkdtemp(prefix='fixture-check-')
+    cache_dir = os.path.join(output_dir, 'http_cache')
+    failures = []
+    try:
+        for slug, pins in server.RequestHandlerClass.fixtures.items():
+            search_term = slug.replace('_', ' ')
+            scraper = AutomatedTrendScraper(output_dir=output_dir, pinterest_base_url=base_url, page_delay=0,
+                                            http_cache=HTTPCache(cache_dir, default_ttl=0))
+            max_results = len(pins) + 10
+            output_path = scraper.fetch_pinterest_pages(search_term, max_results, page_size=10, max_pages=1)
+            output_path = scraper.fetch_pinterest_pages(search_term, max_results, page_size=10)
+            with open(output_path, 'r', encoding='utf-8') as f:
+                fetched = [json.loads(line) for line in f if line.strip()]
+            if fetched != pins:
+                failures.append(f"{slug}: fetched {len(fetched)} pins, fixture has {len(pins)}")
+
+            parsed = TrendLandingPageGenerator(output_dir=output_dir).parse_pinterest_json(output_path)
+            if len(parsed) != len(pins):
+                failures.append(f"{slug}: parsed {len(parsed)} products from NDJSON, expected {len(pins)}")
+
+            # Refetch into a fresh file: stale entries must revalidate with 304s, fresh ones must not hit the server
+            pages = scraper.http_cache.stats['miss']
+            for ttl, outcome in ((0, 'revalidated'), (3600, 'hit')):
+                cache = HTTPCache(cache_dir, default_ttl=ttl)
+                refetch = AutomatedTrendScraper(output_dir=output_dir, pinterest_base_url=base_url, page_delay=0, http_cache=cache)
+                refetch_path = os.path.join(output_dir, f"{slug}_{outcome}.ndjson")
+                refetch.fetch_pinterest_pages(search_term, max_results, output_path=refetch_path, page_size=10)
+                with open(refetch_path, 'r', encoding='utf-8') as f:
+                    refetched = [json.loads(line) for line in f if line.strip()]
+                if refetched != pins or cache.stats[outcome] != pages or cache.stats['miss']:
+                    failures.append(f"{slug}: HTTP cache with ttl={ttl} gave {cache.stats}, expected {pages} {outcome}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    print("=" * 50)
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Paginated fetch, resume, NDJSON parsing and HTTP cache revalidation match the fixtures")
+
+
+def main():
+    """Command line interface for the fixture server"""
+    if len(sys.argv) > 1 and sys.argv[1] == "--check":
+        check()
+        return
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = start_server(port)
+    print(f"🧪 Serving {len(FixtureHandler.fixtures)} Pinterest fixtures at http://127.0.0.1:{port}{RESOURCE_PATH}")
+    print(f"   PINTEREST_BASE_URL=http://127.0.0.1:{port} python automated_scraper.py")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
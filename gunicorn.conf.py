@@ -1,4 +1,6 @@
 import os
+import gc
+import glob
 
 # Gunicorn configuration file
 bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
@@ -10,4 +12,29 @@ keepalive = 2
 max_requests = 1000
 max_requests_jitter = 100
 preload_app = True
-reload = False 
\ No newline at end of file
+reload = False
+
+# Prometheus multiprocess mode: every worker writes its metrics here and /metrics merges them.
+# Must be set before the app (and prometheus_client) is imported.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/trendscraper-metrics')
+os.makedirs(metrics_dir, exist_ok=True)
+
+def on_starting(server):
+    """Drop metrics left over from a previous server run"""
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+
+def child_exit(server, worker):
+    """Let prometheus_client retire the gauges of a worker that exited"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def when_ready(server):
+    """Warm the shared caches in the master, after the app is preloaded and before the first fork"""
+    if os.getenv('WARMUP_ON_LOAD', '1') == '1':
+        import warmup
+        warmup.warm_up()
+
+def pre_fork(server, worker):
+    """Move the warmed-up heap out of the collector's reach so workers don't dirty its pages"""
+    gc.freeze()
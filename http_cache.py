@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+HTTP Cache
+Persistent on-disk cache for the scraper's requests session.
+
+Mounted as a transport adapter, it serves GET responses from disk while they
+are fresh, and once they go stale revalidates them with If-None-Match /
+If-Modified-Since so an unchanged page costs a 304 instead of a full download.
+Freshness is a TTL per search term: requests carry the term in the
+X-Cache-Term header (stripped before sending) and are looked up in
+HTTP_CACHE_TERM_TTLS, falling back to HTTP_CACHE_TTL.
+"""
+
+import os
+import sys
+import json
+import gzip
+import time
+import hashlib
+import tempfile
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+CACHE_TERM_HEADER = 'X-Cache-Term'
+# Headers that describe the wire encoding, not the (already decoded) body we store
+DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'connection')
+
+
+class HTTPCache:
+    def __init__(self, root=None, default_ttl=None, term_ttls=None):
+        self.root = root or os.getenv('HTTP_CACHE_DIR', 'http_cache')
+        self.default_ttl = default_ttl if default_ttl is not None else float(os.getenv('HTTP_CACHE_TTL', str(6 * 3600)))
+        if term_ttls is None:
+            # e.g. HTTP_CACHE_TERM_TTLS='{"storage hacks": 86400, "dopamine decor": 3600}'
+            term_ttls = json.loads(os.getenv('HTTP_CACHE_TERM_TTLS', '{}'))
+        self.term_ttls = {term.lower(): float(ttl) for term, ttl in term_ttls.items()}
+        self.stats = {'hit': 0, 'revalidated': 0, 'miss': 0, 'bytes_downloaded': 0, 'bytes_saved': 0}
+
+    def ttl_for(self, term):
+        if term is None:
+            return self.default_ttl
+        return self.term_ttls.get(term.lower(), self.default_ttl)
+
+    def key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        directory = os.path.join(self.root, key[:2])
+        return os.path.join(directory, f"{key}.json"), os.path.join(directory, f"{key}.body.gz")
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def load(self, url):
+        meta_path, body_path = self._paths(self.key(url))
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            with gzip.open(body_path, 'rb') as f:
+                entry['body'] = f.read()
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def store(self, url, response, term):
+        meta_path, body_path = self._paths(self.key(url))
+        entry = {
+            'url': url,
+            'term': term,
+            'status': response.status_code,
+            'reason': response.reason,
+            'encoding': response.encoding,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS},
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'stored_at': time.time()
+        }
+        self._write_atomic(body_path, gzip.compress(response.content, mtime=0))
+        self._write_atomic(meta_path, json.dumps(entry, indent=2).encode('utf-8'))
+
+    def touch(self, url, entry, response):
+        """Mark a revalidated entry fresh again, picking up any new validators"""
+        meta_path, _ = self._paths(self.key(url))
+        entry = {k: v for k, v in entry.items() if k != 'body'}
+        entry['stored_at'] = time.time()
+        entry['etag'] = response.headers.get('ETag') or entry.get('etag')
+        entry['last_modified'] = response.headers.get('Last-Modified') or entry.get('last_modified')
+        self._write_atomic(meta_path, json.dumps(entry, indent=2).encode('utf-8'))
+
+    def is_fresh(self, entry, term):
+        return time.time() - entry['stored_at'] < self.ttl_for(term)
+
+    def clear(self, older_than=None):
+        """Remove cached entries, or only those stored more than older_than seconds ago"""
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            for name in os.listdir(shard_dir):
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(shard_dir, name)
+                if older_than is not None:
+                    with open(meta_path, 'r', encoding='utf-8') as f:
+                        if time.time() - json.load(f)['stored_at'] < older_than:
+                            continue
+                os.remove(meta_path)
+                body_path = meta_path[:-len('.json')] + '.body.gz'
+                if os.path.exists(body_path):
+                    os.remove(body_path)
+                removed += 1
+        return removed
+
+
+class CachingAdapter(HTTPAdapter):
+    """requests transport adapter that answers GETs from an HTTPCache"""
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def _cached_response(self, request, entry):
+        response = Response()
+        response.status_code = entry['status']
+        response.reason = entry.get('reason') or 'OK'
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = entry.get('encoding')
+        response.url = entry['url']
+        response.request = request
+        response._content = entry['body']
+        return response
+
+    def send(self, request, **kwargs):
+        term = request.headers.pop(CACHE_TERM_HEADER, None)
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        entry = self.cache.load(request.url)
+        if entry and self.cache.is_fresh(entry, term):
+            self.cache.stats['hit'] += 1
+            self.cache.stats['bytes_saved'] += len(entry['body'])
+            response = self._cached_response(request, entry)
+            response.from_cache = True
+            return response
+
+        if entry:
+            if entry.get('etag'):
+                request.headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request.headers['If-Modified-Since'] = entry['last_modified']
+
+        response = super().send(request, **kwargs)
+        if entry and response.status_code == 304:
+            self.cache.touch(request.url, entry, response)
+            self.cache.stats['revalidated'] += 1
+            self.cache.stats['bytes_saved'] += len(entry['body'])
+            cached = self._cached_response(request, entry)
+            cached.from_cache = True
+            return cached
+
+        self.cache.stats['miss'] += 1
+        response.from_cache = False
+        if response.status_code == 200:
+            self.cache.stats['bytes_downloaded'] += len(response.content)
+            self.cache.store(request.url, response, term)
+        return response
+
+
+def install(session, cache=None):
+    """Mount a caching adapter on a requests session and return its cache"""
+    cache = cache or HTTPCache()
+    adapter = CachingAdapter(cache)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return cache
+
+
+def main():
+    """Command line interface for the HTTP cache"""
+    cache = HTTPCache()
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        older_than = float(sys.argv[2]) if len(sys.argv) > 2 else None
+        print(f"🧹 Removed {cache.clear(older_than)} cached responses from {cache.root}/")
+    else:
+        print("Usage:")
+        print("  python http_cache.py clear [seconds]  - Remove cached responses (optionally only older ones)")
+
+if __name__ == "__main__":
+    main()
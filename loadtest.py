@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Load Test
+Scripted virtual users against the deployed WSGI app, reporting throughput
+and p50/p95/p99 latency, error and shed rates per route, so gunicorn worker
+classes and counts can be compared.
+
+Each user repeatedly picks a scenario by weight and runs its steps with a
+think time between them:
+    browse - the home page, then a landing page
+    shop   - the home page, then a landing page with look selection
+    look   - a landing page with look selection, POST /generate_look with 3 of
+             its products, then the new look
+    hero   - the look scenario, then POST /generate_hero_image
+Users send distinct X-Forwarded-For addresses so per-client rate limits see
+separate clients. 429 and 503 responses are counted as shed, not as errors.
+
+    python loadtest.py --url http://127.0.0.1:8000 --users 20 --duration 60
+    python loadtest.py --spawn --configs sync:2 sync:4 gthread:2:8
+
+--spawn starts gunicorn -c gunicorn.conf.py wsgi:app for each config
+(class:workers[:threads]) in a scratch copy of the data directories, with
+OPENAI_BASE_URL pointing at an in-process OpenAI emulator (openai_emulator.py),
+so looks and heroes run offline and the working tree isn't touched: the
+products sent to /generate_look and /generate_hero_image get their image_url
+pointed at the emulator's /images/, so no reference image is fetched remotely.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+from collections import defaultdict
+
+import requests
+
+from openai_emulator import start_server as start_emulator, latency_summary
+
+DEFAULT_MIX = {'browse': 40, 'shop': 35, 'look': 20, 'hero': 5}
+# Directories the apps read and write relative to the working directory
+DATA_DIRS = ['uploads', 'scraped_data', 'landing_pages', 'looks', 'overlays', 'captures']
+PRODUCTS_DATA = re.compile(r'const productsData = (.*?);\s*$', re.MULTILINE)
+SHED_STATUSES = (429, 503)
+
+
+def succeeded(response):
+    """The look routes answer failures with a 200 and {"success": false}"""
+    try:
+        return bool(response.json().get('success'))
+    except ValueError:
+        return False
+
+
+def parse_mix(spec):
+    """{'browse': 40, ...} from 'browse=40,shop=35,look=20,hero=5'"""
+    mix = {}
+    for item in filter(None, spec.split(',')):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown scenario {name!r}; expected one of {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight)
+    return mix
+
+
+class LoadTest:
+    def __init__(self, base_url, users=10, duration=60, ramp_up=5, think=1.0, mix=None, timeout=180, image_base_url=None):
+        self.base_url = base_url.rstrip('/')
+        # When set, product images are served from here (the emulator's /images/) instead of their real hosts
+        self.image_base_url = image_base_url.rstrip('/') if image_base_url else None
+        self.users = users
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.think = think
+        self.mix = mix or DEFAULT_MIX
+        self.timeout = timeout
+        self.pages = []
+        self.samples = defaultdict(list)  # route -> [(seconds, outcome)]
+        self._lock = threading.Lock()
+
+    def discover(self):
+        """Landing pages to visit, from the app's own page list"""
+        response = requests.get(f"{self.base_url}/api/pages", timeout=30)
+        response.raise_for_status()
+        self.pages = [page['filename'] for page in response.json()]
+        if not self.pages:
+            raise RuntimeError("The app has no landing pages to load test")
+
+    def record(self, route, seconds, outcome):
+        with self._lock:
+            self.samples[route].append((seconds, outcome))
+
+    def request(self, session, route, method, path, check=None, **kwargs):
+        """One timed request, recorded under its route; the response, or None if it failed.
+        check(response) marks a 2xx as failed for routes that report errors in the body"""
+        start = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, timeout=self.timeout, allow_redirects=False, **kwargs)
+            response.content
+        except requests.RequestException:
+            self.record(route, time.perf_counter() - start, 'error')
+            return None
+        seconds = time.perf_counter() - start
+        if response.status_code in SHED_STATUSES:
+            self.record(route, seconds, 'shed')
+        elif response.status_code >= 400 or (check and response.status_code == 200 and not check(response)):
+            self.record(route, seconds, 'error')
+        else:
+            self.record(route, seconds, 'ok')
+        return response
+
+    def pause(self):
+        if self.think > 0:
+            time.sleep(random.expovariate(1 / self.think))
+
+    def browse(self, session):
+        self.request(session, '/', 'GET', '/')
+        self.pause()
+        self.request(session, '/view/<filename>', 'GET', f"/view/{random.choice(self.pages)}")
+
+    def shop(self, session):
+        self.request(session, '/', 'GET', '/')
+        self.pause()
+        self.request(session, '/view_with_looks/<filename>', 'GET', f"/view_with_looks/{random.choice(self.pages)}")
+
+    def look(self, session):
+        """Pick 3 products off a landing page and create a look from them; the look id and products, or None"""
+        page = random.choice(self.pages)
+        response = self.request(session, '/view_with_looks/<filename>', 'GET', f"/view_with_looks/{page}")
+        match = PRODUCTS_DATA.search(response.text) if response is not None and response.status_code == 200 else None
+        products = json.loads(match.group(1)) if match else []
+        if len(products) < 3:
+            return None
+        self.pause()
+        selected = random.sample(products, 3)
+        if self.image_base_url:
+            selected = [dict(product, image_url=f"{self.image_base_url}/images/product-{i}.png")
+                        for i, product in enumerate(selected)]
+        response = self.request(session, '/generate_look', 'POST', '/generate_look',
+                                json={'products': selected, 'page_title': page[:-len('.html')].replace('-', ' ').title()},
+                                check=succeeded)
+        if response is None or response.status_code != 200 or not succeeded(response):
+            return None
+        look_path = response.json()['redirect_url']
+        self.request(session, '/view_look/<look_id>', 'GET', look_path)
+        return look_path.rsplit('/', 1)[-1], selected
+
+    def hero(self, session):
+        created = self.look(session)
+        if created is None:
+            return
+        look_id, products = created
+        self.pause()
+        self.request(session, '/generate_hero_image', 'POST', '/generate_hero_image',
+                     json={'look_id': look_id, 'products': products}, check=succeeded)
+
+    def user(self, index, deadline):
+        session = requests.Session()
+        session.headers['X-Forwarded-For'] = f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"
+        scenarios = list(self.mix)
+        weights = [self.mix[name] for name in scenarios]
+        while time.monotonic() < deadline:
+            getattr(self, random.choices(scenarios, weights)[0])(session)
+            self.pause()
+
+    def run(self):
+        """Run every user until the duration is up and return the report"""
+        self.discover()
+        start = time.monotonic()
+        deadline = start + self.duration
+        threads = []
+        for index in range(self.users):
+            thread = threading.Thread(target=self.user, args=(index, deadline), daemon=True)
+            thread.start()
+            threads.append(thread)
+            time.sleep(self.ramp_up / self.users)
+        for thread in threads:
+            thread.join()
+        return self.report(time.monotonic() - start)
+
+    def report(self, elapsed):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            outcomes = [outcome for _, outcome in samples]
+            routes[route] = dict(latency_summary([seconds for seconds, outcome in samples if outcome == 'ok']),
+                                 requests=len(samples),
+                                 rps=round(len(samples) / elapsed, 2),
+                                 error_rate=round(outcomes.count('error') / len(samples), 4),
+                                 shed_rate=round(outcomes.count('shed') / len(samples), 4))
+        total = sum(route['requests'] for route in routes.values())
+        errors = sum(route['requests'] * route['error_rate'] for route in routes.values())
+        return {
+            'users': self.users,
+            'duration_s': round(elapsed, 1),
+            'requests': total,
+            'rps': round(total / elapsed, 2),
+            'error_rate': round(errors / total, 4) if total else 0,
+            'routes': routes,
+        }
+
+
+def print_report(report, label=''):
+    print("=" * 100)
+    print(f"📊 {label + ': ' if label else ''}{report['users']} users, {report['requests']} requests in "
+          f"{report['duration_s']}s ({report['rps']} req/s, {report['error_rate']:.1%} errors)")
+    print(f"{'route':<30}{'requests':>9}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}{'shed':>8}")
+    for route, stats in report['routes'].items():
+        print(f"{route:<30}{stats['requests']:>9}{stats['rps']:>8}{stats.get('p50_ms', '-'):>10}"
+              f"{stats.get('p95_ms', '-'):>10}{stats.get('p99_ms', '-'):>10}{stats['error_rate']:>9.1%}{stats['shed_rate']:>8.1%}")
+
+
+def parse_config(spec):
+    """('gthread', 2, 8) from 'gthread:2:8'"""
+    worker_class, workers, *threads = spec.split(':')
+    return worker_class, int(workers), int(threads[0]) if threads else 1
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def spawned_app(worker_class, workers, threads, openai_base_url):
+    """gunicorn -c gunicorn.conf.py wsgi:app in a scratch copy of the data directories; yields its base URL"""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    workspace = tempfile.mkdtemp(prefix='loadtest-')
+    for directory in DATA_DIRS:
+        if os.path.isdir(os.path.join(app_dir, directory)):
+            shutil.copytree(os.path.join(app_dir, directory), os.path.join(workspace, directory))
+    port = free_port()
+    env = dict(os.environ,
+               PYTHONPATH=app_dir,
+               PORT=str(port),
+               OPENAI_API_KEY='emulator',
+               OPENAI_BASE_URL=openai_base_url,
+               PROMETHEUS_MULTIPROC_DIR=os.path.join(workspace, '.metrics'),
+               ADMISSION_DIR=os.path.join(workspace, '.admission'),
+               RESPONSE_CACHE_DIR=os.path.join(workspace, '.response-cache'),
+               SINGLEFLIGHT_DIR=os.path.join(workspace, '.singleflight'))
+    log_path = os.path.join(workspace, 'gunicorn.log')
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(app_dir, 'gunicorn.conf.py'),
+                                   '--chdir', workspace, '--bind', f"127.0.0.1:{port}",
+                                   '--worker-class', worker_class, '--workers', str(workers), '--threads', str(threads),
+                                   'wsgi:app'], env=env, cwd=workspace, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            if server.poll() is not None or time.monotonic() > deadline:
+                with open(log_path) as f:
+                    raise RuntimeError(f"gunicorn didn't come up:\n{f.read()[-2000:]}")
+            try:
+                if requests.get(f"{base_url}/api/pages", timeout=5).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def main():
+    """Command line interface for the load test"""
+    parser = argparse.ArgumentParser(description="Scenario-based load test for the WSGI app")
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="App to load test (ignored with --spawn)")
+    parser.add_argument('--spawn', action='store_true', help="Start gunicorn for each --configs entry against an OpenAI emulator")
+    parser.add_argument('--configs', nargs='+', default=['sync:2'], help="Worker configs for --spawn, as class:workers[:threads]")
+    parser.add_argument('--users', type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to run each load test")
+    parser.add_argument('--ramp-up', type=float, default=5, help="Seconds over which users start")
+    parser.add_argument('--think', type=float, default=1.0, help="Mean think time between steps in seconds (0 for none)")
+    parser.add_argument('--mix', default=','.join(f"{name}={weight}" for name, weight in DEFAULT_MIX.items()),
+                        help="Scenario weights")
+    parser.add_argument('--openai-latency', default='lognormal:5:0.4', help="Emulated OpenAI latency with --spawn")
+    parser.add_argument('--openai-error-rate', type=float, default=0.0, help="Emulated OpenAI 500 rate with --spawn")
+    parser.add_argument('--image-size', default='1024x1024', help="Emulated generated image size with --spawn")
+    parser.add_argument('--output', help="Write the JSON report(s) here")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    def load_test(base_url, image_base_url=None):
+        return LoadTest(base_url, users=args.users, duration=args.duration, ramp_up=args.ramp_up,
+                        think=args.think, mix=mix, image_base_url=image_base_url).run()
+
+    reports = {}
+    if args.spawn:
+        emulator = start_emulator(latency=args.openai_latency, error_rate=args.openai_error_rate, image_size=args.image_size)
+        emulator_url = f"http://127.0.0.1:{emulator.server_address[1]}"
+        openai_base_url = f"{emulator_url}/v1"
+        try:
+            for spec in args.configs:
+                worker_class, workers, threads = parse_config(spec)
+                print(f"🚀 gunicorn {worker_class} x{workers}" + (f" ({threads} threads)" if threads > 1 else ''))
+                with spawned_app(worker_class, workers, threads, openai_base_url) as base_url:
+                    reports[spec] = load_test(base_url, image_base_url=emulator_url)
+                print_report(reports[spec], spec)
+        finally:
+            emulator.shutdown()
+    else:
+        reports[args.url] = load_test(args.url)
+        print_report(reports[args.url], args.url)
+
+    if len(reports) > 1:
+        print("=" * 100)
+        print(f"{'config':<20}{'req/s':>10}{'errors':>10}{'home p95 ms':>14}{'home p99 ms':>14}")
+        for spec, report in reports.items():
+            home = report['routes'].get('/', {})
+            print(f"{spec:<20}{report['rps']:>10}{report['error_rate']:>10.1%}{home.get('p95_ms', '-'):>14}{home.get('p99_ms', '-'):>14}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Logs
+Level-gated, structured logging for the parsers and scrapers.
+
+LOG_LEVEL (default INFO) decides what is emitted and LOG_FORMAT=json switches
+from "key=value" lines to one JSON object per line. Hot loops should log one
+StageSummary line per call at INFO and keep per-item lines at DEBUG behind a
+Sampler, so a request doesn't pay for a write per product.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+
+ROOT_LOGGER = 'trendscraper'
+
+
+class KeyValueFormatter(logging.Formatter):
+    def format(self, record):
+        line = f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} {record.levelname:<7} {record.name} {record.getMessage()}"
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure(level=None, stream=None, fmt=None):
+    """(Re)configure the trendscraper loggers; safe to call more than once"""
+    root = logging.getLogger(ROOT_LOGGER)
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    fmt = fmt or os.getenv('LOG_FORMAT', 'text')
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else KeyValueFormatter())
+    root.addHandler(handler)
+    root.propagate = False
+    return root
+
+
+def get_logger(name):
+    root = logging.getLogger(ROOT_LOGGER)
+    if not root.handlers:
+        configure()
+    return root.getChild(name)
+
+
+def log(logger, level, message, **fields):
+    """Log a message with structured key/value fields"""
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={'fields': fields})
+
+
+class Sampler:
+    """Lets the first `first` events through, then one in every `every`"""
+
+    def __init__(self, every=None, first=3):
+        self.every = every if every is not None else int(os.getenv('LOG_SAMPLE_EVERY', '50'))
+        self.first = first
+        self.seen = 0
+
+    def __call__(self):
+        self.seen += 1
+        return self.seen <= self.first or (self.every > 0 and self.seen % self.every == 0)
+
+
+class StageSummary:
+    """Counts events in a stage and logs one line with the totals when it finishes"""
+
+    def __init__(self, logger, stage, level=logging.INFO, **fields):
+        self.logger = logger
+        self.stage = stage
+        self.level = level
+        self.fields = fields
+        self.counts = {}
+        self.debug = logger.isEnabledFor(logging.DEBUG)
+        self.sampler = Sampler()
+        self.start = time.perf_counter()
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def item(self, message, **fields):
+        """Per-item DEBUG line, sampled; costs one attribute check when DEBUG is off"""
+        if self.debug and self.sampler():
+            log(self.logger, logging.DEBUG, message, stage=self.stage, n=self.sampler.seen, **fields)
+
+    def warn(self, message):
+        """Emit a warning and mark the summary line as a warning too"""
+        self.level = max(self.level, logging.WARNING)
+        log(self.logger, logging.WARNING, message, stage=self.stage, **self.fields)
+
+    def fail(self, message, error):
+        self.level = logging.ERROR
+        self.fields['error'] = error
+        log(self.logger, logging.ERROR, message, stage=self.stage, **self.fields)
+
+    def finish(self, **fields):
+        summary = dict(self.fields)
+        summary.update(self.counts)
+        summary.update(fields)
+        summary['duration_ms'] = round((time.perf_counter() - self.start) * 1000, 1)
+        log(self.logger, self.level, self.stage, **summary)
+        return summary
@@ -1,12 +1,23 @@
-import openai
 import os
 import json
+import time
 import uuid
 import base64
 from datetime import datetime
-from PIL import Image
-import requests
-from io import BytesIO
+from metrics import timed_stage, stage_timer, observe_openai, payload_size
+from sharding import get_collection
+from singleflight import get_singleflight
+
+def fetch_reference_image(image_url, timeout=None):
+    """A product image's bytes, or None on a non-200; concurrent looks using the same product share one download"""
+    import requests
+
+    def download():
+        with stage_timer('image_fetch'):
+            response = requests.get(image_url, timeout=timeout)
+        return response.content if response.status_code == 200 else None
+
+    return get_singleflight('reference_images').do(image_url, download)
 
 class LookGenerator:
     def __init__(self, openai_api_key=None):
@@ -23,12 +34,14 @@ class LookGenerator:
             # Initialize OpenAI client without any proxy configuration
             try:
                 import httpx
+                import openai
                 custom_http_client = httpx.Client(
                     timeout=httpx.Timeout(30.0),
                     proxies=None
                 )
                 self.openai_client = openai.OpenAI(
                     api_key=openai_api_key,
+                    base_url=os.getenv('OPENAI_BASE_URL'),
                     http_client=custom_http_client
                 )
             except Exception as e:
@@ -38,12 +51,14 @@ class LookGenerator:
             # Initialize OpenAI client without any proxy configuration
             try:
                 import httpx
+                import openai
                 custom_http_client = httpx.Client(
                     timeout=httpx.Timeout(30.0),
                     proxies=None
                 )
                 self.openai_client = openai.OpenAI(
                     api_key=os.getenv('OPENAI_API_KEY'),
+                    base_url=os.getenv('OPENAI_BASE_URL'),
                     http_client=custom_http_client
                 )
             except Exception as e:
@@ -58,6 +73,9 @@ class LookGenerator:
         for directory in [self.looks_dir, self.looks_data_dir, self.looks_images_dir]:
             if not os.path.exists(directory):
                 os.makedirs(directory)
+        # Looks and their images are stored hash-sharded by file name (see sharding.py)
+        self.look_files = get_collection(self.looks_data_dir)
+        self.image_files = get_collection(self.looks_images_dir)
     
     def encode_image(self, image_path):
         """Encode image to base64"""
@@ -73,6 +91,7 @@ class LookGenerator:
             )
             return response.id
     
+    @timed_stage('generate_shoppable_look')
     def generate_shoppable_look(self, selected_products, style_prompt=None, landing_page_name=None):
         """Generate a shoppable look from selected products"""
         
@@ -102,12 +121,12 @@ class LookGenerator:
                 if image_url:
                     try:
                         # Download the product image
-                        response = requests.get(image_url)
-                        if response.status_code == 200:
+                        image_bytes = fetch_reference_image(image_url)
+                        if image_bytes is not None:
                             # Save temporarily to encode
                             temp_image_path = f"temp_product_{i}.jpg"
                             with open(temp_image_path, "wb") as f:
-                                f.write(response.content)
+                                f.write(image_bytes)
                             
                             # Encode the image
                             base64_image = self.encode_image(temp_image_path)
@@ -125,6 +144,7 @@ class LookGenerator:
                         continue
             
             # Generate image using the working gpt-4.1 model with responses.create
+            openai_start = time.perf_counter()
             response = self.openai_client.responses.create(
                 model="gpt-4.1",
                 input=[
@@ -135,6 +155,7 @@ class LookGenerator:
                 ],
                 tools=[{"type": "image_generation"}],
             )
+            openai_seconds = time.perf_counter() - openai_start
             
             # Extract image data from response
             image_generation_calls = [
@@ -148,15 +169,18 @@ class LookGenerator:
             if not image_data:
                 raise Exception("No image generated")
             
+            observe_openai('generate_shoppable_look', openai_seconds,
+                           request_bytes=payload_size(content),
+                           response_bytes=sum(len(data) for data in image_data))
+            
             # Save the generated image
             look_id = str(uuid.uuid4())
             image_filename = f"{look_id}.png"
-            image_path = os.path.join(self.looks_images_dir, image_filename)
             
             # Decode and save the base64 image data
             image_base64 = image_data[0]
-            with open(image_path, "wb") as f:
-                f.write(base64.b64decode(image_base64))
+            with stage_timer('write_look_image'):
+                image_path = self.image_files.write_bytes(image_filename, base64.b64decode(image_base64))
             
             # Create look data
             look_data = {
@@ -171,9 +195,7 @@ class LookGenerator:
             
             # Save look data
             data_filename = f"{look_id}.json"
-            data_path = os.path.join(self.looks_data_dir, data_filename)
-            with open(data_path, 'w', encoding='utf-8') as f:
-                json.dump(look_data, f, indent=2, ensure_ascii=False)
+            self.look_files.write_text(data_filename, json.dumps(look_data, indent=2, ensure_ascii=False))
             
             return {
                 'success': True,
@@ -286,6 +308,7 @@ Requirements:
     
     def _download_and_save_image(self, image_url, save_path):
         """Download and save the generated image"""
+        import requests
         response = requests.get(image_url)
         response.raise_for_status()
         
@@ -294,38 +317,51 @@ Requirements:
     
     def get_all_looks(self):
         """Get all generated looks"""
-        looks = []
-        
-        if not os.path.exists(self.looks_data_dir):
-            return looks
-        
-        for filename in os.listdir(self.looks_data_dir):
-            if filename.endswith('.json'):
-                filepath = os.path.join(self.looks_data_dir, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        look_data = json.load(f)
-                        look_data['image_url'] = f'/looks/images/{look_data["image_filename"]}'
-                        looks.append(look_data)
-                except Exception as e:
-                    print(f"Error loading look {filename}: {e}")
-        
-        # Sort by creation date (newest first)
-        looks.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        return looks
+        return get_all_looks(self.look_files)
     
     def get_look_by_id(self, look_id):
         """Get a specific look by ID"""
-        data_path = os.path.join(self.looks_data_dir, f"{look_id}.json")
-        
-        if not os.path.exists(data_path):
-            return None
-        
-        try:
-            with open(data_path, 'r', encoding='utf-8') as f:
-                look_data = json.load(f)
+        return get_look_by_id(look_id, self.look_files)
+
+
+# Readers for the look pages: they only read look files, so page views don't need a LookGenerator
+# (building one sets up the OpenAI/httpx client and strips the proxy environment variables)
+
+@timed_stage('load_looks')
+def get_all_looks(look_files=None):
+    """Get all generated looks"""
+    if look_files is None:
+        look_files = get_collection(os.path.join('looks', 'data'))
+    looks = []
+    
+    for obj in look_files.list():
+        filename = os.path.basename(obj.key)
+        if filename.endswith('.json'):
+            try:
+                look_data = json.loads(look_files.storage.read_text(obj.key))
                 look_data['image_url'] = f'/looks/images/{look_data["image_filename"]}'
-                return look_data
-        except Exception as e:
-            print(f"Error loading look {look_id}: {e}")
-            return None 
\ No newline at end of file
+                looks.append(look_data)
+            except Exception as e:
+                print(f"Error loading look {filename}: {e}")
+    
+    # Sort by creation date (newest first)
+    looks.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    return looks
+
+@timed_stage('load_look')
+def get_look_by_id(look_id, look_files=None):
+    """Get a specific look by ID"""
+    if look_files is None:
+        look_files = get_collection(os.path.join('looks', 'data'))
+    data_key = look_files.find(f"{look_id}.json")
+    
+    if data_key is None:
+        return None
+    
+    try:
+        look_data = json.loads(look_files.storage.read_text(data_key))
+        look_data['image_url'] = f'/looks/images/{look_data["image_filename"]}'
+        return look_data
+    except Exception as e:
+        print(f"Error loading look {look_id}: {e}")
+        return None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Metrics
+Prometheus metrics for the Flask apps and the landing page / look pipelines.
+
+Under gunicorn each worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(set up in gunicorn.conf.py) and /metrics aggregates every worker's files,
+so the numbers cover the whole server rather than whichever worker answered.
+"""
+
+import os
+import time
+import functools
+import contextlib
+
+from flask import request, g, Response
+from prometheus_client import (
+    Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST, multiprocess
+)
+
+REQUEST_DURATION = Histogram(
+    'trendscraper_request_duration_seconds',
+    'Time spent handling an HTTP request',
+    ['app', 'route', 'method', 'status']
+)
+STAGE_DURATION = Histogram(
+    'trendscraper_stage_duration_seconds',
+    'Time spent in a pipeline stage (parsing, rendering, disk I/O, image fetches)',
+    ['stage'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+CACHE_EVENTS = Counter(
+    'trendscraper_cache_events_total',
+    'Cache lookups by cache name and result',
+    ['cache', 'result']
+)
+BYTES_SERVED = Counter(
+    'trendscraper_bytes_served_total',
+    'Response body bytes sent',
+    ['app', 'route']
+)
+ADMISSION_DECISIONS = Counter(
+    'trendscraper_admission_decisions_total',
+    'Admission control outcomes for the slow endpoints (admitted, rate_limited, rejected, timed_out)',
+    ['endpoint', 'result']
+)
+OPENAI_LATENCY = Histogram(
+    'trendscraper_openai_request_duration_seconds',
+    'Latency of OpenAI API calls',
+    ['operation'],
+    buckets=(1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180)
+)
+OPENAI_PAYLOAD = Histogram(
+    'trendscraper_openai_payload_bytes',
+    'Size of OpenAI request and response payloads',
+    ['operation', 'direction'],
+    buckets=(1e3, 1e4, 1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7)
+)
+
+
+def observe_stage(stage, seconds):
+    STAGE_DURATION.labels(stage=stage).observe(seconds)
+
+
+@contextlib.contextmanager
+def stage_timer(stage):
+    """Time a block of code as a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def timed_stage(stage):
+    """Decorator form of stage_timer"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache, hit):
+    CACHE_EVENTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def record_admission(endpoint, result):
+    ADMISSION_DECISIONS.labels(endpoint=endpoint, result=result).inc()
+
+
+def observe_openai(operation, seconds, request_bytes=0, response_bytes=0):
+    OPENAI_LATENCY.labels(operation=operation).observe(seconds)
+    OPENAI_PAYLOAD.labels(operation=operation, direction='request').observe(request_bytes)
+    OPENAI_PAYLOAD.labels(operation=operation, direction='response').observe(response_bytes)
+
+
+def payload_size(contents):
+    """Approximate request payload size of an OpenAI input content list"""
+    size = 0
+    for item in contents:
+        size += len(item.get('text', '')) + len(item.get('image_url', ''))
+    return size
+
+
+def render_metrics():
+    """Render all metrics in Prometheus text format, merging worker files when in multiprocess mode"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def init_app(app, app_name):
+    """Register request timing hooks and the /metrics endpoint on a Flask app"""
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('_metrics_start', None)
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if start is not None:
+            REQUEST_DURATION.labels(
+                app=app_name, route=route, method=request.method, status=response.status_code
+            ).observe(time.perf_counter() - start)
+        if response.content_length:
+            BYTES_SERVED.labels(app=app_name, route=route).inc(response.content_length)
+        # Conditional requests tell us how often browser caches are being revalidated successfully
+        if request.if_none_match or request.if_modified_since:
+            record_cache('http', response.status_code == 304)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint"""
+        return Response(render_metrics(), mimetype=CONTENT_TYPE_LATEST)
+
+    return app
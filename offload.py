@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+File Offload
+Hands file bodies (look images, hero images, page downloads) to the front
+proxy instead of streaming them from a sync gunicorn worker.
+
+SENDFILE_MODE selects how:
+    off        - Flask streams the file itself (default, for running without a proxy)
+    nginx      - respond with X-Accel-Redirect pointing at an internal nginx location
+    x-sendfile - respond with X-Sendfile and the absolute path (Apache mod_xsendfile, lighttpd)
+
+The route still checks the request and resolves the file; only the transfer
+moves to the proxy, so a slow client no longer holds a worker. The nginx
+locations this expects are in deploy/nginx.conf.
+
+The app sets Cache-Control, and nginx keeps it across the redirect: look and
+hero images never change under the same name, so they get IMAGE_MAX_AGE; page
+downloads change on /update and product edits, so they're no-cache.
+"""
+
+import os
+import mimetypes
+from urllib.parse import quote
+
+from flask import current_app, send_file
+
+SENDFILE_MODE = os.getenv('SENDFILE_MODE', 'off')
+# Internal nginx locations for the local storage root (the app directory) and for the S3 backend's read-through cache
+ACCEL_LOCATION = os.getenv('SENDFILE_ACCEL_LOCATION', '/_protected/')
+ACCEL_CACHE_LOCATION = os.getenv('SENDFILE_ACCEL_CACHE_LOCATION', '/_storage_cache/')
+IMAGE_MAX_AGE = int(os.getenv('SENDFILE_IMAGE_MAX_AGE', str(7 * 24 * 3600)))
+
+
+def _accel_uri(path):
+    """Internal URI nginx maps back to the file, or None if the file is outside the mapped directory"""
+    from storage import get_storage
+    storage = get_storage()
+    if storage.is_local:
+        root, location = os.path.realpath(storage.root), ACCEL_LOCATION
+    else:
+        root, location = os.path.realpath(storage.cache.cache_dir), ACCEL_CACHE_LOCATION
+    path = os.path.realpath(path)
+    if not path.startswith(root + os.sep):
+        return None
+    return location + quote(os.path.relpath(path, root))
+
+
+def send_stored_file(path, as_attachment=False, download_name=None, mimetype=None, max_age=None):
+    """send_file(), or an empty response that tells the proxy which file to send.
+    max_age (seconds) makes the file publicly cacheable; without it clients revalidate every time"""
+    uri = _accel_uri(path) if SENDFILE_MODE == 'nginx' else None
+    if uri is None:
+        # x-sendfile mode is Flask's own USE_X_SENDFILE support (enabled in init_app)
+        response = send_file(os.path.abspath(path), as_attachment=as_attachment, download_name=download_name, mimetype=mimetype)
+    else:
+        response = current_app.response_class(status=200)
+        response.headers['X-Accel-Redirect'] = uri
+        response.mimetype = mimetype or mimetypes.guess_type(download_name or path)[0] or 'application/octet-stream'
+        if as_attachment:
+            response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(download_name or os.path.basename(path))}"
+    response.headers['Cache-Control'] = f"public, max-age={max_age}" if max_age else 'no-cache'
+    return response
+
+
+def init_app(app):
+    """Configure a Flask app for the selected SENDFILE_MODE"""
+    if SENDFILE_MODE == 'x-sendfile':
+        app.config['USE_X_SENDFILE'] = True
+    elif SENDFILE_MODE not in ('off', 'nginx'):
+        raise ValueError(f"SENDFILE_MODE must be off, nginx or x-sendfile, not {SENDFILE_MODE!r}")
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+OpenAI Emulator
+A local stand-in for the Responses API (responses.create with the
+image_generation tool), so the hero image and look pipelines can be load
+tested without network access or API spend. Both apps and LookGenerator talk
+to it when OPENAI_BASE_URL points here.
+
+Each request sleeps for a latency drawn from a distribution, may fail with a
+500 or a 429 at the configured rates, and otherwise returns a generated PNG of
+the configured size (noise, so it's as large as a real image). Product images
+for the reference-image fetches are served from /images/<name>.
+
+    python openai_emulator.py [options]          - Serve the emulator
+    python openai_emulator.py --bench [options]  - Time LookGenerator looks against it
+
+Latency specs (seconds): fixed:S, uniform:LO:HI, normal:MEAN:SD, lognormal:MEDIAN:SIGMA
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import zlib
+import random
+import struct
+import base64
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_PORT = 8766
+
+
+def parse_latency(spec):
+    """A function returning one latency sample in seconds, from a spec like lognormal:15:0.35"""
+    kind, *params = spec.split(':')
+    try:
+        params = [float(p) for p in params]
+        if kind == 'fixed' and len(params) == 1:
+            return lambda: params[0]
+        if kind == 'uniform' and len(params) == 2:
+            return lambda: random.uniform(*params)
+        if kind == 'normal' and len(params) == 2:
+            return lambda: max(0.0, random.gauss(*params))
+        if kind == 'lognormal' and len(params) == 2:
+            return lambda: random.lognormvariate(math.log(params[0]), params[1])
+    except ValueError:
+        pass
+    raise ValueError(f"Bad latency spec {spec!r}; expected fixed:S, uniform:LO:HI, normal:MEAN:SD or lognormal:MEDIAN:SIGMA")
+
+
+def parse_size(size):
+    width, _, height = size.lower().partition('x')
+    return int(width), int(height or width)
+
+
+def make_png(width, height, seed=0):
+    """An RGB PNG of random pixels; noise doesn't compress, so the file is about width*height*3 bytes"""
+    pixels = random.Random(seed).randbytes(width * height * 3)
+    row = width * 3
+    raw = b''.join(b'\x00' + pixels[y * row:(y + 1) * row] for y in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 1))
+            + chunk(b'IEND', b''))
+
+
+def latency_summary(seconds):
+    """Count, mean and p50/p95/p99 in milliseconds (nearest-rank percentiles)"""
+    if not seconds:
+        return {'count': 0}
+    ordered = sorted(seconds)
+
+    def percentile(q):
+        return round(ordered[max(0, math.ceil(q * len(ordered)) - 1)] * 1000, 1)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 1),
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(ordered[-1] * 1000, 1),
+    }
+
+
+class EmulatorHandler(BaseHTTPRequestHandler):
+    latency = staticmethod(lambda: 0.0)
+    error_rate = 0.0
+    rate_limit_rate = 0.0
+    image_b64 = ''
+    product_image = b''
+    stats = {'requests': 0, 'images': 0, 'errors': 0, 'rate_limited': 0, 'in_flight': 0, 'max_in_flight': 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def count(self, name, delta=1):
+        with self.stats_lock:
+            self.stats[name] += delta
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+
+    def send_body(self, status, body, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, error_type, message, headers=None):
+        body = json.dumps({'error': {'message': message, 'type': error_type, 'param': None, 'code': None}})
+        self.send_body(status, body.encode('utf-8'), headers=headers)
+
+    def do_GET(self):
+        if self.path.startswith('/images/'):
+            self.send_body(200, self.product_image, 'image/png')
+        elif self.path == '/stats':
+            with self.stats_lock:
+                self.send_body(200, json.dumps(self.stats).encode('utf-8'))
+        else:
+            self.send_error_json(404, 'invalid_request_error', f"Unknown path {self.path}")
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        if self.path.rstrip('/') not in ('/v1/responses', '/responses'):
+            self.send_error_json(404, 'invalid_request_error', f"Unknown path {self.path}")
+            return
+        self.count('requests')
+        # Rate limits come back before any work, like the real API's
+        if random.random() < self.rate_limit_rate:
+            self.count('rate_limited')
+            self.send_error_json(429, 'rate_limit_exceeded', 'Rate limit reached (emulated)', {'Retry-After': '1'})
+            return
+
+        self.count('in_flight')
+        try:
+            time.sleep(self.latency())
+        finally:
+            self.count('in_flight', -1)
+        if random.random() < self.error_rate:
+            self.count('errors')
+            self.send_error_json(500, 'server_error', 'The server had an error while processing your request (emulated)')
+            return
+
+        tools = payload.get('tools') or []
+        if any(tool.get('type') == 'image_generation' for tool in tools):
+            self.count('images')
+            output = [{'id': f"ig_{uuid.uuid4().hex}", 'type': 'image_generation_call', 'status': 'completed',
+                       'result': self.image_b64}]
+        else:
+            output = [{'id': f"msg_{uuid.uuid4().hex}", 'type': 'message', 'role': 'assistant', 'status': 'completed',
+                       'content': [{'type': 'output_text', 'text': 'Emulated response', 'annotations': []}]}]
+        body = json.dumps({
+            'id': f"resp_{uuid.uuid4().hex}",
+            'object': 'response',
+            'created_at': int(time.time()),
+            'model': payload.get('model', 'gpt-4.1'),
+            'status': 'completed',
+            'output': output,
+            'parallel_tool_calls': True,
+            'tool_choice': 'auto',
+            'tools': tools,
+        })
+        self.send_body(200, body.encode('utf-8'))
+
+
+def start_server(port=0, latency='fixed:0', error_rate=0.0, rate_limit_rate=0.0, image_size='1024x1024'):
+    """Start the emulator on a background thread and return it"""
+    EmulatorHandler.latency = staticmethod(parse_latency(latency))
+    EmulatorHandler.error_rate = error_rate
+    EmulatorHandler.rate_limit_rate = rate_limit_rate
+    EmulatorHandler.image_b64 = base64.b64encode(make_png(*parse_size(image_size))).decode('ascii')
+    EmulatorHandler.product_image = make_png(64, 64, seed=1)
+    server = ThreadingHTTPServer(('127.0.0.1', port), EmulatorHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench(server, looks=20, concurrency=4):
+    """Generate looks through LookGenerator in a scratch directory and report throughput and latency"""
+    from benchmark import quiet, working_directory
+    from look_generator import LookGenerator
+
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ['OPENAI_BASE_URL'] = f"{base_url}/v1"
+    products = [{'title': f"Product {i}", 'price': '$20', 'source': 'emulator',
+                 'image_url': f"{base_url}/images/product-{i}.png"} for i in range(4)]
+    workspace = tempfile.mkdtemp(prefix='openai-emulator-bench-')
+    timings, failures = [], []
+
+    def one_look(i):
+        start = time.perf_counter()
+        try:
+            generator.generate_shoppable_look(products, 'Emulated style', 'bench')
+            timings.append(time.perf_counter() - start)
+        except Exception as e:
+            failures.append(str(e))
+
+    try:
+        with working_directory(workspace), quiet():
+            generator = LookGenerator(openai_api_key='emulator')
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(one_look, range(looks)))
+            elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    summary = latency_summary(timings)
+    print(f"🎨 {len(timings)}/{looks} looks in {elapsed:.1f}s with {concurrency} concurrent "
+          f"({len(timings) / elapsed:.2f} looks/s)")
+    if timings:
+        print(f"   p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms, max {summary['max_ms']} ms")
+    print(f"   emulator: {json.dumps(EmulatorHandler.stats)}")
+    if failures:
+        print(f"❌ {len(failures)} failed, e.g. {failures[0]}")
+    return summary
+
+
+def main():
+    """Command line interface for the emulator"""
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI Responses API image generation tool")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Port to serve on")
+    parser.add_argument('--latency', default='lognormal:15:0.35', help="Latency distribution in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument('--image-size', default='1024x1024', help="Generated image size in pixels")
+    parser.add_argument('--bench', action='store_true', help="Time LookGenerator against an in-process emulator instead")
+    parser.add_argument('--looks', type=int, default=20, help="Looks to generate with --bench")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent looks with --bench")
+    args = parser.parse_args()
+
+    server = start_server(0 if args.bench else args.port, args.latency, args.error_rate, args.rate_limit_rate, args.image_size)
+    if args.bench:
+        summary = bench(server, args.looks, args.concurrency)
+        server.shutdown()
+        sys.exit(0 if summary['count'] == args.looks else 1)
+
+    print(f"🤖 Emulating the OpenAI Responses API at http://127.0.0.1:{args.port}/v1 "
+          f"(latency {args.latency}, {args.error_rate:.0%} errors, {args.rate_limit_rate:.0%} 429s, {args.image_size} images)")
+    print(f"   OPENAI_BASE_URL=http://127.0.0.1:{args.port}/v1 OPENAI_API_KEY=emulator gunicorn -c gunicorn.conf.py wsgi:app")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
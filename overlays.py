@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Overlays
+Product-level edits for a landing page, kept as a small JSON overlay on top
+of the catalog parsed from its captures instead of rewriting the captures.
+
+An overlay removes, reorders, overrides (title, price, image) and adds
+products by id. Ids are derived from each product's source, URL and title,
+so they survive rebuilds from the same captures and edits keep applying.
+Parsed products may be shared (the pre-fork warm cache hands out the same
+objects to every request), so overrides are applied to copies.
+"""
+
+import os
+import json
+import uuid
+import fcntl
+import hashlib
+import tempfile
+import contextlib
+from datetime import datetime
+
+from product import Product
+from storage import get_storage
+
+OVERLAY_DIR = os.getenv('OVERLAY_DIR', 'overlays')
+# Local, even when overlays live in object storage: the lock only has to cover this host's workers
+OVERLAY_LOCK_DIR = os.getenv('OVERLAY_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'trendscraper-overlay-locks'))
+EDITABLE_FIELDS = ('title', 'price', 'image_url')
+NEW_PRODUCT_FIELDS = ('title', 'price', 'image_url', 'url', 'source', 'description')
+
+
+class OverlayError(ValueError):
+    """A patch operation that can't be applied"""
+
+
+def _is_position(value):
+    # bool is an int subclass, but {"to": true} is not a position
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _string_fields(fields, allowed, what):
+    """fields as {name: str}, or OverlayError if it isn't an object of string values for allowed names"""
+    if not isinstance(fields, dict):
+        raise OverlayError(f"{what} must be an object")
+    bad = [name for name in fields if name not in allowed]
+    if bad:
+        raise OverlayError(f"{what} may only contain {', '.join(allowed)}; got {', '.join(map(str, bad))}")
+    not_strings = [name for name, value in fields.items() if not isinstance(value, str)]
+    if not_strings:
+        raise OverlayError(f"{what} values must be strings: {', '.join(not_strings)}")
+    return fields
+
+
+def product_ids(products):
+    """Stable ids for a catalog, independent of its order.
+
+    The id hashes source, URL and title; products that share those get the
+    price and image mixed in, and only exact duplicates (interchangeable
+    anyway) fall back to -2, -3... in catalog order.
+    """
+    def digest(*parts):
+        return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:12]
+
+    base = [digest(product.source, product.url, product.title) for product in products]
+    counts = {}
+    for key in base:
+        counts[key] = counts.get(key, 0) + 1
+    ids = []
+    seen = {}
+    for key, product in zip(base, products):
+        if counts[key] > 1:
+            key = digest(product.source, product.url, product.title, product.price, product.image_url)
+        seen[key] = seen.get(key, 0) + 1
+        ids.append(key if seen[key] == 1 else f"{key}-{seen[key]}")
+    return ids
+
+
+class ProductOverlay:
+    def __init__(self, slug, overlay_dir=None):
+        self.slug = slug
+        self.path = os.path.join(overlay_dir or OVERLAY_DIR, f"{slug}.json")
+        self.removed = []
+        self.order = []
+        self.overrides = {}
+        self.added = []
+        self.version = 0
+        self.updated_at = None
+
+    @classmethod
+    def load(cls, slug, overlay_dir=None):
+        overlay = cls(slug, overlay_dir)
+        storage = get_storage()
+        if storage.exists(overlay.path):
+            data = json.loads(storage.read_text(overlay.path))
+            overlay.removed = data.get('removed', [])
+            overlay.order = data.get('order', [])
+            overlay.overrides = data.get('overrides', {})
+            overlay.added = data.get('added', [])
+            overlay.version = data.get('version', 0)
+            overlay.updated_at = data.get('updated_at')
+        return overlay
+
+    @classmethod
+    @contextlib.contextmanager
+    def locked(cls, slug, overlay_dir=None):
+        """Load the overlay under an exclusive lock held until the block exits, so load/patch/save can't interleave"""
+        os.makedirs(OVERLAY_LOCK_DIR, exist_ok=True)
+        with open(os.path.join(OVERLAY_LOCK_DIR, f"{slug}.lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield cls.load(slug, overlay_dir)
+
+    def is_empty(self):
+        return not (self.removed or self.order or self.overrides or self.added)
+
+    def to_dict(self):
+        return {
+            'slug': self.slug,
+            'version': self.version,
+            'updated_at': self.updated_at,
+            'removed': self.removed,
+            'order': self.order,
+            'overrides': self.overrides,
+            'added': self.added
+        }
+
+    def save(self):
+        get_storage().write_text(self.path, json.dumps(self.to_dict(), indent=2, ensure_ascii=False))
+
+    def apply(self, products):
+        """[(id, product)] for a parsed catalog with the edits applied"""
+        removed = set(self.removed)
+        items = []
+        for product_id, product in zip(product_ids(products), products):
+            if product_id in removed:
+                continue
+            changes = self.overrides.get(product_id)
+            if changes:
+                if 'title' in changes:
+                    changes = dict(changes, display_name=changes['title'])
+                product = product.replace(**changes)
+            items.append((product_id, product))
+        for added in self.added:
+            if added['id'] not in removed:
+                fields = {name: added.get(name, '') for name in NEW_PRODUCT_FIELDS}
+                items.append((added['id'], Product(display_name=fields['title'], **fields)))
+
+        # Explicitly ordered products first, the rest keep their catalog order after them
+        position = {product_id: index for index, product_id in enumerate(self.order)}
+        items.sort(key=lambda item: position.get(item[0], len(position)))
+        return items
+
+    def patch(self, ops, catalog_ids):
+        """Apply patch operations in order and return the ids whose cards changed.
+
+        ops is a list of {"op": "remove"|"restore"|"set"|"move"|"add", ...}; see the README.
+        Raises OverlayError without changing anything if any op is invalid.
+        """
+        known = set(catalog_ids) | {added['id'] for added in self.added}
+        state = json.loads(json.dumps(self.to_dict()))
+        current = [item_id for item_id in list(catalog_ids) + [a['id'] for a in state['added']]
+                   if item_id not in state['removed']]
+        position = {item_id: index for index, item_id in enumerate(state['order'])}
+        current.sort(key=lambda item_id: position.get(item_id, len(position)))
+        changed = []
+
+        for op in ops:
+            if not isinstance(op, dict):
+                raise OverlayError(f"Each op must be an object, got {op!r}")
+            kind = op.get('op')
+            product_id = op.get('id')
+            if kind != 'add' and (not isinstance(product_id, str) or product_id not in known):
+                raise OverlayError(f"Unknown product id: {product_id!r}")
+
+            if kind == 'remove':
+                if product_id not in state['removed']:
+                    state['removed'].append(product_id)
+                if product_id in current:
+                    current.remove(product_id)
+            elif kind == 'restore':
+                if product_id in state['removed']:
+                    state['removed'].remove(product_id)
+                    current.append(product_id)
+                state['overrides'].pop(product_id, None)
+            elif kind == 'set':
+                fields = _string_fields(op.get('fields'), EDITABLE_FIELDS, "'fields'")
+                if not fields:
+                    raise OverlayError(f"Editable fields are {', '.join(EDITABLE_FIELDS)}; got none")
+                added = next((a for a in state['added'] if a['id'] == product_id), None)
+                if added:
+                    added.update(fields)
+                else:
+                    state['overrides'].setdefault(product_id, {}).update(fields)
+            elif kind == 'move':
+                to = op.get('to')
+                if product_id not in current or not _is_position(to):
+                    raise OverlayError(f"Can't move {product_id!r} to {to!r}")
+                current.remove(product_id)
+                current.insert(max(0, min(to, len(current))), product_id)
+                state['order'] = list(current)
+            elif kind == 'add':
+                fields = _string_fields(op.get('product'), NEW_PRODUCT_FIELDS, "'product'")
+                if not fields.get('title') or not fields.get('url'):
+                    raise OverlayError("Added products need at least a title and a url")
+                at = op.get('at')
+                if at is not None and not _is_position(at):
+                    raise OverlayError(f"Can't add a product at {at!r}")
+                product_id = f"added-{uuid.uuid4().hex[:8]}"
+                state['added'].append(dict({name: fields.get(name, '') for name in NEW_PRODUCT_FIELDS}, id=product_id))
+                known.add(product_id)
+                current.insert(len(current) if at is None else max(0, min(at, len(current))), product_id)
+                if at is not None:
+                    state['order'] = list(current)
+            else:
+                raise OverlayError(f"Unknown op: {kind!r}")
+            changed.append(product_id)
+
+        self.removed = state['removed']
+        self.order = state['order']
+        self.overrides = state['overrides']
+        self.added = state['added']
+        self.version += 1
+        self.updated_at = datetime.now().isoformat(timespec='seconds')
+        return list(dict.fromkeys(changed))
+
+
+def apply_overlay(slug, products, overlay_dir=None):
+    """Products for a page with its saved overlay applied (the same list if there is none)"""
+    overlay = ProductOverlay.load(slug, overlay_dir)
+    if overlay.is_empty():
+        return products
+    return [product for _, product in overlay.apply(products)]
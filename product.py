@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Product
+The single record type every parser and scraper produces.
+
+Products use __slots__ instead of a per-product dict, and the source name is
+interned, so a large catalog doesn't carry a copy of every key and every
+"Pinterest"/"Google" string per product. Templates read the attributes
+directly; as_dict() and csv_row() are the only conversions, used where a
+product leaves the process as JSON or CSV.
+"""
+
+import os
+import sys
+import random
+
+PINTEREST = sys.intern('Pinterest')
+GOOGLE = sys.intern('Google')
+
+SOURCE_LOGOS = {
+    PINTEREST: 'https://1000logos.net/wp-content/uploads/2018/03/Pinterest-Logo-2011-2016.png',
+    GOOGLE: 'https://www.google.com/images/branding/googlelogo/1x/googlelogo_color_272x92dp.png'
+}
+DEFAULT_LOGO = 'https://via.placeholder.com/30x30/cccccc/666666?text=?'
+
+CSV_HEADER = ['Title', 'Price', 'Image URL', 'Product URL', 'Source', 'Description']
+
+
+class Product:
+    __slots__ = ('title', 'display_name', 'image_url', 'url', 'price', 'description', 'source')
+
+    def __init__(self, title='', display_name='', image_url=None, url='', price='', description='', source=''):
+        self.title = title
+        self.display_name = display_name
+        self.image_url = image_url
+        self.url = url
+        self.price = price
+        self.description = description
+        self.source = sys.intern(source) if source else ''
+
+    def __repr__(self):
+        return f"Product({self.source}: {self.title[:40]!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Product):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    @property
+    def heading(self):
+        """Name shown on a product card: display_name, falling back to the grid title"""
+        return self.display_name or self.title
+
+    @property
+    def alt_text(self):
+        return self.description or self.heading
+
+    @property
+    def source_logo(self):
+        return SOURCE_LOGOS.get(self.source, DEFAULT_LOGO)
+
+    def as_dict(self):
+        """Template/CSV shape used for JSON payloads and saved looks"""
+        return {
+            'title': self.title,
+            'price': self.price,
+            'image_url': self.image_url,
+            'url': self.url,
+            'source': self.source,
+            'description': self.description
+        }
+
+    def replace(self, **changes):
+        """Copy with some fields changed; products can be shared, so edits never mutate in place"""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return Product(**fields)
+
+    def csv_row(self):
+        return [self.title, self.price, self.image_url, self.url, self.source, self.description]
+
+
+def to_json(obj):
+    """json.dump default= hook for lists that contain Products"""
+    if isinstance(obj, Product):
+        return obj.as_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def interleave(seed, *sources):
+    """Mix product lists into one order that depends only on the seed and the inputs.
+
+    Each step draws the next product from a source with probability proportional
+    to what that source has left, so sources stay evenly spread down the page as
+    with random.shuffle, but rebuilding the same captures gives the same bytes.
+    PRODUCT_ORDER=random restores an unseeded shuffle.
+    """
+    if os.getenv('PRODUCT_ORDER', 'seeded') == 'random':
+        products = [product for source in sources for product in source]
+        random.shuffle(products)
+        return products
+    # A str seed is hashed with SHA-512 by random.Random, so it is stable across processes
+    rng = random.Random(f"trendscraper:{seed}")
+    queues = [rng.sample(list(source), len(source)) for source in sources if source]
+    products = []
+    while queues:
+        queue = rng.choices(queues, weights=[len(q) for q in queues])[0]
+        products.append(queue.pop())
+        queues = [q for q in queues if q]
+    return products
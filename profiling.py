@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Request Profiling
+Opt-in, per-request profiling for the Flask apps.
+
+A request is profiled when it carries an X-Profile-Token header matching the
+PROFILE_TOKEN environment variable (or when PROFILE_ALL_REQUESTS=1). The default
+sampling profiler writes a collapsed-stack file (for flamegraph.pl / inferno)
+and a speedscope JSON file under profiles/. Send X-Profile-Mode: cprofile to
+get a cProfile .prof dump instead.
+"""
+
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime
+
+from flask import request, g, jsonify, send_file, abort
+
+PROFILE_HEADER = 'X-Profile-Token'
+MODE_HEADER = 'X-Profile-Mode'
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_weights = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self.started_at = None
+        self.duration = 0.0
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                stack = self._stack(frame)
+                self.samples[stack] += 1
+                self.sample_weights[stack] += (now - last) * 1000
+            last = now
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = (time.perf_counter() - self.started_at) * 1000
+
+    def collapsed(self):
+        """Brendan Gregg collapsed-stack format: frame;frame;frame count"""
+        lines = []
+        for stack, count in self.samples.most_common():
+            frames = ';'.join(f"{name} ({os.path.basename(filename)}:{line})" for name, filename, line in stack)
+            lines.append(f"{frames} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def speedscope(self, name):
+        """speedscope sampled-profile JSON"""
+        frames = []
+        frame_index = {}
+        samples = []
+        weights = []
+        for stack, weight in self.sample_weights.items():
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                indexes.append(frame_index[frame])
+            samples.append(indexes)
+            weights.append(round(weight, 3))
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'trendscraper-profiling',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(self.duration, 3),
+                'samples': samples,
+                'weights': weights
+            }]
+        }
+
+
+class RequestProfiler:
+    def __init__(self, app, profile_dir=None, token=None, profile_all=None, interval=None):
+        self.app = app
+        self.profile_dir = profile_dir or os.getenv('PROFILE_DIR', 'profiles')
+        self.token = token if token is not None else os.getenv('PROFILE_TOKEN', '')
+        if profile_all is None:
+            profile_all = os.getenv('PROFILE_ALL_REQUESTS') == '1'
+        self.profile_all = profile_all
+        self.interval = interval or float(os.getenv('PROFILE_INTERVAL_MS', '1')) / 1000
+        if self.enabled:
+            os.makedirs(self.profile_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return bool(self.token) or self.profile_all
+
+    def authorized(self):
+        supplied = request.headers.get(PROFILE_HEADER) or request.args.get('profile_token', '')
+        return bool(self.token) and bool(supplied) and hmac.compare_digest(supplied, self.token)
+
+    def should_profile(self):
+        if request.path.startswith('/_profiles') or request.path == '/metrics':
+            return False
+        return self.profile_all or self.authorized()
+
+    def profile_name(self):
+        route = re.sub(r'[^a-zA-Z0-9]+', '-', request.path).strip('-') or 'root'
+        return f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{request.method.lower()}_{route[:80]}"
+
+    def start(self):
+        if not self.should_profile():
+            return
+        mode = request.headers.get(MODE_HEADER, 'sample').lower()
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            mode = 'sample'
+            profiler = SamplingProfiler(threading.get_ident(), self.interval)
+            profiler.start()
+        g._profile = (mode, profiler, self.profile_name())
+
+    def finish(self, response):
+        state = g.pop('_profile', None)
+        if not state:
+            return response
+        mode, profiler, name = state
+        base_path = os.path.join(self.profile_dir, name)
+        if mode == 'cprofile':
+            profiler.disable()
+            profiler.dump_stats(base_path + '.prof')
+            with open(base_path + '.txt', 'w', encoding='utf-8') as f:
+                pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(60)
+        else:
+            profiler.stop()
+            with open(base_path + '.collapsed', 'w', encoding='utf-8') as f:
+                f.write(profiler.collapsed())
+            with open(base_path + '.speedscope.json', 'w', encoding='utf-8') as f:
+                json.dump(profiler.speedscope(f"{request.method} {request.path}"), f)
+        response.headers['X-Profile-Id'] = name
+        return response
+
+    def abandon(self):
+        """Stop a profiler whose request ended in an unhandled exception"""
+        state = g.pop('_profile', None)
+        if not state:
+            return
+        mode, profiler, _ = state
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+
+    def list_profiles(self):
+        profiles = []
+        for filename in sorted(os.listdir(self.profile_dir), reverse=True):
+            filepath = os.path.join(self.profile_dir, filename)
+            stat = os.stat(filepath)
+            profiles.append({
+                'filename': filename,
+                'size': stat.st_size,
+                'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                'url': f'/_profiles/{filename}'
+            })
+        return profiles
+
+
+def init_app(app):
+    """Register the profiling hooks and the /_profiles endpoints on a Flask app"""
+    profiler = RequestProfiler(app)
+    app.extensions['request_profiler'] = profiler
+
+    @app.before_request
+    def _start_profile():
+        profiler.start()
+
+    @app.after_request
+    def _finish_profile(response):
+        return profiler.finish(response)
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        profiler.abandon()
+
+    @app.route('/_profiles')
+    def list_profiles():
+        """List saved request profiles"""
+        if not profiler.enabled or not profiler.authorized():
+            abort(404)
+        return jsonify(profiler.list_profiles())
+
+    @app.route('/_profiles/<filename>')
+    def download_profile(filename):
+        """Download a saved request profile"""
+        if not profiler.enabled or not profiler.authorized():
+            abort(404)
+        filepath = os.path.join(profiler.profile_dir, os.path.basename(filename))
+        if not os.path.exists(filepath):
+            abort(404)
+        return send_file(os.path.abspath(filepath), as_attachment=True)
+
+    return app
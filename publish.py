@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Publish
+Builds the landing pages into a static site in dist/ that nginx or a CDN can
+serve without going through a Python worker:
+
+    dist/view/<slug>.html        - minified page (same URL path as the Flask /view route)
+    dist/assets/<name>.<hash>.*  - CSS, JS and look images named by content hash, cacheable forever
+    dist/looks.json              - looks feed with image URLs pointing at the hashed assets
+    dist/sitemap.xml
+    dist/manifest.json           - what was published, from which inputs, into which files
+
+Every text file also gets a precompressed .gz (and .br when the optional
+brotli package is installed) for gzip_static/brotli_static. Each page
+records a fingerprint of its captures, its product overlay and the
+generator code, so a publish only rebuilds the pages whose inputs changed.
+
+    python publish.py                 - Publish every page (unchanged ones are skipped), prune stale files
+    python publish.py 'storage hacks' - Republish only these terms
+    python publish.py --force         - Rebuild everything
+"""
+
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import fcntl
+import hashlib
+import tempfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from capture_store import get_capture_store, logical_name
+from capture_registry import get_capture_registry, parse_capture_name, term_key
+from storage import get_storage
+from sharding import get_collection
+from overlays import OVERLAY_DIR
+from trend_generator import TrendLandingPageGenerator, resolve_capture_path
+
+PUBLISH_DIR = os.getenv('PUBLISH_DIR', 'dist')
+# Prefix for asset URLs; point it at a CDN (https://cdn.example.com/assets/) to serve assets from there
+ASSET_URL = os.getenv('PUBLISH_ASSET_URL', '/assets/')
+BASE_URL = os.getenv('PUBLISH_BASE_URL', 'http://localhost:5000')
+UPLOADS_DIR = 'uploads'
+COMPRESSIBLE = ('.html', '.css', '.js', '.json', '.xml', '.svg')
+# Source files whose changes alter the rendered pages
+GENERATOR_SOURCES = ('trend_generator.py', 'product.py', 'overlays.py', 'publish.py')
+
+STYLE_BLOCK = re.compile(r'<style>(.*?)</style>', re.S)
+INLINE_SCRIPT = re.compile(r'<script>(.*?)</script>', re.S)
+# Elements whose whitespace is significant or which aren't HTML
+VERBATIM_BLOCK = re.compile(r'(<(pre|textarea|script|style)\b.*?</\2>)', re.S | re.I)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def minify_html(html):
+    """Drop comments and collapse whitespace runs outside <pre>, <textarea>, <script> and <style>"""
+    parts = VERBATIM_BLOCK.split(html)
+    out = []
+    # split() with two groups yields text, block, tag name, text, block, tag name...
+    for index in range(0, len(parts), 3):
+        text = re.sub(r'<!--(?!\[if).*?-->', '', parts[index], flags=re.S)
+        out.append(re.sub(r'\s+', lambda m: '\n' if '\n' in m.group(0) else ' ', text))
+        if index + 1 < len(parts):
+            out.append(parts[index + 1])
+    return ''.join(out).strip() + '\n'
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+class Publisher:
+    def __init__(self, dist_dir=None, asset_url=None, base_url=None):
+        self.dist_dir = dist_dir or PUBLISH_DIR
+        self.asset_url = asset_url or ASSET_URL
+        self.base_url = (base_url or BASE_URL).rstrip('/')
+        self.manifest_path = os.path.join(self.dist_dir, 'manifest.json')
+        self.generator = TrendLandingPageGenerator()
+        self.storage = get_storage()
+        self.stats = {'published': 0, 'unchanged': 0, 'empty': 0, 'written': 0, 'pruned': 0}
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'version': 1, 'generated_at': None, 'pages': {}, 'empty': {}, 'assets': {}, 'looks': {}, 'images': {}}
+
+    def _locked(self):
+        """Exclusive lock so a watch worker and a manual publish don't interleave manifest updates"""
+        os.makedirs(self.dist_dir, exist_ok=True)
+        lock = open(os.path.join(self.dist_dir, '.publish.lock'), 'w')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def write(self, relative_path, data):
+        """Write a file into dist/ (and its precompressed variants), skipping it if the bytes are unchanged"""
+        path = os.path.join(self.dist_dir, relative_path)
+        try:
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    return
+        except OSError:
+            pass
+        variants = [(path, data)]
+        if relative_path.endswith(COMPRESSIBLE):
+            variants.append((path + '.gz', gzip.compress(data, compresslevel=9, mtime=0)))
+            if brotli:
+                variants.append((path + '.br', brotli.compress(data)))
+        # Compressed variants first, so nginx never pairs a new page with an old .gz
+        for target, payload in reversed(variants):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, target)
+        self.stats['written'] += 1
+
+    def asset(self, name, ext, data):
+        """Publish content under assets/<name>.<hash><ext> and return its URL"""
+        relative_path = f"assets/{name}.{content_hash(data)}{ext}"
+        if not os.path.exists(os.path.join(self.dist_dir, relative_path)):
+            self.write(relative_path, data)
+        return relative_path, self.asset_url + relative_path[len('assets/'):]
+
+    def sources(self):
+        """{term key: (term, pinterest capture, google capture)}; uploads/ wins over scraped_data/, as in the web app"""
+        found = {}
+        registry = get_capture_registry()
+        for key, entries in registry.entries().items():
+            pinterest_file, google_file = registry.latest_pair(entries[0]['term'])
+            if pinterest_file or google_file:
+                found[key] = (entries[0]['term'], pinterest_file, google_file)
+        for path in sorted(glob.glob(os.path.join(UPLOADS_DIR, '*'))):
+            parsed = parse_capture_name(os.path.basename(path))
+            if not parsed:
+                continue
+            search_term = parsed[0]
+            base = os.path.join(UPLOADS_DIR, term_key(search_term))
+            found[term_key(search_term)] = (search_term, resolve_capture_path(f"{base}_pinterest.json"),
+                                            resolve_capture_path(f"{base}_google.html"))
+        return found
+
+    def fingerprint(self, slug, pinterest_file, google_file):
+        """Hash of everything a page is built from"""
+        digest = hashlib.sha256()
+        store = get_capture_store()
+        for path in (pinterest_file, google_file):
+            digest.update((store.sha256_of(path) if path and store.exists(path) else '-').encode('utf-8'))
+        overlay_key = os.path.join(OVERLAY_DIR, f"{slug}.json")
+        if self.storage.exists(overlay_key):
+            digest.update(self.storage.read_bytes(overlay_key))
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in GENERATOR_SOURCES:
+            with open(os.path.join(here, name), 'rb') as f:
+                digest.update(f.read())
+        digest.update(self.asset_url.encode('utf-8'))
+        return digest.hexdigest()
+
+    def publish_page(self, manifest, search_term, pinterest_file, google_file, force=False):
+        slug = self.generator.generate_slug(search_term)
+        fingerprint = self.fingerprint(slug, pinterest_file, google_file)
+        current = manifest['pages'].get(slug)
+        if (not force and current and current['fingerprint'] == fingerprint
+                and os.path.exists(os.path.join(self.dist_dir, current['path']))):
+            self.stats['unchanged'] += 1
+            print(f"⏭️  {slug}: unchanged")
+            return current
+        if not force and manifest['empty'].get(slug) == fingerprint:
+            self.stats['empty'] += 1
+            return None
+
+        pinterest_products, google_products = self.generator.load_products(pinterest_file, google_file)
+        html, product_count = self.generator.render_landing_page(search_term, pinterest_products, google_products)
+        if html is None:
+            # Remembered so captures without products aren't parsed again until they change
+            manifest['empty'][slug] = fingerprint
+            manifest['pages'].pop(slug, None)
+            self.stats['empty'] += 1
+            print(f"❌ {slug}: no products")
+            return None
+
+        # Styles are the same on every page, so they become one shared, long-cached stylesheet
+        assets = []
+        css = minify_css('\n'.join(STYLE_BLOCK.findall(html))).encode('utf-8')
+        css_path, css_url = self.asset('landing', '.css', css)
+        assets.append(css_path)
+        html = STYLE_BLOCK.sub('', html)
+        html = html.replace('</head>', f'<link rel="stylesheet" href="{css_url}">\n</head>', 1)
+
+        # The page script embeds the product data, so it is per page but still immutable under its hash
+        for index, script in enumerate(INLINE_SCRIPT.findall(html)):
+            js_path, js_url = self.asset(slug if index == 0 else f"{slug}-{index}", '.js', script.strip().encode('utf-8'))
+            assets.append(js_path)
+            html = html.replace(f'<script>{script}</script>', f'<script src="{js_url}"></script>', 1)
+
+        manifest['empty'].pop(slug, None)
+        page_path = f"view/{slug}.html"
+        data = minify_html(html).encode('utf-8')
+        self.write(page_path, data)
+        manifest['pages'][slug] = {
+            'term': search_term,
+            'path': page_path,
+            'fingerprint': fingerprint,
+            'captures': [logical_name(path) for path in (pinterest_file, google_file) if path],
+            'assets': assets,
+            'products': product_count,
+            'bytes': len(data),
+            'published_at': datetime.now().isoformat(timespec='seconds')
+        }
+        self.stats['published'] += 1
+        print(f"✅ {slug}: {product_count} products, {len(data):,} bytes")
+        return manifest['pages'][slug]
+
+    def publish_looks(self, manifest, force=False):
+        """looks.json with each look's image published as a hashed asset; an image whose size and
+        modification time match the manifest reuses its asset instead of being read and hashed again"""
+        looks = []
+        manifest['looks'] = {}
+        published, manifest['images'] = manifest.get('images', {}), {}
+        listings = {}
+        for obj in get_collection('looks').list():
+            if not obj.key.endswith('.json') or os.path.basename(obj.key) == 'looks.json':
+                continue
+            try:
+                look = json.loads(self.storage.read_text(obj.key))
+            except Exception as e:
+                print(f"❌ Error loading look {obj.key}: {e}")
+                continue
+            # Image URLs name a file in a sharded collection, e.g. /static/generated_images/<file>
+            image_key = (look.get('image_url') or '').lstrip('/')
+            directory, filename = os.path.split(image_key)
+            if directory and directory not in listings:
+                listings[directory] = {os.path.basename(image.key): image for image in get_collection(directory).list()}
+            image = listings.get(directory, {}).get(filename)
+            if image:
+                entry = {'size': image.size, 'modified': image.modified.isoformat()}
+                previous = published.get(image_key)
+                if (not force and previous and previous['size'] == entry['size'] and previous['modified'] == entry['modified']
+                        and os.path.exists(os.path.join(self.dist_dir, previous['asset']))):
+                    image_path = previous['asset']
+                    look['image_url'] = self.asset_url + image_path[len('assets/'):]
+                else:
+                    name, ext = os.path.splitext(filename)
+                    image_path, look['image_url'] = self.asset(name, ext.lower(), get_collection(directory).read_bytes(filename))
+                manifest['images'][image_key] = dict(entry, asset=image_path)
+                manifest['assets'][image_key] = image_path
+            manifest['looks'][look.get('id', obj.key)] = look.get('image_url')
+            looks.append(look)
+        looks.sort(key=lambda look: look.get('created_at', ''), reverse=True)
+        self.write('looks.json', json.dumps(looks, indent=2, ensure_ascii=False).encode('utf-8'))
+        return looks
+
+    def sitemap(self, manifest):
+        urls = [f"{self.base_url}/{page['path']}" for _, page in sorted(manifest['pages'].items())]
+        urls += [f"{self.base_url}/view_look/{look_id}" for look_id in sorted(manifest['looks'])]
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        lines += [f"  <url><loc>{escape(url)}</loc></url>" for url in urls]
+        lines.append('</urlset>')
+        self.write('sitemap.xml', ('\n'.join(lines) + '\n').encode('utf-8'))
+
+    def prune(self, manifest):
+        """Remove pages and assets the manifest no longer references"""
+        keep = {page['path'] for page in manifest['pages'].values()}
+        keep |= {path for page in manifest['pages'].values() for path in page['assets']}
+        keep |= set(manifest['assets'].values())
+        for directory in ('view', 'assets'):
+            for path in glob.glob(os.path.join(self.dist_dir, directory, '*')):
+                relative_path = os.path.relpath(path, self.dist_dir)
+                base = re.sub(r'\.(gz|br)$', '', relative_path)
+                if base not in keep:
+                    os.remove(path)
+                    self.stats['pruned'] += 1
+
+    def publish(self, terms=None, force=False):
+        """Publish every page, or only the given terms, then refresh the looks feed, sitemap and manifest"""
+        lock = self._locked()
+        try:
+            manifest = self.load_manifest()
+            sources = self.sources()
+            if terms:
+                selected = {}
+                for search_term in terms:
+                    key = term_key(search_term)
+                    if key in sources:
+                        selected[key] = sources[key]
+                    else:
+                        print(f"❌ No captures found for '{search_term}'")
+            else:
+                selected = sources
+                # Pages whose captures are gone are dropped from a full publish
+                slugs = {self.generator.generate_slug(entry[0]) for entry in sources.values()}
+                for pages in (manifest['pages'], manifest['empty']):
+                    for slug in list(pages):
+                        if slug not in slugs:
+                            del pages[slug]
+
+            for search_term, pinterest_file, google_file in selected.values():
+                self.publish_page(manifest, search_term, pinterest_file, google_file, force=force)
+
+            manifest['assets'] = {}
+            self.publish_looks(manifest, force=force)
+            self.sitemap(manifest)
+            if not terms:
+                self.prune(manifest)
+            manifest['generated_at'] = datetime.now().isoformat(timespec='seconds')
+            self.write('manifest.json', json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+        finally:
+            lock.close()
+        return manifest
+
+
+def main():
+    """Command line interface for publishing the static site"""
+    args = sys.argv[1:]
+    if args and args[0] in ('-h', '--help'):
+        print("Usage:")
+        print("  python publish.py                  - Publish every page (unchanged ones are skipped)")
+        print("  python publish.py 'term' ['term']  - Republish only these terms")
+        print("  python publish.py --force          - Rebuild everything")
+        return
+    force = '--force' in args
+    terms = [arg for arg in args if arg != '--force']
+    publisher = Publisher()
+    manifest = publisher.publish(terms, force=force)
+    stats = publisher.stats
+    print("=" * 50)
+    print(f"📦 {len(manifest['pages'])} pages in {publisher.dist_dir}/: {stats['published']} published, "
+          f"{stats['unchanged']} unchanged, {stats['empty']} without products; "
+          f"{stats['written']} files written, {stats['pruned']} pruned")
+    if not brotli:
+        print("ℹ️  pip install brotli to also write .br files")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Response Cache
+Rendered responses for the read-only Jinja routes (/, /view_with_looks, /looks,
+/view_look), kept until a write route changes what they were rendered from.
+
+Each cached route declares tags ('pages', 'page:{filename}', ...) and each
+write route invalidates the tags it touches. A tag's generation is a small
+file under RESPONSE_CACHE_DIR, so a write handled by one gunicorn worker
+invalidates the copies in every other worker: a hit costs one stat per tag.
+
+Responses live in an in-process LRU (RESPONSE_CACHE_SIZE entries) and, with
+RESPONSE_CACHE_DISK=1, in a disk tier shared by the workers, so a page rendered
+by one worker is a hit for the others. Disk entries are a JSON header line and
+the raw body, in a directory only the app's user can write (cache/responses
+under the app directory by default). RESPONSE_CACHE_TTL bounds how stale a
+page can get from changes made outside the app (CLIs, other instances).
+Every response gets an ETag; a matching If-None-Match gets a 304.
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import functools
+import threading
+from collections import OrderedDict
+
+from flask import request, session, g, current_app, get_flashed_messages
+
+from metrics import record_cache
+from storage import private_dir
+
+RESPONSE_CACHE = os.getenv('RESPONSE_CACHE', '1') == '1'
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '512'))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '300'))
+RESPONSE_CACHE_DISK = os.getenv('RESPONSE_CACHE_DISK', '0') == '1'
+RESPONSE_CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR', os.path.join('cache', 'responses'))
+
+
+class ResponseCache:
+    def __init__(self, cache_dir=None, max_entries=None, ttl=None, disk=None):
+        self.cache_dir = os.path.abspath(cache_dir or RESPONSE_CACHE_DIR)
+        self.generations_dir = os.path.join(self.cache_dir, 'generations')
+        self.responses_dir = os.path.join(self.cache_dir, 'responses')
+        self.max_entries = max_entries if max_entries is not None else RESPONSE_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else RESPONSE_CACHE_TTL
+        self.disk = disk if disk is not None else RESPONSE_CACHE_DISK
+        self._entries = OrderedDict()
+        self._mutex = threading.Lock()
+        private_dir(self.cache_dir)
+        private_dir(self.generations_dir)
+        if self.disk:
+            private_dir(self.responses_dir)
+
+    def _generation_path(self, tag):
+        return os.path.join(self.generations_dir, hashlib.sha1(tag.encode('utf-8')).hexdigest())
+
+    def generations(self, tags):
+        """Current generation of each tag: the inode and mtime of its file, replaced on every invalidation"""
+        current = []
+        for tag in tags:
+            try:
+                stat = os.stat(self._generation_path(tag))
+                current.append((stat.st_ino, stat.st_mtime_ns))
+            except FileNotFoundError:
+                current.append(None)
+        return tuple(current)
+
+    def invalidate(self, *tags):
+        """Make every cached response carrying any of these tags stale, in all workers"""
+        for tag in tags:
+            fd, tmp_path = tempfile.mkstemp(dir=self.generations_dir, prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                f.write(tag)
+            os.replace(tmp_path, self._generation_path(tag))
+
+    def _fresh(self, entry, generations):
+        return entry is not None and entry['generations'] == generations and time.time() - entry['created'] < self.ttl
+
+    def _disk_path(self, key):
+        return os.path.join(self.responses_dir, hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.response')
+
+    def get(self, key, generations):
+        """A fresh entry for key, from memory or the disk tier, or None"""
+        with self._mutex:
+            entry = self._entries.get(key)
+            if self._fresh(entry, generations):
+                self._entries.move_to_end(key)
+                record_cache('response_memory', True)
+                return entry
+        record_cache('response_memory', False)
+
+        if not self.disk:
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                entry = json.loads(f.readline())
+                entry['body'] = f.read()
+            entry['generations'] = tuple(tuple(g) if g is not None else None for g in entry['generations'])
+        except (OSError, ValueError, KeyError, TypeError):
+            entry = None
+        hit = self._fresh(entry, generations) and entry['key'] == repr(key)
+        record_cache('response_disk', hit)
+        if not hit:
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def set(self, key, generations, body, mimetype):
+        entry = {
+            'key': repr(key),
+            'generations': generations,
+            'created': time.time(),
+            'etag': hashlib.sha1(body).hexdigest(),
+            'mimetype': mimetype,
+            'body': body,
+        }
+        self._remember(key, entry)
+        if self.disk:
+            fd, tmp_path = tempfile.mkstemp(dir=self.responses_dir, prefix='.tmp-')
+            header = {name: value for name, value in entry.items() if name != 'body'}
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(header).encode('utf-8') + b'\n')
+                f.write(body)
+            os.replace(tmp_path, self._disk_path(key))
+        return entry
+
+    def _remember(self, key, entry):
+        with self._mutex:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._mutex:
+            self._entries.clear()
+
+
+_cache = None
+
+
+def get_response_cache():
+    """Shared ResponseCache instance"""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+
+def _respond(entry):
+    response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+    response.set_etag(entry['etag'])
+    # Revalidate every time: the ETag makes that a 304 until a write changes the page
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+def cached(*tags):
+    """Decorator: cache a view's rendered 200 responses per endpoint and arguments.
+    tags are formatted with the view arguments, e.g. cached('pages', 'page:{filename}')"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            # Pending flash messages are rendered into (and consumed by) the page, so those renders aren't shared;
+            # a profiled request always renders, or its profile would only show the cache lookup
+            if not RESPONSE_CACHE or request.method != 'GET' or session.get('_flashes') or g.get('_profile'):
+                return view(**kwargs)
+            cache = get_response_cache()
+            key = (request.endpoint, tuple(sorted(kwargs.items())), request.query_string)
+            entry_tags = [tag.format(**kwargs) for tag in tags]
+            # Read before rendering, so a write that lands mid-render leaves this entry already stale
+            generations = cache.generations(entry_tags)
+            entry = cache.get(key, generations)
+            if entry is not None:
+                return _respond(entry)
+
+            response = current_app.make_response(view(**kwargs))
+            # Error pages flash a message, left pending or already rendered in; neither is worth keeping
+            if (response.status_code != 200 or response.direct_passthrough
+                    or session.get('_flashes') or get_flashed_messages()):
+                return response
+            return _respond(cache.set(key, generations, response.get_data(), response.mimetype))
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags):
+    """Invalidate tags after a write; a no-op when the cache is off"""
+    if RESPONSE_CACHE:
+        get_response_cache().invalidate(*tags)
@@ -17,12 +17,134 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import random
+from product import Product, PINTEREST, to_json
+from capture_registry import get_capture_registry
+from logs import get_logger, log
+import logging
+
+logger = get_logger('selenium')
+
+# In-page extractors: run once via execute_script and return compact JSON instead of page_source.
+# They mirror the selectors in TrendLandingPageGenerator.parse_pinterest_html / parse_google_html.
+PINTEREST_EXTRACT_JS = """
+const maxResults = arguments[0];
+const first = (root, selectors, read) => {
+    for (const selector of selectors) {
+        for (const el of root.querySelectorAll(selector)) {
+            const value = read(el);
+            if (value) return value;
+        }
+    }
+    return '';
+};
+const text = el => (el.textContent || '').trim();
+const pinSelectors = ['[data-test-id="pin"]', '[data-test-id="pinWrapper"]', '.pin', 'a[href*="/pin/"]'];
+let results = [];
+for (const selector of pinSelectors) {
+    const pins = document.querySelectorAll(selector);
+    for (const pin of pins) {
+        if (results.length >= maxResults) break;
+        const title = first(pin, ['[data-test-id="pinTitle"]', '.pinTitle', 'h3', 'h2', '.title', '[aria-label*="product"]'], text);
+        const image = first(pin, ['img'], el => {
+            const src = el.getAttribute('src') || '';
+            return src && !src.startsWith('data:') ? src : '';
+        });
+        let link = pin.matches('a[href*="/pin/"]') ? pin.getAttribute('href') : first(pin, ['a'], el => {
+            const href = el.getAttribute('href') || '';
+            return href.includes('/pin/') ? href : '';
+        });
+        if (link && !link.startsWith('http')) link = 'https://www.pinterest.com' + link;
+        const price = first(pin, ['[data-test-id="price"]', '.price', '.cost'], text);
+        if (!title || !link) continue;
+        const priceValue = parseFloat(price.replace(/[^0-9.]/g, ''));
+        results.push({
+            grid_title: title,
+            link: link,
+            images: {orig: {url: image}},
+            rich_summary: {
+                display_name: title,
+                products: isNaN(priceValue) ? [] : [{offers: [{price_value: priceValue}]}]
+            }
+        });
+    }
+    if (results.length) break;
+}
+return JSON.stringify(results);
+"""
+
+GOOGLE_EXTRACT_JS = """
+const maxResults = arguments[0];
+const first = (root, selectors, read) => {
+    for (const selector of selectors) {
+        for (const el of root.querySelectorAll(selector)) {
+            const value = read(el);
+            if (value) return value;
+        }
+    }
+    return '';
+};
+const textOrLabel = el => (el.textContent || '').trim() || el.getAttribute('aria-label') || '';
+let units = document.querySelectorAll('[data-docid]');
+if (!units.length) units = document.querySelectorAll('.pla-unit-container');
+const products = [];
+for (const unit of units) {
+    if (products.length >= maxResults) break;
+    let url = first(unit, ['a'], el => {
+        const href = el.getAttribute('href') || '';
+        return href.includes('wayfair.com') ? href : '';
+    });
+    if (!url) {
+        const ad = unit.querySelector('a.pla-unit');
+        url = ad ? (ad.getAttribute('adurl') || '') : '';
+    }
+    if (!url) continue;
+    const srcs = Array.from(unit.querySelectorAll('img'), img => img.getAttribute('src') || '');
+    const image = srcs.find(src => src.startsWith('data:image'))
+        || srcs.find(src => src.includes('gstatic.com') && !src.startsWith('data:'))
+        || srcs.find(src => src && !src.startsWith('data:')) || '';
+    const title = first(unit, ['.bXPcId div', '.bXPcId', '[aria-label*="product"]', 'h3', 'h2', '.title', 'span[aria-label]'], textOrLabel);
+    const price = first(unit, ['.VbBaOe', '.dOp6Sc', '[aria-label*="price"]', '.price', '.cost', 'span[aria-label*="price"]'], textOrLabel);
+    if (title) products.push({title: title, price: price, image_url: image, url: url});
+}
+return JSON.stringify(products);
+"""
+
+# Lean profile: the scrapers only need the DOM and image URLs, never the bytes behind them
+BLOCKED_URL_PATTERNS = [
+    # Images and media
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.mp4', '*.webm', '*.m3u8', '*.mp3',
+    '*i.pinimg.com/*', '*v.pinimg.com/*', '*encrypted-tbn*.gstatic.com/*',
+    # Fonts
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    # Third-party analytics and ad scripts
+    '*googletagmanager.com*', '*google-analytics.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*googleadservices.com*', '*connect.facebook.net*', '*ct.pinterest.com*', '*hotjar.com*',
+    '*scorecardresearch.com*', '*bat.bing.com*'
+]
+
+PAGE_STATS_JS = """
+const nav = performance.getEntriesByType('navigation')[0] || {};
+const resources = performance.getEntriesByType('resource');
+return JSON.stringify({
+    requests: resources.length + 1,
+    transfer_bytes: resources.reduce((total, r) => total + (r.transferSize || 0), nav.transferSize || 0),
+    decoded_bytes: resources.reduce((total, r) => total + (r.decodedBodySize || 0), nav.decodedBodySize || 0),
+    dom_content_loaded_ms: Math.round(nav.domContentLoadedEventEnd || 0),
+    load_ms: Math.round(nav.loadEventEnd || 0)
+});
+"""
 
 class SeleniumTrendScraper:
-    def __init__(self, output_dir="scraped_data", headless=True):
+    def __init__(self, output_dir="scraped_data", headless=True, extraction=None, profile=None):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
         self.headless = headless
+        # 'json' extracts product fields inside the page; 'html' ships the raw markup for later parsing
+        self.extraction = extraction or os.getenv('SCRAPER_EXTRACTION', 'json')
+        # 'lean' blocks images, media, fonts and trackers and caps renderer memory; 'full' loads everything
+        self.profile = profile or os.getenv('SCRAPER_PROFILE', 'lean')
+        self.scrape_stats = {}
         self.driver = None
         
     def setup_driver(self):
@@ -50,13 +172,51 @@ class SeleniumTrendScraper:
         # Window size
         chrome_options.add_argument("--window-size=1920,1080")
         
+        if self.profile == 'lean':
+            self.apply_lean_options(chrome_options)
+        
         self.driver = webdriver.Chrome(options=chrome_options)
         
         # Execute script to remove webdriver property
         self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
+        if self.profile == 'lean':
+            # Prefs can't block fonts, stylesheets or scripts by host; the network layer can
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        
         return self.driver
     
+    def apply_lean_options(self, chrome_options):
+        """Skip image/media downloads and cap renderer memory so more browsers fit per core"""
+        memory_mb = int(os.getenv('SCRAPER_RENDERER_MEMORY_MB', '512'))
+        chrome_options.add_experimental_option('prefs', {
+            'profile.managed_default_content_settings.images': 2,
+            'profile.default_content_setting_values.notifications': 2,
+            'profile.default_content_setting_values.media_stream': 2
+        })
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_argument("--autoplay-policy=user-gesture-required")
+        chrome_options.add_argument("--mute-audio")
+        chrome_options.add_argument(f"--js-flags=--max-old-space-size={memory_mb}")
+        chrome_options.add_argument("--renderer-process-limit=2")
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_argument("--disable-background-networking")
+        chrome_options.add_argument("--disable-features=Translate,MediaRouter,OptimizationHints")
+        chrome_options.add_argument("--disk-cache-size=1")
+    
+    def record_page_stats(self, source, started):
+        """Bytes and timings for the current page, from the browser's Performance API"""
+        try:
+            stats = json.loads(self.driver.execute_script(PAGE_STATS_JS))
+        except Exception as e:
+            stats = {'error': str(e)}
+        stats['profile'] = self.profile
+        stats['wall_ms'] = round((time.perf_counter() - started) * 1000)
+        self.scrape_stats[source] = stats
+        log(logger, logging.INFO, "Scrape stats", source=source, **stats)
+        return stats
+    
     def scrape_pinterest(self, search_term, max_results=50):
         """Scrape Pinterest using Selenium"""
         print(f"🔍 Scraping Pinterest for '{search_term}'...")
@@ -70,6 +230,7 @@ class SeleniumTrendScraper:
             url = f"https://www.pinterest.com/search/pins/?q={encoded_term}&rs=typed"
             
             print(f"🔗 Searching Pinterest for: {search_term}")
+            started = time.perf_counter()
             self.driver.get(url)
             
             # Wait longer for page to load
@@ -86,11 +247,15 @@ class SeleniumTrendScraper:
             except TimeoutException:
                 print("ℹ️ No product filter found, continuing with all pins")
             
-            # Print the first 1000 characters of the page source for debugging
+            if self.extraction == 'json':
+                records = self.extract_in_page(PINTEREST_EXTRACT_JS, 'pinterest', max_results)
+                self.record_page_stats('pinterest', started)
+                return records
+            
             page_source = self.driver.page_source
-            print("\n--- PINTEREST PAGE SOURCE (first 1000 chars) ---\n")
-            print(page_source[:1000])
-            print("\n--- END PAGE SOURCE ---\n")
+            self.record_page_stats('pinterest', started)
+            if logger.isEnabledFor(logging.DEBUG):
+                log(logger, logging.DEBUG, "Pinterest page source", head=repr(page_source[:1000]))
             
             # Get the entire page HTML content
             html_content = page_source
@@ -102,6 +267,15 @@ class SeleniumTrendScraper:
             print(f"❌ Error scraping Pinterest: {str(e)}")
             return None
     
+    def extract_in_page(self, script, source, max_results):
+        """Run an extractor inside the page and return its parsed product records"""
+        start = time.perf_counter()
+        payload = self.driver.execute_script(script, max_results)
+        records = json.loads(payload or '[]')
+        log(logger, logging.INFO, "In-page extraction", source=source, products=len(records),
+            payload_bytes=len(payload or ''), duration_ms=round((time.perf_counter() - start) * 1000, 1))
+        return records
+    
     def extract_pinterest_pin(self, pin_element):
         """Extract data from a Pinterest pin element"""
         try:
@@ -126,15 +300,15 @@ class SeleniumTrendScraper:
                 pass
             
             if title and link:
-                return {
-                    'grid_title': title,
-                    'display_name': title,
-                    'images:orig:url': image_url,
-                    'link': link,
-                    'price': price,
-                    'seo_alt_txt': title,
-                    'Source': 'Pinterest'
-                }
+                return Product(
+                    title=title,
+                    display_name=title,
+                    image_url=image_url,
+                    url=link,
+                    price=price,
+                    description=title,
+                    source=PINTEREST
+                )
         except Exception as e:
             print(f"❌ Error in extract_pinterest_pin: {e}")
         
@@ -154,6 +328,7 @@ class SeleniumTrendScraper:
             url = f"https://www.google.com/search?tbm=shop&q={encoded_term}&hl=en"
             
             print(f"🔗 Searching for: {wayfair_search}")
+            started = time.perf_counter()
             self.driver.get(url)
             
             # Wait even longer for page to load
@@ -163,11 +338,15 @@ class SeleniumTrendScraper:
             self.driver.execute_script("window.scrollTo(0, 500);")
             time.sleep(2)
             
-            # Print the first 1000 characters of the page source for debugging
-            page_source = self.driver.page_source
-            print("\n--- GOOGLE PAGE SOURCE (first 1000 chars) ---\n")
-            print(page_source[:1000])
-            print("\n--- END PAGE SOURCE ---\n")
+            if self.extraction == 'json':
+                records = self.extract_in_page(GOOGLE_EXTRACT_JS, 'google', max_results)
+                self.record_page_stats('google', started)
+                return records
+            self.record_page_stats('google', started)
+            
+            # Only pull the full page source over the wire when someone will read it
+            if logger.isEnabledFor(logging.DEBUG):
+                log(logger, logging.DEBUG, "Google page source", head=repr(self.driver.page_source[:1000]))
             
             # Look for the top-pla-group-inner element
             try:
@@ -216,6 +395,7 @@ class SeleniumTrendScraper:
     def save_data(self, search_term, pinterest_data, google_data):
         """Save scraped data to files"""
         try:
+            registry = get_capture_registry(self.output_dir)
             # Save Pinterest data
             if pinterest_data:
                 pinterest_file = os.path.join(self.output_dir, f"{search_term.lower().replace(' ', '_')}_pinterest.html")
@@ -225,6 +405,7 @@ class SeleniumTrendScraper:
                     with open(pinterest_file, 'w', encoding='utf-8') as f:
                         f.write(pinterest_data)
                     print(f"✅ Saved Pinterest HTML data to {pinterest_file}")
+                    registry.record(search_term, 'pinterest', pinterest_file)
                 else:
                     # If it's a list of products, convert to JSON
                     pinterest_json = {
@@ -235,8 +416,9 @@ class SeleniumTrendScraper:
                         }
                     }
                     with open(pinterest_file.replace('.html', '.json'), 'w', encoding='utf-8') as f:
-                        json.dump(pinterest_json, f, indent=2, ensure_ascii=False)
+                        json.dump(pinterest_json, f, indent=2, ensure_ascii=False, default=to_json)
                     print(f"✅ Saved Pinterest JSON data to {pinterest_file.replace('.html', '.json')}")
+                    registry.record(search_term, 'pinterest', pinterest_file.replace('.html', '.json'), products=len(pinterest_data))
             
             # Save Google data
             if google_data:
@@ -247,11 +429,13 @@ class SeleniumTrendScraper:
                     with open(google_file, 'w', encoding='utf-8') as f:
                         f.write(google_data)
                     print(f"✅ Saved Google HTML data to {google_file}")
+                    registry.record(search_term, 'google', google_file)
                 else:
                     # If it's a list of products, convert to JSON
                     with open(google_file.replace('.html', '.json'), 'w', encoding='utf-8') as f:
-                        json.dump(google_data, f, indent=2, ensure_ascii=False)
+                        json.dump(google_data, f, indent=2, ensure_ascii=False, default=to_json)
                     print(f"✅ Saved Google JSON data to {google_file.replace('.html', '.json')}")
+                    registry.record(search_term, 'google', google_file.replace('.html', '.json'), products=len(google_data))
             
             return True
             
@@ -272,10 +456,10 @@ class SeleniumTrendScraper:
         for product in products:
             html += f"""
     <div class="pla-unit-container">
-        <a class="pla-unit" href="{product.get('link', '')}" adurl="{product.get('link', '')}">
-            <img src="{product.get('images:orig:url', '')}" alt="{product.get('grid_title', '')}">
-            <div class="bXPcId" aria-label="{product.get('grid_title', '')}"></div>
-            <div class="dOp6Sc" aria-label="{product.get('price', '')}"></div>
+        <a class="pla-unit" href="{product.url or ''}" adurl="{product.url or ''}">
+            <img src="{product.image_url or ''}" alt="{product.title}">
+            <div class="bXPcId" aria-label="{product.title}"></div>
+            <div class="dOp6Sc" aria-label="{product.price or ''}"></div>
         </a>
     </div>"""
         
@@ -303,6 +487,10 @@ class SeleniumTrendScraper:
             print(f"✅ Scraping complete for '{search_term}'")
             print(f"📊 Pinterest products: {len(pinterest_data) if pinterest_data else 0}")
             print(f"📊 Google products: {len(google_data) if isinstance(google_data, list) else 'HTML content' if google_data else 0}")
+            for source, stats in self.scrape_stats.items():
+                print(f"📶 {source.title()} ({stats['profile']}): {stats.get('transfer_bytes', 0):,} bytes over "
+                      f"{stats.get('requests', 0)} requests, DOM ready {stats.get('dom_content_loaded_ms', 0)} ms, "
+                      f"{stats['wall_ms']} ms total")
             
             # Provide feedback on results
             if not pinterest_data and not google_data:
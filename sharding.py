@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Sharding
+Looks, look images, hero images and landing pages are kept in hash-sharded
+directories (looks/3f/look_20250627_080405.json) rather than one flat
+directory per kind, so no single directory grows past a few thousand entries
+as the number of looks heads into the hundreds of thousands.
+
+Objects are still addressed by file name: the shard is the first two hex
+digits of the name's SHA-1, and anything not migrated yet is found at its
+old flat key, so URLs and look ids don't change. SHARD_LAYOUT=flat keeps
+writing the flat layout.
+
+    python sharding.py status              - Flat and sharded object counts per collection
+    python sharding.py migrate [--dry-run] - Move flat objects into their shards
+"""
+
+import os
+import re
+import sys
+import hashlib
+
+from storage import get_storage
+
+SHARD_LAYOUT = os.getenv('SHARD_LAYOUT', 'hash')
+# Every collection the apps write to, including LookGenerator's looks/data
+COLLECTIONS = ('landing_pages', 'looks', 'looks/data', 'looks/images', 'static/generated_images')
+SHARD_NAME = re.compile(r'^[0-9a-f]{2}$')
+
+
+def shard_of(name):
+    """Two hex digits (256 shards) derived from a file name"""
+    return hashlib.sha1(name.encode('utf-8')).hexdigest()[:2]
+
+
+class ShardedCollection:
+    """Files of one kind under a prefix, stored at <prefix>/<shard>/<name>"""
+
+    def __init__(self, prefix, storage=None, layout=None):
+        self.prefix = prefix.rstrip('/')
+        self.storage = storage or get_storage()
+        self.layout = layout or SHARD_LAYOUT
+
+    def flat_key(self, name):
+        return f"{self.prefix}/{name}"
+
+    def sharded_key(self, name):
+        return f"{self.prefix}/{shard_of(name)}/{name}"
+
+    def key(self, name):
+        """Where a new object with this name is written"""
+        return self.sharded_key(name) if self.layout == 'hash' else self.flat_key(name)
+
+    def find(self, name):
+        """Key of an existing object, sharded or not yet migrated, or None"""
+        if '/' in name or name.startswith('.'):
+            return None
+        for key in dict.fromkeys((self.key(name), self.sharded_key(name), self.flat_key(name))):
+            if self.storage.exists(key):
+                return key
+        return None
+
+    def exists(self, name):
+        return self.find(name) is not None
+
+    def local_path(self, name):
+        key = self.find(name)
+        return self.storage.local_path(key) if key else None
+
+    def read_bytes(self, name):
+        key = self.find(name)
+        if key is None:
+            raise FileNotFoundError(self.flat_key(name))
+        return self.storage.read_bytes(key)
+
+    def read_text(self, name, encoding='utf-8'):
+        return self.read_bytes(name).decode(encoding)
+
+    def write_bytes(self, name, data, content_type=None):
+        """Write under the current layout and drop a copy left at the other key; returns the key"""
+        key = self.key(name)
+        self.storage.write_bytes(key, data, content_type)
+        for stale in (self.sharded_key(name), self.flat_key(name)):
+            if stale != key and self.storage.exists(stale):
+                self.storage.delete(stale)
+        return key
+
+    def write_text(self, name, text, encoding='utf-8'):
+        return self.write_bytes(name, text.encode(encoding))
+
+    def delete(self, name):
+        for key in (self.sharded_key(name), self.flat_key(name)):
+            if self.storage.exists(key):
+                self.storage.delete(key)
+
+    def shards(self):
+        return sorted(name for name in self.storage.list_dirs(self.prefix + '/') if SHARD_NAME.match(name))
+
+    def list(self):
+        """Every object in the collection (flat and sharded), one per name"""
+        objects = {}
+        for obj in self.storage.list(self.prefix + '/'):
+            objects[os.path.basename(obj.key)] = obj
+        for shard in self.shards():
+            for obj in self.storage.list(f"{self.prefix}/{shard}/"):
+                # A sharded copy wins over a flat leftover with the same name
+                objects[os.path.basename(obj.key)] = obj
+        return list(objects.values())
+
+    def signature(self):
+        """Modification times of the collection's directories: any file added, replaced or removed
+        changes it, at the cost of one stat per shard instead of one per file (local storage only)"""
+        root = os.path.join(self.storage.root, self.prefix)
+        signature = []
+        for directory in [root] + [os.path.join(root, shard) for shard in self.shards()]:
+            try:
+                signature.append((directory, os.stat(directory).st_mtime_ns))
+            except OSError:
+                pass
+        return tuple(signature)
+
+    def counts(self):
+        """(flat, sharded) object counts"""
+        flat = len(self.storage.list(self.prefix + '/'))
+        return flat, sum(len(self.storage.list(f"{self.prefix}/{shard}/")) for shard in self.shards())
+
+    def migrate(self, dry_run=False):
+        """Move flat objects to their sharded keys; returns how many were (or would be) moved"""
+        moved = 0
+        for obj in self.storage.list(self.prefix + '/'):
+            name = os.path.basename(obj.key)
+            if self.storage.exists(self.sharded_key(name)):
+                # Already written to its shard since; the flat copy is the stale one
+                if not dry_run:
+                    self.storage.delete(obj.key)
+            elif not dry_run:
+                self.storage.move(obj.key, self.sharded_key(name))
+            moved += 1
+        return moved
+
+
+_collections = {}
+
+
+def get_collection(prefix):
+    """Shared collection per prefix on the configured storage backend"""
+    prefix = prefix.rstrip('/')
+    collection = _collections.get(prefix)
+    if collection is None:
+        collection = _collections[prefix] = ShardedCollection(prefix)
+    return collection
+
+
+def main():
+    """Command line interface for the sharded layout"""
+    if len(sys.argv) < 2 or sys.argv[1] not in ("status", "migrate"):
+        print("Usage:")
+        print("  python sharding.py status              - Flat and sharded object counts per collection")
+        print("  python sharding.py migrate [--dry-run] - Move flat objects into their shards")
+        return
+    dry_run = "--dry-run" in sys.argv[2:]
+    for prefix in COLLECTIONS:
+        collection = ShardedCollection(prefix, layout='hash')
+        if sys.argv[1] == "status":
+            flat, sharded = collection.counts()
+            print(f"📂 {prefix + '/':<26} {flat:>7} flat, {sharded:>7} sharded in {len(collection.shards())} shards")
+        else:
+            moved = collection.migrate(dry_run=dry_run)
+            print(f"{'🔍' if dry_run else '✅'} {prefix + '/':<26} {moved} {'to move' if dry_run else 'moved'}")
+
+if __name__ == "__main__":
+    main()
@@ -8,24 +8,42 @@ import os
 import json
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
-from trend_generator import TrendLandingPageGenerator
+from trend_generator import TrendLandingPageGenerator, cached_card
+from capture_store import get_capture_store
+from warmup import cached_landing_pages, cached_looks
+from storage import get_storage
+from sharding import get_collection
+from product import Product, CSV_HEADER, PINTEREST, interleave
+from overlays import ProductOverlay, OverlayError, product_ids
 import glob
-import requests
-from bs4 import BeautifulSoup
 import re
-import openai
-from openai import OpenAI
-import base64
 import io
+import time
+import metrics
+import profiling
+import offload
+import admission
+from response_cache import cached, invalidate
+from metrics import stage_timer, observe_openai, payload_size
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
+metrics.init_app(app, 'simple_app')
+profiling.init_app(app)
+offload.init_app(app)
+admission.init_app(app, ('generate_hero_image',))
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'json', 'html', 'txt'}
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+storage = get_storage()
+# Hash-sharded collections (sharding.py); lookups are by file name and also find not-yet-migrated flat files
+page_files = get_collection('landing_pages')
+look_files = get_collection('looks')
+look_image_files = get_collection('looks/images')
+hero_image_files = get_collection('static/generated_images')
 os.makedirs('landing_pages', exist_ok=True)
 os.makedirs('looks', exist_ok=True)
 os.makedirs('looks/images', exist_ok=True)
@@ -39,35 +57,74 @@ def allowed_file(filename):
 
 def get_landing_pages():
     """Get list of all landing pages"""
+    # The pre-fork warm-up only covers local files
+    pages = cached_landing_pages() if storage.is_local else None
+    if pages is not None:
+        return pages
     pages = []
-    if os.path.exists('landing_pages'):
-        for file in os.listdir('landing_pages'):
-            if file.endswith('.html'):
-                filepath = os.path.join('landing_pages', file)
-                stat = os.stat(filepath)
-                # Convert filename to display name
-                name = file.replace('.html', '').replace('-', ' ').title()
-                pages.append({
-                    'filename': file,
-                    'name': name,
-                    'size': stat.st_size,
-                    'modified': datetime.fromtimestamp(stat.st_mtime),
-                    'url': f'/view/{file}'
-                })
+    for obj in page_files.list():
+        file = os.path.basename(obj.key)
+        if file.endswith('.html'):
+            # Convert filename to display name
+            name = file.replace('.html', '').replace('-', ' ').title()
+            pages.append({
+                'filename': file,
+                'name': name,
+                'size': obj.size,
+                'modified': obj.modified,
+                'url': f'/view/{file}'
+            })
     return sorted(pages, key=lambda x: x['modified'], reverse=True)
 
 def get_looks():
     """Get list of all generated looks"""
     looks = []
-    looks_file = os.path.join('looks', 'looks.json')
-    if os.path.exists(looks_file):
+    if look_files.exists('looks.json'):
         try:
-            with open(looks_file, 'r', encoding='utf-8') as f:
-                looks = json.load(f)
+            looks = json.loads(look_files.read_text('looks.json'))
         except:
             looks = []
     return looks
 
+def capture_path(path):
+    """A capture on local disk, or this instance's cached copy of one uploaded through another instance"""
+    if storage.is_local or get_capture_store().exists(path):
+        return path
+    return storage.local_path(path) or path
+
+def share_capture(path):
+    """Copy a freshly written capture to shared storage for other instances, then compress it into the capture store"""
+    if not storage.is_local:
+        with open(path, 'rb') as f:
+            storage.write_bytes(path, f.read())
+    get_capture_store().ingest(path)
+
+def save_upload(file, path):
+    file.save(path)
+    share_capture(path)
+
+def page_products(filename):
+    """Search term, parsed products, the page's catalog order, saved overlay and [(id, product)] with the overlay applied"""
+    search_term = filename.replace('.html', '').replace('-', ' ')
+    base = search_term.lower().replace(' ', '_')
+    pinterest_file = os.path.join('uploads', f"{base}_pinterest.json")
+    google_file = os.path.join('uploads', f"{base}_google.html")
+    
+    generator = TrendLandingPageGenerator()
+    products = generator.get_product_data(search_term, capture_path(pinterest_file), capture_path(google_file))
+    slug = generator.generate_slug(search_term)
+    # Same seeded order as the static landing page, so edits line up with what the page shows
+    catalog = interleave(slug, [product for product in products if product.source == PINTEREST],
+                         [product for product in products if product.source != PINTEREST])
+    overlay = ProductOverlay.load(slug)
+    items = overlay.apply(catalog) if not overlay.is_empty() else list(zip(product_ids(catalog), catalog))
+    return search_term, products, catalog, overlay, items
+
+def render_card(product_id, product):
+    """The edit page's card for a product, through the shared fragment cache so only changed cards render again"""
+    key = ('edit', product_id) + tuple(getattr(product, name) for name in Product.__slots__)
+    return cached_card(key, lambda: render_template('_product_card.html', product_id=product_id, product=product))
+
 @app.context_processor
 def inject_now():
     return {
@@ -76,6 +133,7 @@ def inject_now():
     }
 
 @app.route('/')
+@cached('pages')
 def home():
     """Home page showing all landing pages"""
     pages = get_landing_pages()
@@ -104,18 +162,19 @@ def upload_and_generate():
             if file.filename.endswith('.json') or file.filename.endswith('.html'):
                 pinterest_filename = f"{search_term.lower().replace(' ', '_')}_pinterest{os.path.splitext(file.filename)[1]}"
                 pinterest_file = os.path.join('uploads', pinterest_filename)
-                file.save(pinterest_file)
+                save_upload(file, pinterest_file)
         
         if 'google_file' in request.files and request.files['google_file'].filename:
             file = request.files['google_file']
             if file.filename.endswith('.html'):
                 google_filename = f"{search_term.lower().replace(' ', '_')}_google.html"
                 google_file = os.path.join('uploads', google_filename)
-                file.save(google_file)
+                save_upload(file, google_file)
         
         # Generate landing page
         generator = TrendLandingPageGenerator()
         result = generator.create_landing_page(search_term, pinterest_file, google_file)
+        invalidate('pages', f"page:{generator.generate_slug(search_term)}.html")
         
         if result:
             flash(f'Successfully created landing page for "{search_term}"!', 'success')
@@ -131,45 +190,30 @@ def upload_and_generate():
 @app.route('/view/<filename>')
 def view_page(filename):
     """View a specific landing page"""
-    filepath = os.path.join('landing_pages', filename)
-    if os.path.exists(filepath):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
+    key = page_files.find(filename)
+    if key:
+        with stage_timer('read_landing_page'):
+            content = storage.read_text(key)
         return content
     else:
         flash('Page not found!', 'error')
         return redirect(url_for('home'))
 
 @app.route('/view_with_looks/<filename>')
+@cached('page:{filename}')
 def view_with_looks(filename):
     """View a landing page with product selection for creating looks"""
     try:
-        # Extract search term from filename
-        search_term = filename.replace('.html', '').replace('-', ' ')
-        
-        # Find corresponding data files
-        pinterest_file = os.path.join('uploads', f"{search_term.lower().replace(' ', '_')}_pinterest.json")
-        google_file = os.path.join('uploads', f"{search_term.lower().replace(' ', '_')}_google.html")
+        # Parsed products with any saved edits applied
+        search_term, products, catalog, overlay, items = page_products(filename)
         
-        # Generate the product data
-        generator = TrendLandingPageGenerator()
-        products = generator.get_product_data(search_term, pinterest_file, google_file)
-        
-        if not products:
+        if not items:
             flash('No product data found!', 'error')
             return redirect(url_for('home'))
         
-        # Add source logos to products
-        for product in products:
-            if product.get('source') == 'Pinterest':
-                product['source_logo'] = 'https://1000logos.net/wp-content/uploads/2018/03/Pinterest-Logo-2011-2016.png'
-            elif product.get('source') == 'Google':
-                product['source_logo'] = 'https://www.google.com/images/branding/googlelogo/1x/googlelogo_color_272x92dp.png'
-            else:
-                product['source_logo'] = 'https://via.placeholder.com/30x30/cccccc/666666?text=?'
-        
         return render_template('view_with_looks.html', 
-                             products=products, 
+                             cards=[render_card(product_id, product) for product_id, product in items],
+                             products_data=[product.as_dict() for _, product in items],
                              page_title=search_term.title())
         
     except Exception as e:
@@ -179,9 +223,9 @@ def view_with_looks(filename):
 @app.route('/download/<filename>')
 def download_page(filename):
     """Download a landing page HTML file"""
-    filepath = os.path.join('landing_pages', filename)
-    if os.path.exists(filepath):
-        return send_file(filepath, as_attachment=True)
+    filepath = page_files.local_path(filename)
+    if filepath:
+        return offload.send_stored_file(filepath, as_attachment=True)
     else:
         flash('File not found!', 'error')
         return redirect(url_for('home'))
@@ -190,16 +234,9 @@ def download_page(filename):
 def download_csv(filename):
     """Download product data as CSV"""
     try:
-        # Extract search term from filename
-        search_term = filename.replace('.html', '').replace('-', ' ')
-        
-        # Find corresponding data files
-        pinterest_file = os.path.join('uploads', f"{search_term.lower().replace(' ', '_')}_pinterest.json")
-        google_file = os.path.join('uploads', f"{search_term.lower().replace(' ', '_')}_google.html")
-        
-        # Generate the product data
-        generator = TrendLandingPageGenerator()
-        products = generator.get_product_data(search_term, pinterest_file, google_file)
+        # The page's products in page order, with its product edits applied
+        search_term, _, _, _, items = page_products(filename)
+        products = [product for _, product in items]
         
         if not products:
             flash('No product data found!', 'error')
@@ -213,18 +250,10 @@ def download_csv(filename):
         writer = csv.writer(output)
         
         # Write header
-        writer.writerow(['Title', 'Price', 'Image URL', 'Product URL', 'Source', 'Description'])
+        writer.writerow(CSV_HEADER)
         
         # Write product data
-        for product in products:
-            writer.writerow([
-                product.get('title', ''),
-                product.get('price', ''),
-                product.get('image_url', ''),
-                product.get('url', ''),
-                product.get('source', ''),
-                product.get('description', '')
-            ])
+        writer.writerows(product.csv_row() for product in products)
         
         output.seek(0)
         csv_content = output.getvalue()
@@ -243,9 +272,9 @@ def download_csv(filename):
 @app.route('/delete/<filename>')
 def delete_page(filename):
     """Delete a landing page"""
-    filepath = os.path.join('landing_pages', filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
+    if page_files.exists(filename):
+        page_files.delete(filename)
+        invalidate('pages', f'page:{filename}')
         flash(f'Successfully deleted {filename}', 'success')
     else:
         flash('File not found!', 'error')
@@ -254,36 +283,93 @@ def delete_page(filename):
 @app.route('/api/pages')
 def api_pages():
     """API endpoint to get all pages (for AJAX)"""
-    pages = get_landing_pages()
+    # The warm index holds read-only mappings; jsonify needs plain dicts
+    pages = [dict(page) for page in get_landing_pages()]
     return jsonify(pages)
 
 @app.route('/edit/<filename>')
 def edit_page(filename):
     """Edit an existing landing page"""
     try:
-        # Load existing data
-        pinterest_file = f'uploads/{filename.replace(".html", "_pinterest.json")}'
-        google_file = f'uploads/{filename.replace(".html", "_google.html")}'
-        
-        pinterest_data = ""
-        google_data = ""
-        
-        if os.path.exists(pinterest_file):
-            with open(pinterest_file, 'r', encoding='utf-8') as f:
-                pinterest_data = f.read()
-        
-        if os.path.exists(google_file):
-            with open(google_file, 'r', encoding='utf-8') as f:
-                google_data = f.read()
+        # Products are edited through the patch API; the raw captures are only named, not loaded
+        search_term, products, catalog, overlay, items = page_products(filename)
+        base = search_term.lower().replace(' ', '_')
+        store = get_capture_store()
+        pinterest_file = f"{base}_pinterest.json" if store.exists(f"uploads/{base}_pinterest.json") else None
+        google_file = f"{base}_google.html" if store.exists(f"uploads/{base}_google.html") else None
         
         return render_template('edit.html', 
                              filename=filename,
-                             pinterest_data=pinterest_data,
-                             google_data=google_data)
+                             search_term=search_term,
+                             pinterest_file=pinterest_file,
+                             google_file=google_file,
+                             products=items,
+                             overlay_version=overlay.version)
     except Exception as e:
         flash(f'Error loading edit page: {str(e)}', 'error')
         return redirect(url_for('home'))
 
+def product_payload(product_id, product, overlay):
+    payload = product.as_dict()
+    payload['id'] = product_id
+    payload['edited'] = product_id in overlay.overrides or product_id.startswith('added-')
+    return payload
+
+@app.route('/api/pages/<filename>/products', methods=['GET', 'PATCH'])
+def page_products_api(filename):
+    """List a page's products, or apply product edits: {"ops": [...], "version": n}"""
+    search_term, products, catalog, overlay, items = page_products(filename)
+    if not products and overlay.is_empty():
+        return jsonify({'error': 'No product data found'}), 404
+    
+    if request.method == 'GET':
+        return jsonify({
+            'page': filename,
+            'version': overlay.version,
+            'products': [product_payload(product_id, product, overlay) for product_id, product in items]
+        })
+    
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected {"ops": [...], "version": n}'}), 400
+    ops = body.get('ops')
+    version = body.get('version')
+    if not isinstance(ops, list) or not ops or not isinstance(version, int) or isinstance(version, bool):
+        return jsonify({'error': 'Expected {"ops": [...], "version": n}'}), 400
+    
+    # Reload under the overlay's lock: a concurrent edit in another worker either lands first (409) or waits
+    with ProductOverlay.locked(overlay.slug) as overlay:
+        if version != overlay.version:
+            return jsonify({'error': 'Page was edited elsewhere; reload', 'version': overlay.version}), 409
+        try:
+            changed = overlay.patch(ops, product_ids(catalog))
+        except OverlayError as e:
+            return jsonify({'error': str(e)}), 400
+        overlay.save()
+        invalidate(f'page:{filename}')
+        
+        # Rewrite the static page; unchanged cards come from the generator's fragment cache
+        generator = TrendLandingPageGenerator()
+        if page_files.exists(filename):
+            with stage_timer('patch_landing_page'):
+                generator.write_landing_page(search_term,
+                                             [product for product in products if product.source == PINTEREST],
+                                             [product for product in products if product.source != PINTEREST])
+            invalidate('pages')
+    
+    items = overlay.apply(catalog)
+    by_id = dict(items)
+    return jsonify({
+        'page': filename,
+        'version': overlay.version,
+        'order': [product_id for product_id, _ in items],
+        'changed': changed,
+        'removed': [product_id for product_id in changed if product_id not in by_id],
+        'products': {product_id: product_payload(product_id, by_id[product_id], overlay)
+                     for product_id in changed if product_id in by_id},
+        'cards': {product_id: render_card(product_id, by_id[product_id]) for product_id in changed if product_id in by_id}
+    })
+
 @app.route('/update/<filename>', methods=['POST'])
 def update_page(filename):
     """Update an existing landing page"""
@@ -301,14 +387,17 @@ def update_page(filename):
         if pinterest_data.strip():
             with open(pinterest_file, 'w', encoding='utf-8') as f:
                 f.write(pinterest_data)
+            share_capture(pinterest_file)
         
         if google_data.strip():
             with open(google_file, 'w', encoding='utf-8') as f:
                 f.write(google_data)
+            share_capture(google_file)
         
         # Generate the landing page using the correct method
         generator = TrendLandingPageGenerator()
         result = generator.create_landing_page(search_term, pinterest_file, google_file)
+        invalidate('pages', f'page:{filename}')
         
         if result:
             flash(f'Landing page "{filename}" updated successfully!', 'success')
@@ -322,18 +411,18 @@ def update_page(filename):
         return redirect(url_for('edit_page', filename=filename))
 
 @app.route('/looks')
+@cached('looks')
 def looks_gallery():
     """Show all generated looks"""
     try:
+        looks = cached_looks() if storage.is_local else None
+        if looks is not None:
+            return render_template('looks_gallery.html', looks=looks)
         looks = []
-        looks_dir = 'looks'
-        if os.path.exists(looks_dir):
-            for filename in os.listdir(looks_dir):
-                if filename.endswith('.json'):
-                    look_file = os.path.join(looks_dir, filename)
-                    with open(look_file, 'r') as f:
-                        look_data = json.load(f)
-                        looks.append(look_data)
+        with stage_timer('load_looks'):
+            for obj in look_files.list():
+                if obj.key.endswith('.json'):
+                    looks.append(json.loads(storage.read_text(obj.key)))
         
         # Sort by creation date (newest first)
         looks.sort(key=lambda x: x.get('created_at', ''), reverse=True)
@@ -343,13 +432,13 @@ def looks_gallery():
         return render_template('looks_gallery.html', looks=[])
 
 @app.route('/view_look/<look_id>')
+@cached('look:{look_id}')
 def view_look(look_id):
     """View a specific look"""
     try:
-        look_file = f'looks/{look_id}.json'
-        if os.path.exists(look_file):
-            with open(look_file, 'r') as f:
-                look_data = json.load(f)
+        look_file = look_files.find(f'{look_id}.json')
+        if look_file:
+            look_data = json.loads(storage.read_text(look_file))
             return render_template('view_look.html', look=look_data)
         else:
             flash('Look not found', 'error')
@@ -397,10 +486,8 @@ def generate_look():
         }
         
         # Save look
-        os.makedirs('looks', exist_ok=True)
-        look_file = f'looks/{look_id}.json'
-        with open(look_file, 'w') as f:
-            json.dump(look_data, f, indent=2)
+        look_files.write_text(f'{look_id}.json', json.dumps(look_data, indent=2))
+        invalidate('looks', f'look:{look_id}')
         
         if request.is_json:
             return jsonify({
@@ -423,9 +510,18 @@ def generate_look():
 @app.route('/looks/images/<filename>')
 def serve_look_image(filename):
     """Serve look images"""
-    image_path = os.path.join('looks', 'images', filename)
-    if os.path.exists(image_path):
-        return send_file(image_path)
+    image_path = look_image_files.local_path(filename)
+    if image_path:
+        return offload.send_stored_file(image_path, max_age=offload.IMAGE_MAX_AGE)
+    else:
+        return 'Image not found', 404
+
+@app.route('/static/generated_images/<filename>')
+def serve_generated_image(filename):
+    """Serve hero images from storage (takes precedence over the generic static route)"""
+    image_path = hero_image_files.local_path(filename)
+    if image_path:
+        return offload.send_stored_file(image_path, max_age=offload.IMAGE_MAX_AGE)
     else:
         return 'Image not found', 404
 
@@ -436,6 +532,7 @@ def auto_scrape():
     return redirect(url_for('home'))
 
 def encode_image(file_path):
+    import base64
     with open(file_path, "rb") as f:
         base64_image = base64.b64encode(f.read()).decode("utf-8")
     return base64_image
@@ -443,6 +540,10 @@ def encode_image(file_path):
 @app.route('/generate_hero_image', methods=['POST'])
 def generate_hero_image():
     """Generate a hero image using ChatGPT's image generation API."""
+    # Heavy client libraries are only needed here, so keep them off the startup path
+    import base64
+    from openai import OpenAI
+    from look_generator import fetch_reference_image
     try:
         print("🔍 Starting hero image generation...")
         data = request.get_json()
@@ -453,17 +554,16 @@ def generate_hero_image():
         if not look_id or len(products) < 3:
             return jsonify({"success": False, "error": "Need look ID and at least 3 products"})
         # Load look data
-        look_file = os.path.join("looks", f"{look_id}.json")
-        if not os.path.exists(look_file):
+        if not look_files.exists(f"{look_id}.json"):
             return jsonify({"success": False, "error": "Look file not found"})
-        with open(look_file, "r") as f:
-            look = json.load(f)
+        look = json.loads(look_files.read_text(f"{look_id}.json"))
         # Initialize OpenAI client
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             return jsonify({"success": False, "error": "OpenAI API key not configured. Please set OPENAI_API_KEY environment variable."})
         print("🔑 OpenAI API key found")
-        client = OpenAI(api_key=api_key)
+        # OPENAI_BASE_URL points the client at a proxy or at the local emulator (openai_emulator.py)
+        client = OpenAI(api_key=api_key, base_url=os.getenv("OPENAI_BASE_URL"))
         # Build prompt text
         product_titles = [p["title"] for p in products[:3]]
         prompt = "Create a beautiful, lifestyle shoppable scene that showcases these 3 products together in a cohesive, stylish look. The image should be square (1:1 aspect ratio) with professional photography styling.\n"
@@ -474,34 +574,37 @@ def generate_hero_image():
         # Add input_image entries
         for prod in products[:3]:
             try:
-                resp = requests.get(prod["image_url"], timeout=10)
-                if resp.status_code == 200:
-                    img_b64 = base64.b64encode(resp.content).decode("utf-8")
+                image_bytes = fetch_reference_image(prod["image_url"], timeout=10)
+                if image_bytes is not None:
+                    img_b64 = base64.b64encode(image_bytes).decode("utf-8")
                     contents.append({"type": "input_image", "image_url": f"data:image/jpeg;base64,{img_b64}"})
                 else:
                     print(f"❌ Failed to fetch image: {prod['image_url']}")
             except Exception as e:
                 print(f"❌ Error fetching image: {e}")
         print("🎨 Calling ChatGPT image generation API...")
+        openai_start = time.perf_counter()
         response = client.responses.create(
             model="gpt-4.1",
             input=[{"role": "user", "content": contents}],
             tools=[{"type": "image_generation"}]
         )
+        openai_seconds = time.perf_counter() - openai_start
         # Parse image generation output
         image_calls = [o for o in response.output if o.type == "image_generation_call"]
+        observe_openai('generate_hero_image', openai_seconds,
+                       request_bytes=payload_size(contents),
+                       response_bytes=sum(len(call.result or '') for call in image_calls))
         if not image_calls:
             return jsonify({"success": False, "error": "No image generated"})
         img_b64 = image_calls[0].result
         # Save generated image
-        os.makedirs("static/generated_images", exist_ok=True)
         filename = f"hero_{look_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-        save_path = os.path.join("static/generated_images", filename)
-        with open(save_path, "wb") as imgf:
-            imgf.write(base64.b64decode(img_b64))
+        with stage_timer('write_hero_image'):
+            hero_image_files.write_bytes(filename, base64.b64decode(img_b64))
         look['image_url'] = f"/static/generated_images/{filename}"
-        with open(look_file, "w") as f:
-            json.dump(look, f, indent=2)
+        look_files.write_text(f"{look_id}.json", json.dumps(look, indent=2))
+        invalidate('looks', f'look:{look_id}')
         return jsonify({"success": True, "image_url": look['image_url'], "message": "Hero image generated successfully!"})
     except Exception as e:
         print(f"❌ Error generating hero image: {e}")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Singleflight
+Coalesces concurrent calls for the same key into one computation, within a
+process and across gunicorn workers.
+
+In a process, the first caller for a key runs the function and later callers
+block on its result. Across processes the leader holds an flock on a per-key
+lock file; callers in other workers that find it locked leave a marker, wait
+for the lock, and pick up the result the leader pickled next to it instead
+of recomputing. Results are unpickled, so they live in a directory only the
+app's user can write (cache/singleflight under the app directory by default).
+Nothing is cached beyond that: a result is only reused by callers that were
+already waiting when it was produced.
+
+Leaders sweep the directory at most once per SINGLEFLIGHT_TIMEOUT: results,
+markers and temp files untouched for twice that long are removed, and so are
+lock files no one holds. A caller that locked a swept lock file notices it's
+no longer linked and starts over on the new one.
+"""
+
+import os
+import time
+import fcntl
+import pickle
+import hashlib
+import tempfile
+import threading
+
+from metrics import record_cache
+from storage import private_dir
+
+SINGLEFLIGHT_DIR = os.getenv('SINGLEFLIGHT_DIR', os.path.join('cache', 'singleflight'))
+SINGLEFLIGHT_TIMEOUT = float(os.getenv('SINGLEFLIGHT_TIMEOUT', '60'))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name, lock_dir=None, timeout=None):
+        self.name = name
+        self.base_dir = os.path.abspath(lock_dir or SINGLEFLIGHT_DIR)
+        self.lock_dir = os.path.join(self.base_dir, name)
+        self.timeout = timeout if timeout is not None else SINGLEFLIGHT_TIMEOUT
+        self._calls = {}
+        self._mutex = threading.Lock()
+        self._swept = 0.0
+
+    def do(self, key, fn):
+        """fn() for this key, shared with every concurrent caller of the same key"""
+        with self._mutex:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            record_cache(f"singleflight_{self.name}", True)
+            if not call.done.wait(self.timeout):
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._across_processes(key, fn)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._mutex:
+                del self._calls[key]
+            call.done.set()
+
+    def _paths(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        base = os.path.join(self.lock_dir, digest)
+        return base + '.lock', base + '.waiting', base + '.result'
+
+    def _across_processes(self, key, fn):
+        lock_path, waiting_path, result_path = self._paths(key)
+        private_dir(self.base_dir)
+        private_dir(self.lock_dir)
+        self._sweep()
+        started = time.time()
+        while True:
+            with open(lock_path, 'w') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another worker is computing this key: say we're waiting, then take its result
+                    open(waiting_path, 'w').close()
+                    deadline = time.monotonic() + self.timeout
+                    while True:
+                        try:
+                            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                            break
+                        except BlockingIOError:
+                            if time.monotonic() >= deadline:
+                                return fn()
+                            time.sleep(0.005)
+                    shared = self._read_result(result_path, key, started)
+                    if shared is not None:
+                        record_cache(f"singleflight_{self.name}", True)
+                        return shared[0]
+                if not self._linked(lock, lock_path):
+                    continue
+
+                record_cache(f"singleflight_{self.name}", False)
+                value = fn()
+                # Only pay for pickling when another worker is actually waiting
+                if os.path.exists(waiting_path):
+                    self._write_result(result_path, key, value)
+                    os.remove(waiting_path)
+                return value
+
+    def _linked(self, lock, lock_path):
+        """Whether the file we locked is still the one at lock_path, i.e. it wasn't swept while we waited"""
+        try:
+            return os.fstat(lock.fileno()).st_ino == os.stat(lock_path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _sweep(self):
+        """Remove files for keys no one has used in 2 x timeout; a lock file only while we hold its lock"""
+        now = time.time()
+        if now - self._swept < self.timeout:
+            return
+        self._swept = now
+        for entry in os.scandir(self.lock_dir):
+            try:
+                if now - entry.stat().st_mtime < 2 * self.timeout:
+                    continue
+                if entry.name.endswith('.lock'):
+                    with open(entry.path, 'a') as lock:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        os.remove(entry.path)
+                else:
+                    os.remove(entry.path)
+            except OSError:
+                # Held by a leader, or already removed by another worker's sweep
+                continue
+
+    def _read_result(self, result_path, key, started):
+        """(value,) if the result file holds this key and was produced after we started waiting"""
+        try:
+            with open(result_path, 'rb') as f:
+                finished_at, stored_key, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if stored_key != key or finished_at < started:
+            return None
+        return (value,)
+
+    def _write_result(self, result_path, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.lock_dir, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time(), key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, result_path)
+
+
+_flights = {}
+_flights_mutex = threading.Lock()
+
+
+def get_singleflight(name):
+    """Shared SingleFlight per name"""
+    with _flights_mutex:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name)
+        return flight
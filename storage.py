@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Storage
+Where landing pages, looks and generated images live. Keys are the paths the
+app has always used ("landing_pages/storage-hacks.html", "looks/<id>.json",
+"static/generated_images/<file>.jpg"), so the local backend reads and writes
+exactly the same files as before.
+
+STORAGE_BACKEND=s3 keeps them in an S3-compatible bucket instead (AWS, MinIO,
+R2...), so several app instances behind a load balancer see the same data.
+Reads go through a local read-through cache: a cached object is served from
+disk and only revalidated against the bucket (HEAD + ETag) once it is older
+than STORAGE_CACHE_TTL seconds, so hot pages and images still come off local
+disk. boto3 is only needed for the S3 backend.
+
+    python storage.py --check   - Write, read, list and delete a test object on the configured backend
+"""
+
+import os
+import sys
+import json
+import stat
+import time
+import shutil
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+StoredObject = namedtuple('StoredObject', ['key', 'size', 'modified'])
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.json': 'application/json',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp'
+}
+
+
+def content_type_for(key):
+    return CONTENT_TYPES.get(os.path.splitext(key)[1].lower(), 'application/octet-stream')
+
+
+def private_dir(path):
+    """Create path as a directory only this user can use, and refuse one someone else owns or can write to.
+    For directories the workers load data back from, so another local user can't plant files in them"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise RuntimeError(f"{path} must be a directory owned by the app's user and not writable by others")
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+class LocalStorage:
+    """Plain files under a root directory (the app directory by default)"""
+
+    is_local = True
+
+    def __init__(self, root='.'):
+        self.root = root
+
+    def local_path(self, key):
+        """Path on disk for a key, or None if it doesn't exist"""
+        path = os.path.join(self.root, key)
+        return path if os.path.isfile(path) else None
+
+    def exists(self, key):
+        return self.local_path(key) is not None
+
+    def read_bytes(self, key):
+        with open(os.path.join(self.root, key), 'rb') as f:
+            return f.read()
+
+    def read_text(self, key, encoding='utf-8'):
+        return self.read_bytes(key).decode(encoding)
+
+    def write_bytes(self, key, data, content_type=None):
+        _write_atomic(os.path.join(self.root, key), data)
+
+    def write_text(self, key, text, encoding='utf-8'):
+        self.write_bytes(key, text.encode(encoding), content_type_for(key))
+
+    def delete(self, key):
+        path = os.path.join(self.root, key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def move(self, key, new_key):
+        new_path = os.path.join(self.root, new_key)
+        os.makedirs(os.path.dirname(new_path) or '.', exist_ok=True)
+        os.replace(os.path.join(self.root, key), new_path)
+
+    def list(self, prefix):
+        """Objects directly under a prefix such as 'landing_pages/'"""
+        directory = os.path.join(self.root, prefix)
+        if not os.path.isdir(directory):
+            return []
+        objects = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    objects.append(StoredObject(prefix + entry.name, stat.st_size, datetime.fromtimestamp(stat.st_mtime)))
+        return objects
+
+    def list_dirs(self, prefix):
+        """Names of the subdirectories directly under a prefix"""
+        directory = os.path.join(self.root, prefix)
+        if not os.path.isdir(directory):
+            return []
+        with os.scandir(directory) as it:
+            return [entry.name for entry in it if entry.is_dir() and not entry.name.startswith('.')]
+
+
+class ReadThroughCache:
+    """Local copies of remote objects, each with a sidecar recording its ETag and when it was last checked"""
+
+    def __init__(self, cache_dir, ttl):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _meta_path(self, key):
+        directory, name = os.path.split(self.path(key))
+        return os.path.join(directory, f".{name}.meta")
+
+    def lookup(self, key):
+        """(path, etag, fresh) for a cached object, or None"""
+        try:
+            with open(self._meta_path(key), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(self.path(key)):
+            return None
+        return self.path(key), meta['etag'], time.time() - meta['checked_at'] < self.ttl
+
+    def store(self, key, data, etag):
+        _write_atomic(self.path(key), data)
+        self.touch(key, etag)
+
+    def touch(self, key, etag):
+        _write_atomic(self._meta_path(key), json.dumps({'etag': etag, 'checked_at': time.time()}).encode('utf-8'))
+
+    def evict(self, key):
+        for path in (self.path(key), self._meta_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket, read through a local disk cache"""
+
+    is_local = False
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, cache_dir=None, cache_ttl=30.0):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.cache = ReadThroughCache(cache_dir or os.path.join(tempfile.gettempdir(), 'trendscraper-storage'), cache_ttl)
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def _record_cache(self, hit):
+        from metrics import record_cache
+        record_cache('storage', hit)
+
+    def local_path(self, key):
+        """Path of an up-to-date local copy, downloading or revalidating as needed; None if the object doesn't exist"""
+        cached = self.cache.lookup(key)
+        if cached and cached[2]:
+            self._record_cache(True)
+            return cached[0]
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                self.cache.evict(key)
+                return None
+            raise
+        if cached and cached[1] == head['ETag']:
+            self.cache.touch(key, head['ETag'])
+            self._record_cache(True)
+            return cached[0]
+        self._record_cache(False)
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        self.cache.store(key, response['Body'].read(), response['ETag'])
+        return self.cache.path(key)
+
+    def exists(self, key):
+        return self.local_path(key) is not None
+
+    def read_bytes(self, key):
+        path = self.local_path(key)
+        if path is None:
+            raise FileNotFoundError(key)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def read_text(self, key, encoding='utf-8'):
+        return self.read_bytes(key).decode(encoding)
+
+    def write_bytes(self, key, data, content_type=None):
+        response = self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data,
+                                          ContentType=content_type or content_type_for(key))
+        # Write-through, so the instance that wrote an object serves it without a round trip
+        self.cache.store(key, data, response['ETag'])
+
+    def write_text(self, key, text, encoding='utf-8'):
+        self.write_bytes(key, text.encode(encoding), content_type_for(key))
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        self.cache.evict(key)
+
+    def move(self, key, new_key):
+        self.client.copy_object(Bucket=self.bucket, Key=self._key(new_key),
+                                CopySource={'Bucket': self.bucket, 'Key': self._key(key)})
+        self.delete(key)
+
+    def list(self, prefix):
+        objects = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix), Delimiter='/'):
+            for item in page.get('Contents', []):
+                key = item['Key'][len(self.prefix):]
+                if not os.path.basename(key).startswith('.'):
+                    objects.append(StoredObject(key, item['Size'], item['LastModified'].replace(tzinfo=None)))
+        return objects
+
+    def list_dirs(self, prefix):
+        names = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix), Delimiter='/'):
+            for common in page.get('CommonPrefixes', []):
+                names.append(common['Prefix'][len(self._key(prefix)):].rstrip('/'))
+        return names
+
+
+_storage = None
+
+
+def get_storage():
+    """The configured backend: STORAGE_BACKEND=local (default) or s3"""
+    global _storage
+    if _storage is None:
+        if os.getenv('STORAGE_BACKEND', 'local') == 's3':
+            _storage = S3Storage(
+                bucket=os.environ['STORAGE_S3_BUCKET'],
+                prefix=os.getenv('STORAGE_S3_PREFIX', ''),
+                endpoint_url=os.getenv('STORAGE_S3_ENDPOINT') or None,
+                cache_dir=os.getenv('STORAGE_CACHE_DIR'),
+                cache_ttl=float(os.getenv('STORAGE_CACHE_TTL', '30'))
+            )
+        else:
+            _storage = LocalStorage(os.getenv('STORAGE_ROOT', '.'))
+    return _storage
+
+
+def check():
+    """Round-trip a test object through the configured backend and its cache"""
+    storage = get_storage()
+    key = f"storage_check/{os.getpid()}-{int(time.time())}.json"
+    payload = json.dumps({'checked_at': datetime.now().isoformat()}).encode('utf-8')
+    failures = []
+
+    storage.write_bytes(key, payload)
+    if storage.read_bytes(key) != payload:
+        failures.append("read after write returned different bytes")
+    if key not in [obj.key for obj in storage.list('storage_check/')]:
+        failures.append("written object missing from list()")
+    if not storage.is_local:
+        # Drop the write-through copy so the next read has to come from the bucket
+        storage.cache.evict(key)
+        if storage.read_bytes(key) != payload:
+            failures.append("read from the bucket returned different bytes")
+    storage.delete(key)
+    if storage.is_local:
+        shutil.rmtree(os.path.join(storage.root, 'storage_check'), ignore_errors=True)
+    elif storage.cache.lookup(key):
+        failures.append("deleted object still cached")
+    if storage.exists(key):
+        failures.append("deleted object still exists")
+
+    backend = 'local' if storage.is_local else f"s3://{storage.bucket}/{storage.prefix}"
+    print("=" * 50)
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print(f"✅ Storage round trip OK ({backend})")
+
+
+def main():
+    """Command line interface for the storage backends"""
+    if len(sys.argv) > 1 and sys.argv[1] == "--check":
+        check()
+    else:
+        print("Usage:")
+        print("  python storage.py --check  - Write, read, list and delete a test object on the configured backend")
+
+if __name__ == "__main__":
+    main()
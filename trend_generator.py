@@ -7,10 +7,53 @@ This script creates landing pages for any search term using existing data files.
 import os
 import json
 import urllib.parse
-import random
-from bs4 import BeautifulSoup
 from datetime import datetime
 import re
+from collections import OrderedDict
+from capture_store import capture_exists, capture_signature, open_capture
+from metrics import timed_stage, stage_timer, record_cache
+from warmup import cached_products
+from product import Product, PINTEREST, GOOGLE, to_json, interleave
+from logs import get_logger, StageSummary
+from overlays import apply_overlay
+from sharding import get_collection
+from singleflight import get_singleflight
+
+logger = get_logger('parser')
+
+# Rendered product cards, shared by the landing page generator and the edit page's card API
+CARD_CACHE_SIZE = int(os.getenv('CARD_CACHE_SIZE', '20000'))
+_card_cache = OrderedDict()
+
+
+def cached_card(key, render):
+    """A card's HTML from the per-process fragment LRU, or render() on a miss; key must cover everything the card shows"""
+    html = _card_cache.get(key)
+    record_cache('product_card', html is not None)
+    if html is None:
+        html = render()
+        _card_cache[key] = html
+        if len(_card_cache) > CARD_CACHE_SIZE:
+            _card_cache.popitem(last=False)
+    else:
+        _card_cache.move_to_end(key)
+    return html
+
+
+def resolve_capture_path(file):
+    """Find a capture as given or under uploads/; a Google .html name also matches its in-page extracted .json"""
+    if not file:
+        return file
+    candidates = [file]
+    if file.endswith('_google.html'):
+        candidates.append(file[:-len('.html')] + '.json')
+    for candidate in candidates:
+        if capture_exists(candidate):
+            return candidate
+        # Always look in uploads/ if only a filename is provided
+        if not os.path.isabs(candidate) and capture_exists(os.path.join('uploads', candidate)):
+            return os.path.join('uploads', candidate)
+    return file
 
 class TrendLandingPageGenerator:
     def __init__(self, output_dir="landing_pages"):
@@ -26,111 +69,109 @@ class TrendLandingPageGenerator:
     def create_landing_page(self, search_term, pinterest_file=None, google_file=None):
         """Create a landing page for a specific search term"""
         
-        # Always look in uploads/ if only a filename is provided
-        def resolve_path(file):
-            if file and not os.path.isabs(file) and not os.path.exists(file):
-                candidate = os.path.join('uploads', file)
-                if os.path.exists(candidate):
-                    return candidate
-            return file
-        
-        pinterest_file = resolve_path(pinterest_file)
-        google_file = resolve_path(google_file)
-        
-        # Generate URL slug
-        slug = self.generate_slug(search_term)
+        pinterest_products, google_products = self.load_products(pinterest_file, google_file)
+        return self.write_landing_page(search_term, pinterest_products, google_products)
+    
+    def load_products(self, pinterest_file=None, google_file=None):
+        """Parse a Pinterest and a Google capture into two product lists"""
+        pinterest_file = resolve_capture_path(pinterest_file)
+        google_file = resolve_capture_path(google_file)
         
         # Parse data sources
         pinterest_products = []
         google_products = []
         
-        if pinterest_file and os.path.exists(pinterest_file):
+        if pinterest_file and capture_exists(pinterest_file):
             if pinterest_file.endswith('.html'):
                 pinterest_products = self.parse_pinterest_html(pinterest_file)
             else:
                 pinterest_products = self.parse_pinterest_json(pinterest_file)
             print(f"✅ Loaded {len(pinterest_products)} Pinterest products from {pinterest_file}")
         
-        if google_file and os.path.exists(google_file):
-            google_products = self.parse_google_html(google_file)
+        if google_file and capture_exists(google_file):
+            google_products = self.parse_google(google_file)
             print(f"✅ Loaded {len(google_products)} Google products from {google_file}")
         
-        # Combine and randomize products
-        all_products = pinterest_products + google_products
-        random.shuffle(all_products)
+        return pinterest_products, google_products
+    
+    def render_landing_page(self, search_term, pinterest_products, google_products):
+        """(HTML, product count) for already-parsed products, or (None, 0) if there are none"""
+        slug = self.generate_slug(search_term)
+        
+        # Combine products in a mixed order seeded by the slug, so identical captures rebuild identical pages,
+        # then apply any product edits saved through the patch API
+        all_products = apply_overlay(slug, interleave(slug, pinterest_products, google_products))
         
         if not all_products:
+            return None, 0
+        return self.generate_html(search_term, all_products), len(all_products)
+    
+    def write_landing_page(self, search_term, pinterest_products, google_products):
+        """Render and save the landing page for already-parsed products"""
+        slug = self.generate_slug(search_term)
+        html_content, product_count = self.render_landing_page(search_term, pinterest_products, google_products)
+        
+        if html_content is None:
             print(f"❌ No products found for '{search_term}'")
             return None
         
-        # Generate HTML
-        html_content = self.generate_html(search_term, all_products)
-        
-        # Save to file
+        # Save to file, in its hash shard of the output directory
         filename = f"{slug}.html"
-        filepath = os.path.join(self.output_dir, filename)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        with stage_timer('write_landing_page'):
+            filepath = get_collection(self.output_dir).write_text(filename, html_content)
         
         print(f"✅ Created landing page: {filepath}")
-        print(f"📊 Total products: {len(all_products)}")
+        print(f"📊 Total products: {product_count}")
         print(f"🌐 URL: file://{os.path.abspath(filepath)}")
         
         return filepath
     
-    def get_product_data(self, search_term, pinterest_file=None, google_file=None):
-        """Get parsed product data without generating HTML"""
-        
-        # Always look in uploads/ if only a filename is provided
-        def resolve_path(file):
-            if file and not os.path.isabs(file) and not os.path.exists(file):
-                candidate = os.path.join('uploads', file)
-                if os.path.exists(candidate):
-                    return candidate
-            return file
-        
-        pinterest_file = resolve_path(pinterest_file)
-        google_file = resolve_path(google_file)
-        
-        # Parse data sources
-        pinterest_products = []
-        google_products = []
-        
-        if pinterest_file and os.path.exists(pinterest_file):
-            if pinterest_file.endswith('.html'):
-                pinterest_products = self.parse_pinterest_html(pinterest_file)
-            else:
-                pinterest_products = self.parse_pinterest_json(pinterest_file)
+    @timed_stage('get_product_data')
+    def get_product_data(self, search_term, pinterest_file=None, google_file=None, use_warm_cache=True):
+        """Get parsed product data without generating HTML (a read-only tuple when it comes from the warm cache)"""
+        
+        pinterest_file = resolve_capture_path(pinterest_file)
+        google_file = resolve_capture_path(google_file)
+        
+        # Products parsed in the gunicorn master before fork, if the captures haven't changed since
+        if use_warm_cache:
+            cached = cached_products(pinterest_file, google_file)
+            if cached is not None:
+                return cached
+        
+        def parse():
+            # Parse data sources
+            pinterest_products = []
+            google_products = []
+            
+            if pinterest_file and capture_exists(pinterest_file):
+                if pinterest_file.endswith('.html'):
+                    pinterest_products = self.parse_pinterest_html(pinterest_file)
+                else:
+                    pinterest_products = self.parse_pinterest_json(pinterest_file)
+            
+            if google_file and capture_exists(google_file):
+                google_products = self.parse_google(google_file)
+            
+            return pinterest_products + google_products
         
-        if google_file and os.path.exists(google_file):
-            google_products = self.parse_google_html(google_file)
-        
-        # Combine products
-        all_products = pinterest_products + google_products
-        
-        # Convert to standardized format for CSV
-        standardized_products = []
-        for product in all_products:
-            standardized_products.append({
-                'title': product.get('grid_title', ''),
-                'price': product.get('price', ''),
-                'image_url': product.get('images:orig:url', ''),
-                'url': product.get('link', ''),
-                'source': product.get('Source', ''),
-                'description': product.get('seo_alt_txt', '')
-            })
-        
-        return standardized_products
+        # Concurrent requests for the same captures (a trend shared on social media) wait for one parse;
+        # the key includes the capture signatures so a new capture is never answered with old products
+        key = (pinterest_file, google_file, capture_signature(pinterest_file), capture_signature(google_file))
+        return list(get_singleflight('products').do(key, parse))
     
+    @timed_stage('parse_pinterest_json')
     def parse_pinterest_json(self, json_path):
-        """Parse Pinterest JSON and return a list of product dicts"""
+        """Parse Pinterest JSON (a resource response, or NDJSON with one pin per line) and return a list of Products"""
         products = []
         try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open_capture(json_path) as f:
+                if json_path.endswith('.ndjson'):
+                    results = [json.loads(line) for line in f if line.strip()]
+                else:
+                    results = json.load(f)['resource_response']['data']['results']
             
-            results = data['resource_response']['data']['results']
             for item in results:
                 rich = item.get('rich_summary', {})
                 prod = rich.get('products', [{}])[0] if rich.get('products') else {}
@@ -138,24 +179,58 @@ class TrendLandingPageGenerator:
                 images = item.get('images', {})
                 image_url = images.get('orig', {}).get('url')
                 
-                products.append({
-                    'grid_title': item.get('grid_title', ''),
-                    'display_name': rich.get('display_name', ''),
-                    'images:orig:url': image_url,
-                    'link': item.get('link', ''),
-                    'price': offer.get('price_value') and f"${offer.get('price_value')}",
-                    'seo_alt_txt': rich.get('display_name', ''),
-                    'Source': 'Pinterest'
-                })
+                products.append(Product(
+                    title=item.get('grid_title', ''),
+                    display_name=rich.get('display_name', ''),
+                    image_url=image_url,
+                    url=item.get('link', ''),
+                    price=offer.get('price_value') and f"${offer.get('price_value')}",
+                    description=rich.get('display_name', ''),
+                    source=PINTEREST
+                ))
         except Exception as e:
-            print(f"❌ Error parsing Pinterest JSON: {e}")
+            logger.error("❌ Error parsing Pinterest JSON: %s", e, extra={'fields': {'path': json_path}})
         return products
     
+    def parse_google(self, path):
+        """Parse a Google capture: extracted product JSON or raw PLA HTML"""
+        if path.endswith('.json'):
+            return self.parse_google_json(path)
+        return self.parse_google_html(path)
+    
+    @timed_stage('parse_google_json')
+    def parse_google_json(self, json_path):
+        """Parse products extracted in the browser by SeleniumTrendScraper and return a list of Products"""
+        products = []
+        try:
+            with open_capture(json_path) as f:
+                data = json.load(f)
+            
+            for item in data:
+                title = item.get('title', '')
+                link = item.get('url', '')
+                if title and link:
+                    products.append(Product(
+                        title=title,
+                        display_name=title,
+                        image_url=item.get('image_url', ''),
+                        url=link,
+                        price=item.get('price', ''),
+                        description=title,
+                        source=GOOGLE
+                    ))
+        except Exception as e:
+            logger.error("❌ Error parsing Google JSON: %s", e, extra={'fields': {'path': json_path}})
+        return products
+    
+    @timed_stage('parse_google_html')
     def parse_google_html(self, html_path):
-        """Parse Google PLA HTML and return a list of product dicts"""
+        """Parse Google PLA HTML and return a list of Products"""
+        from bs4 import BeautifulSoup
         products = []
+        summary = StageSummary(logger, 'parse_google_html', path=html_path)
         try:
-            with open(html_path, 'r', encoding='utf-8') as f:
+            with open_capture(html_path) as f:
                 soup = BeautifulSoup(f, 'html.parser')
             
             # First, try to find the main Google Shopping container
@@ -169,8 +244,8 @@ class TrendLandingPageGenerator:
             
             # Look for any elements with data-docid (Google Shopping product IDs)
             docid_elements = soup.find_all(attrs={'data-docid': True})
+            summary.count('candidates', len(docid_elements))
             if docid_elements:
-                print(f"✅ Found {len(docid_elements)} Google Shopping products with data-docid")
                 
                 for element in docid_elements:
                     try:
@@ -252,36 +327,38 @@ class TrendLandingPageGenerator:
                                     break
                         
                         if title and link:
-                            products.append({
-                                'grid_title': title,
-                                'display_name': title,
-                                'images:orig:url': image_url,
-                                'link': link,
-                                'price': price,
-                                'seo_alt_txt': title,
-                                'Source': 'Google'
-                            })
-                            print(f"✅ Found Google product: {title[:50]}... - {price}")
+                            products.append(Product(
+                                title=title,
+                                display_name=title,
+                                image_url=image_url,
+                                url=link,
+                                price=price,
+                                description=title,
+                                source=GOOGLE
+                            ))
+                            summary.item("✅ Found Google product", title=title[:50], price=price)
                     except Exception as e:
-                        print(f"❌ Error parsing Google product: {e}")
+                        summary.count('errors')
+                        summary.item("❌ Error parsing Google product", error=e)
                         continue
             
             if not products:
-                print("⚠️ No Google products found with data-docid")
-                print("💡 This might mean:")
-                print("   - The HTML structure has changed")
-                print("   - No Wayfair products were found")
-                print("   - The page didn't load properly")
+                # The structure changed, no Wayfair products were found, or the page didn't load properly
+                summary.warn("⚠️ No Google products found with data-docid")
                     
         except Exception as e:
-            print(f"❌ Error parsing Google HTML: {e}")
+            summary.fail("❌ Error parsing Google HTML", e)
+        summary.finish(products=len(products))
         return products
     
+    @timed_stage('parse_pinterest_html')
     def parse_pinterest_html(self, html_path):
-        """Parse Pinterest HTML and return a list of product dicts"""
+        """Parse Pinterest HTML and return a list of Products"""
+        from bs4 import BeautifulSoup
         products = []
+        summary = StageSummary(logger, 'parse_pinterest_html', path=html_path)
         try:
-            with open(html_path, 'r', encoding='utf-8') as f:
+            with open_capture(html_path) as f:
                 soup = BeautifulSoup(f, 'html.parser')
             
             # Look for Pinterest pins with multiple selectors
@@ -296,7 +373,8 @@ class TrendLandingPageGenerator:
             for selector in pin_selectors:
                 pins = soup.select(selector)
                 if pins:
-                    print(f"✅ Found {len(pins)} Pinterest pins with selector: {selector}")
+                    summary.fields['selector'] = selector
+                    summary.count('candidates', len(pins))
                     found_pins = True
                     
                     for pin in pins:
@@ -357,18 +435,19 @@ class TrendLandingPageGenerator:
                                         break
                             
                             if title and link:  # Only add if we have at least title and link
-                                products.append({
-                                    'grid_title': title,
-                                    'display_name': title,
-                                    'images:orig:url': image_url,
-                                    'link': link,
-                                    'price': price,
-                                    'seo_alt_txt': title,
-                                    'Source': 'Pinterest'
-                                })
-                                print(f"✅ Found Pinterest product: {title[:50]}...")
+                                products.append(Product(
+                                    title=title,
+                                    display_name=title,
+                                    image_url=image_url,
+                                    url=link,
+                                    price=price,
+                                    description=title,
+                                    source=PINTEREST
+                                ))
+                                summary.item("✅ Found Pinterest product", title=title[:50])
                         except Exception as e:
-                            print(f"❌ Error parsing a Pinterest pin: {e}")
+                            summary.count('errors')
+                            summary.item("❌ Error parsing a Pinterest pin", error=e)
                             continue
                     
                     # If we found products with this selector, break
@@ -376,16 +455,15 @@ class TrendLandingPageGenerator:
                         break
             
             if not found_pins:
-                print("⚠️ No Pinterest pins found with any selector")
-                print("💡 This might mean:")
-                print("   - The HTML structure has changed")
-                print("   - No pins were found")
-                print("   - The page didn't load properly")
+                # The structure changed, no pins were found, or the page didn't load properly
+                summary.warn("⚠️ No Pinterest pins found with any selector")
                     
         except Exception as e:
-            print(f"❌ Error parsing Pinterest HTML: {e}")
+            summary.fail("❌ Error parsing Pinterest HTML", e)
+        summary.finish(products=len(products))
         return products
     
+    @timed_stage('generate_html')
     def generate_html(self, search_term, products):
         """Generate the complete HTML page"""
         
@@ -689,8 +767,8 @@ class TrendLandingPageGenerator:
         # Generate products HTML with selection checkboxes
         products_html = ""
         for i, product in enumerate(products):
-            source = product.get('Source', 'Unknown')
-            product_html = self.generate_product_html(product)
+            source = product.source or 'Unknown'
+            product_html = self.cached_product_html(product)
             # Add checkbox and data attributes for selection
             checkbox_html = f'<input type="checkbox" class="product-checkbox" data-product-index="{i}">'
             product_html = product_html.replace('<div class="product-item">', 
@@ -717,7 +795,7 @@ class TrendLandingPageGenerator:
         js_code = f'''
         <script>
         let selectedProducts = [];
-        const products = {json.dumps(products)};
+        const products = {json.dumps(products, default=to_json)};
         
         // Product selection functionality
         document.addEventListener('DOMContentLoaded', function() {{
@@ -864,28 +942,29 @@ class TrendLandingPageGenerator:
         
         return html
     
+    def cached_product_html(self, product):
+        """generate_product_html through a per-process fragment cache keyed on the product's fields,
+        so re-rendering a page after a few edits only renders the cards that changed"""
+        key = ('landing_page',) + tuple(getattr(product, name) for name in Product.__slots__)
+        return cached_card(key, lambda: self.generate_product_html(product))
+    
     def generate_product_html(self, product):
         """Generate HTML for a single product"""
-        grid_title = product.get('grid_title', '')
-        display_name = product.get('display_name', '')
-        image_url = product.get('images:orig:url')
-        link = product.get('link')
-        price = product.get('price', 'Price not available')
-        seo_alt_txt = product.get('seo_alt_txt')
-        source = product.get('Source', 'Unknown')
+        image_url = product.image_url
+        price = product.price
+        source = product.source
 
-        # Use display_name if available, otherwise use grid_title
-        product_title = display_name if display_name else grid_title
+        product_title = product.heading
         
         # Truncate title if longer than 100 characters
         if len(product_title) > 100:
             product_title = product_title[:97] + '...'
 
-        # Use seo_alt_txt for alt attribute if available, otherwise use product_title
-        alt_text = seo_alt_txt if seo_alt_txt else product_title
+        # Use the description for alt attribute if available, otherwise use product_title
+        alt_text = product.description if product.description else product_title
 
         # Ensure link is not None or empty
-        product_link = link if link else "#"
+        product_link = product.url if product.url else "#"
 
         # Determine source logo
         source_logo_html = ""
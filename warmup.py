@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Pre-fork Warm-up
+Builds the landing page index, parsed product sets and looks summary once in the
+gunicorn master (preload_app = True) so every worker, including replacements
+after max_requests, starts with them already in memory and shares the pages
+copy-on-write instead of reparsing on first hit.
+
+Every cached entry carries a signature of the files it was built from; if the
+files change after fork the lookup misses and callers fall back to a live read.
+Hits hand out the frozen structures themselves (read-only mappings and tuples),
+so reading them never dirties the shared pages; callers that need to modify
+one copy it first.
+
+The warm-up runs from gunicorn's when_ready hook (gunicorn.conf.py), after the
+app is preloaded and before the first worker forks, so importing wsgi stays cheap.
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import subprocess
+import urllib.request
+from types import MappingProxyType
+
+from capture_store import capture_signature
+from metrics import record_cache
+from sharding import ShardedCollection
+from storage import LocalStorage
+
+_state = MappingProxyType({})
+
+
+def _freeze(value):
+    """Turn dicts/lists into read-only mappings/tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def directory_signature(directory):
+    """Cheap change detector for a (sharded) directory: the mtimes of the directory and its shards"""
+    return ShardedCollection(directory, LocalStorage()).signature()
+
+
+def _products_key(pinterest_file, google_file):
+    return (os.path.normpath(pinterest_file) if pinterest_file else None,
+            os.path.normpath(google_file) if google_file else None)
+
+
+def build_landing_pages(pages_dir='landing_pages'):
+    pages = []
+    for obj in ShardedCollection(pages_dir, LocalStorage()).list():
+        name = os.path.basename(obj.key)
+        if not name.endswith('.html'):
+            continue
+        pages.append({
+            'filename': name,
+            'name': name.replace('.html', '').replace('-', ' ').title(),
+            'size': obj.size,
+            'modified': obj.modified,
+            'url': f'/view/{name}'
+        })
+    return sorted(pages, key=lambda x: x['modified'], reverse=True)
+
+
+def build_looks(looks_dir='looks'):
+    looks = []
+    for obj in ShardedCollection(looks_dir, LocalStorage()).list():
+        if not obj.key.endswith('.json'):
+            continue
+        try:
+            with open(obj.key, 'r', encoding='utf-8') as f:
+                looks.append(json.load(f))
+        except Exception as e:
+            print(f"❌ Error loading look {os.path.basename(obj.key)}: {e}")
+    looks.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    return looks
+
+
+def warm_up(pages_dir='landing_pages', looks_dir='looks', uploads_dir='uploads'):
+    """Build the shared, immutable caches. Call once in the master before workers fork."""
+    global _state
+    from trend_generator import TrendLandingPageGenerator, resolve_capture_path
+
+    start = time.perf_counter()
+    generator = TrendLandingPageGenerator(output_dir=pages_dir)
+    pages = build_landing_pages(pages_dir)
+
+    products = {}
+    for page in pages:
+        search_term = page['filename'].replace('.html', '').replace('-', ' ')
+        base = search_term.lower().replace(' ', '_')
+        pinterest_file = resolve_capture_path(os.path.join(uploads_dir, f"{base}_pinterest.json"))
+        google_file = resolve_capture_path(os.path.join(uploads_dir, f"{base}_google.html"))
+        signature = (capture_signature(pinterest_file), capture_signature(google_file))
+        if signature == (None, None):
+            continue
+        parsed = generator.get_product_data(search_term, pinterest_file, google_file, use_warm_cache=False)
+        products[_products_key(pinterest_file, google_file)] = (signature, _freeze(parsed))
+
+    _state = MappingProxyType({
+        'landing_pages': (directory_signature(pages_dir), _freeze(pages)),
+        'looks': (directory_signature(looks_dir), _freeze(build_looks(looks_dir))),
+        'products': MappingProxyType(products),
+        'pages_dir': pages_dir,
+        'looks_dir': looks_dir
+    })
+
+    # Collect construction garbage now so the frozen heap is as compact as possible
+    gc.collect()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"🔥 Warmed {len(pages)} landing pages, {len(products)} product sets, "
+          f"{len(_state['looks'][1])} looks in {elapsed:.0f} ms")
+    return _state
+
+
+def cached_landing_pages(pages_dir='landing_pages'):
+    """Pre-warmed landing page index (a tuple of read-only mappings), or None if it is missing or stale"""
+    entry = _state.get('landing_pages')
+    hit = bool(entry) and _state['pages_dir'] == pages_dir and entry[0] == directory_signature(pages_dir)
+    record_cache('warm_landing_pages', hit)
+    return entry[1] if hit else None
+
+
+def cached_looks(looks_dir='looks'):
+    """Pre-warmed looks summary (a tuple of read-only mappings), or None if it is missing or stale"""
+    entry = _state.get('looks')
+    hit = bool(entry) and _state['looks_dir'] == looks_dir and entry[0] == directory_signature(looks_dir)
+    record_cache('warm_looks', hit)
+    return entry[1] if hit else None
+
+
+def cached_products(pinterest_file, google_file):
+    """Pre-parsed products for a pair of captures (a tuple of Products), or None if missing or stale"""
+    entry = _state.get('products', {}).get(_products_key(pinterest_file, google_file))
+    hit = bool(entry) and entry[0] == (capture_signature(pinterest_file), capture_signature(google_file))
+    record_cache('warm_products', hit)
+    return entry[1] if hit else None
+
+
+# RSS measurement
+
+def read_smaps_rollup(pid):
+    """Memory breakdown of a process in kB from /proc/<pid>/smaps_rollup"""
+    memory = {}
+    with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                memory[parts[0].rstrip(':')] = int(parts[1])
+    return memory
+
+
+def worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children', 'r') as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def measure_workers(warm, port, requests_per_page=4):
+    """Start gunicorn, exercise every landing page, and report per-worker memory"""
+    env = dict(os.environ, PORT=str(port), WARMUP_ON_LOAD='1' if warm else '0')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base_url + '/', timeout=1).read()
+                break
+            except Exception:
+                time.sleep(0.2)
+        for page in build_landing_pages():
+            for _ in range(requests_per_page):
+                urllib.request.urlopen(f"{base_url}/view_with_looks/{page['filename']}", timeout=60).read()
+        time.sleep(0.5)
+        return {pid: read_smaps_rollup(pid) for pid in worker_pids(server.pid)}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    """Command line interface for warm-up checks"""
+    if len(sys.argv) > 1 and sys.argv[1] == "--rss":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 8799
+        print("📏 Per-worker memory after serving every landing page (kB)")
+        print(f"{'mode':<6} {'pid':>8} {'Rss':>10} {'Pss':>10} {'Shared':>10} {'Private':>10}")
+        for warm in (False, True):
+            for pid, memory in measure_workers(warm, port).items():
+                shared = memory.get('Shared_Clean', 0) + memory.get('Shared_Dirty', 0)
+                private = memory.get('Private_Clean', 0) + memory.get('Private_Dirty', 0)
+                print(f"{'warm' if warm else 'cold':<6} {pid:>8} {memory.get('Rss', 0):>10} "
+                      f"{memory.get('Pss', 0):>10} {shared:>10} {private:>10}")
+    elif len(sys.argv) > 1 and sys.argv[1] == "--warm":
+        warm_up()
+    else:
+        print("Usage:")
+        print("  python warmup.py --warm        - Warm every landing page, product set and look once and time it")
+        print("  python warmup.py --rss [port]  - Compare per-worker memory with and without warm-up")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Watcher
+Reports files that change in a set of directories, with inotify when the
+optional inotify_simple package is installed and mtime/size polling otherwise.
+wait() blocks until something changes, then keeps collecting until the
+directories have been quiet for the debounce interval, so a burst of writes
+(an upload, a scrape saving both sources, a capture being ingested) comes
+back as one batch.
+"""
+
+import os
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+def snapshot(directories):
+    """{path: (mtime_ns, size)} for the files directly inside the directories"""
+    files = {}
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+class PollingWatcher:
+    backend = 'polling'
+
+    def __init__(self, directories, interval=1.0):
+        self.directories = list(directories)
+        self.interval = interval
+        self.files = snapshot(self.directories)
+
+    def poll(self, timeout):
+        """Changed paths (added, modified or removed), waiting up to timeout seconds for the first one"""
+        deadline = time.monotonic() + timeout
+        while True:
+            current = snapshot(self.directories)
+            changed = {path for path in current.keys() | self.files.keys() if current.get(path) != self.files.get(path)}
+            self.files = current
+            if changed or time.monotonic() >= deadline:
+                return changed
+            time.sleep(min(self.interval, max(0.0, deadline - time.monotonic())))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    backend = 'inotify'
+
+    def __init__(self, directories):
+        self.inotify = inotify_simple.INotify()
+        flags = inotify_simple.flags
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.DELETE | flags.CREATE
+        self.directories = {}
+        for directory in directories:
+            if os.path.isdir(directory):
+                self.directories[self.inotify.add_watch(directory, mask)] = directory
+
+    def poll(self, timeout):
+        events = self.inotify.read(timeout=int(timeout * 1000))
+        return {os.path.join(self.directories[event.wd], event.name) for event in events if event.name}
+
+    def close(self):
+        self.inotify.close()
+
+
+def create_watcher(directories, backend=None, interval=1.0):
+    """inotify when available (WATCH_BACKEND=polling forces polling)"""
+    backend = backend or os.getenv('WATCH_BACKEND')
+    if inotify_simple and backend != 'polling':
+        return InotifyWatcher(directories)
+    return PollingWatcher(directories, interval)
+
+
+def wait(watcher, debounce=1.0):
+    """Block until files change, then return every path changed before things went quiet for `debounce` seconds"""
+    changed = set()
+    while not changed:
+        changed = watcher.poll(timeout=3600)
+    while True:
+        more = watcher.poll(timeout=debounce)
+        if not more:
+            return changed
+        changed |= more
@@ -9,7 +9,26 @@ import sys
 import json
 import re
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 from trend_generator import TrendLandingPageGenerator
+from capture_store import capture_exists, capture_signature
+from capture_registry import get_capture_registry, parse_capture_name, term_key
+import watcher
+
+UPLOADS_DIR = "uploads"
+# Capture extensions tried, in order, for each source in uploads/
+UPLOAD_EXTENSIONS = {'pinterest': ('.json', '.ndjson', '.html'), 'google': ('.html', '.json')}
+
+
+def build_landing_page(search_term, pinterest_file, google_file, output_dir, publish=False):
+    """Rebuild one landing page, and republish it to the static site if asked; runs in a watch-mode worker process"""
+    generator = TrendLandingPageGenerator(output_dir=output_dir)
+    result = generator.create_landing_page(search_term, pinterest_file, google_file)
+    if result and publish:
+        from publish import Publisher
+        Publisher().publish([search_term])
+    return result
+
 
 class TrendWorkflowManager:
     def __init__(self):
@@ -20,6 +39,7 @@ class TrendWorkflowManager:
         # Ensure directories exist
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs(self.landing_pages_dir, exist_ok=True)
+        self.registry = get_capture_registry(self.data_dir)
     
     def list_existing_data(self):
         """List all existing data files"""
@@ -30,58 +50,32 @@ class TrendWorkflowManager:
             print("No data directory found.")
             return []
         
-        files = os.listdir(self.data_dir)
+        # Grouped by search term from the capture registry, newest first
         data_files = []
-        
-        for file in files:
-            if file.endswith(('.json', '.html')):
-                filepath = os.path.join(self.data_dir, file)
-                size = os.path.getsize(filepath)
-                modified = datetime.fromtimestamp(os.path.getmtime(filepath))
+        for key, entries in sorted(self.registry.entries().items()):
+            print(f"\n🔍 {entries[0]['term'].title()}:")
+            for entry in entries:
+                signature = capture_signature(entry['path'])
+                if signature is None:
+                    continue
+                modified = datetime.fromisoformat(entry['timestamp'])
                 data_files.append({
-                    'name': file,
-                    'path': filepath,
-                    'size': size,
+                    'name': os.path.basename(entry['path']),
+                    'path': entry['path'],
+                    'term': entry['term'],
+                    'source': entry['source'],
+                    'products': entry['products'],
+                    'size': signature[1],
                     'modified': modified
                 })
-        
-        # Group by search term
-        search_terms = {}
-        for file in data_files:
-            # Extract search term from filename
-            # Format: term_source_timestamp.ext
-            parts = file['name'].split('_')
-            if len(parts) >= 3:
-                search_term = ' '.join(parts[:-2])  # Everything except last 2 parts
-                if search_term not in search_terms:
-                    search_terms[search_term] = []
-                search_terms[search_term].append(file)
-        
-        for term, files in search_terms.items():
-            print(f"\n🔍 {term.title()}:")
-            for file in files:
-                print(f"  📄 {file['name']} ({file['size']} bytes, {file['modified'].strftime('%Y-%m-%d %H:%M')})")
+                products = '' if entry['products'] is None else f", {entry['products']} products"
+                print(f"  📄 {data_files[-1]['name']} ({signature[1]} bytes{products}, {modified.strftime('%Y-%m-%d %H:%M')})")
         
         return data_files
     
     def find_data_for_term(self, search_term):
-        """Find existing data files for a search term"""
-        if not os.path.exists(self.data_dir):
-            return None, None
-        
-        files = os.listdir(self.data_dir)
-        pinterest_file = None
-        google_file = None
-        
-        # Look for files matching the search term
-        for file in files:
-            if search_term.lower().replace(' ', '_') in file.lower():
-                if file.endswith('.json') and 'pinterest' in file.lower():
-                    pinterest_file = os.path.join(self.data_dir, file)
-                elif file.endswith('.html') and 'google' in file.lower():
-                    google_file = os.path.join(self.data_dir, file)
-        
-        return pinterest_file, google_file
+        """Find the latest data files for a search term"""
+        return self.registry.latest_pair(search_term)
     
     def create_landing_page(self, search_term, pinterest_file=None, google_file=None):
         """Create a landing page for a search term"""
@@ -92,11 +86,11 @@ class TrendWorkflowManager:
             print("❌ No data files provided")
             return None
         
-        if pinterest_file and not os.path.exists(pinterest_file):
+        if pinterest_file and not capture_exists(pinterest_file):
             print(f"❌ Pinterest file not found: {pinterest_file}")
             pinterest_file = None
         
-        if google_file and not os.path.exists(google_file):
+        if google_file and not capture_exists(google_file):
             print(f"❌ Google file not found: {google_file}")
             google_file = None
         
@@ -208,6 +202,70 @@ class TrendWorkflowManager:
         # Create landing page
         self.create_landing_page(search_term, pinterest_file, google_file)
     
+    def find_uploads_for_term(self, search_term):
+        """Pinterest and Google captures for a term in uploads/, as saved by the web app"""
+        found = []
+        for source, extensions in UPLOAD_EXTENSIONS.items():
+            paths = [os.path.join(UPLOADS_DIR, f"{term_key(search_term)}_{source}{ext}") for ext in extensions]
+            found.append(next((path for path in paths if capture_exists(path)), None))
+        return tuple(found)
+    
+    def changed_terms(self, paths):
+        """Map changed capture files to {term key: (term, directory)}, recording scraped_data ones in the registry"""
+        terms = {}
+        for path in sorted(paths):
+            parsed = parse_capture_name(os.path.basename(path))
+            if not parsed:
+                continue
+            search_term, source, timestamp = parsed
+            directory = os.path.dirname(path)
+            if os.path.normpath(directory) == os.path.normpath(self.data_dir) and capture_exists(path):
+                # A timestamped name is ordered by its timestamp, as in rebuild(), so touching an old capture
+                # doesn't make it the latest; an untimestamped one was just written, so it is
+                self.registry.record(search_term, source, path, timestamp=timestamp)
+            terms[term_key(search_term)] = (search_term, directory)
+        return terms
+    
+    def watch(self, debounce=None, workers=None, publish=False):
+        """Rebuild the landing pages whose captures change in uploads/ or scraped_data/"""
+        debounce = debounce if debounce is not None else float(os.getenv('WATCH_DEBOUNCE', '1.0'))
+        workers = workers or int(os.getenv('WATCH_WORKERS', '2'))
+        directories = [UPLOADS_DIR, self.data_dir]
+        change_watcher = watcher.create_watcher(directories, interval=min(debounce, 1.0))
+        print(f"👀 Watching {', '.join(d + '/' for d in directories)} ({change_watcher.backend}, "
+              f"{debounce:g}s debounce, {workers} workers)")
+        
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                while True:
+                    terms = self.changed_terms(watcher.wait(change_watcher, debounce))
+                    if not terms:
+                        continue
+                    
+                    jobs = {}
+                    for key, (search_term, directory) in terms.items():
+                        if os.path.normpath(directory) == os.path.normpath(UPLOADS_DIR):
+                            pinterest_file, google_file = self.find_uploads_for_term(search_term)
+                        else:
+                            pinterest_file, google_file = self.find_data_for_term(search_term)
+                        if not pinterest_file and not google_file:
+                            print(f"⚠️  No captures left for '{search_term}' - skipping")
+                            continue
+                        print(f"🔄 Rebuilding '{search_term}'")
+                        jobs[search_term] = pool.submit(build_landing_page, search_term, pinterest_file,
+                                                        google_file, self.landing_pages_dir, publish)
+                    
+                    for search_term, job in jobs.items():
+                        try:
+                            result = job.result()
+                            print(f"{'✅' if result else '❌'} {search_term}: {result or 'no products'}")
+                        except Exception as e:
+                            print(f"❌ Error rebuilding '{search_term}': {e}")
+        except KeyboardInterrupt:
+            print("👋 Stopped watching")
+        finally:
+            change_watcher.close()
+    
     def batch_create_landing_pages(self, search_terms):
         """Create landing pages for multiple search terms"""
         print(f"🚀 Batch creating landing pages for {len(search_terms)} terms...")
@@ -254,6 +312,9 @@ def main():
             # Batch mode
             search_terms = sys.argv[2:]
             manager.batch_create_landing_pages(search_terms)
+        elif sys.argv[1] == "--watch":
+            # Rebuild landing pages as captures change
+            manager.watch(publish="--publish" in sys.argv[2:])
         elif sys.argv[1] == "--list":
             # List existing data
             manager.list_existing_data()
@@ -267,6 +328,7 @@ def main():
             print("Usage:")
             print("  python workflow_manager.py --batch 'term1' 'term2' 'term3'")
             print("  python workflow_manager.py --list")
+            print("  python workflow_manager.py --watch [--publish]  # Rebuild (and republish) pages when uploads/ or scraped_data/ change")
             print("  python workflow_manager.py --create 'search term' [pinterest_file] [google_file]")
             print("  python workflow_manager.py  # Interactive mode")
     else:
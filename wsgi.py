@@ -5,5 +5,7 @@ WSGI entry point for production deployment
 
 from simple_app import app
 
+# The pre-fork warm-up runs from gunicorn's when_ready hook (gunicorn.conf.py), not on import
+
 if __name__ == "__main__":
-    app.run() 
\ No newline at end of file
+    app.run() 